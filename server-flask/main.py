@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, send_file, redirect, redirect
+from flask import Flask, jsonify, request, send_file, redirect, Response, stream_with_context
 import os
 import pandas as pd
 from flask_cors import CORS
@@ -7,7 +7,6 @@ from flask_limiter.util import get_remote_address
 import matplotlib
 from matplotlib import pyplot as plt
 from mplsoccer import Pitch, VerticalPitch
-from ast import literal_eval
 import json
 from scipy.ndimage import gaussian_filter
 from matplotlib import patheffects
@@ -17,29 +16,54 @@ import joblib
 import datetime
 import uuid 
 import boto3
-from io import BytesIO, StringIO
+from io import BytesIO
 import gc
 import math
 import requests
  
 
 from model_trainer.trainer_v2 import (
-    build_and_train_model_from_script_logic,
     get_trainer_kpi_definitions_for_weight_derivation,
     get_trainer_composite_impact_kpis_definitions,
     get_general_position as trainer_get_general_position, 
     get_feature_names_for_extraction as trainer_get_feature_names,
     extract_season_features as trainer_extract_base_features,
+    extract_season_features_batch as trainer_extract_base_features_batch,
+    stack_player_season_events as trainer_stack_player_season_events,
+    ml_feature_matrix as trainer_ml_feature_matrix,
     trainer_construct_ml_features_for_player_season, 
     safe_division as trainer_safe_division, 
-    get_trainer_all_possible_ml_feature_names 
+    get_trainer_all_possible_ml_feature_names,
+    preview_potential_target
 )
 
+from model_trainer.event_store import (
+    event_csv_key,
+    load_event_frame,
+    r2_client_config,
+    split_location_columns,
+    location_axis_columns,
+    project_event_columns
+)
+from model_trainer.feature_store import BaseFeatureStore
+from model_trainer.leaderboard import DEFAULT_API_MODEL_ID, PotentialLeaderboard, model_artifact_keys, model_artifact_location
+from model_trainer.model_catalog import CUSTOM_MODELS_PREFIX, ModelCatalog
+from player_data_cache import PlayerDataCache
+from player_minutes import PlayerMinutesService
+from player_directory import PlayerDirectory
+from model_registry import ModelRegistry
+from training_jobs import TrainingJobQueue
+from response_cache import PrecompressedJSON
+
 from validation_schemas import (
     CustomModelTrainingSchema,
+    KpiWeightPreviewSchema,
     PredictionRequestSchema,
     PlayerQuerySchema,
     MetricQuerySchema,
+    PlayerEventsQuerySchema,
+    BatchPredictionRequestSchema,
+    LeaderboardQuerySchema,
     validate_request_data
 )
 
@@ -65,7 +89,8 @@ if R2_ENDPOINT_URL and R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY and R2_BUCKET_N
         endpoint_url=R2_ENDPOINT_URL,
         aws_access_key_id=R2_ACCESS_KEY_ID,
         aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        region_name='auto'
+        region_name='auto',
+        config=r2_client_config()
     )
 else:
     logger.warning("R2 environment variables not set. S3 client not initialized. App will likely fail.")
@@ -85,6 +110,48 @@ os.makedirs(STATIC_IMG_DIR, exist_ok=True)
 CUSTOM_MODELS_DIR = os.path.join(BASE_DIR_SERVER_FLASK, "ml_models", "custom_models")
 os.makedirs(CUSTOM_MODELS_DIR, exist_ok=True)
 
+PLAYER_DATA_CACHE_MAX_MB = float(os.environ.get('PLAYER_DATA_CACHE_MAX_MB', '64'))
+player_data_cache = PlayerDataCache(max_bytes=PLAYER_DATA_CACHE_MAX_MB * 1024 * 1024)
+
+PLAYER_MINUTES_REFRESH_SECONDS = float(os.environ.get('PLAYER_MINUTES_REFRESH_SECONDS', '300'))
+player_minutes_service = PlayerMinutesService(s3_client, R2_BUCKET_NAME, refresh_interval_seconds=PLAYER_MINUTES_REFRESH_SECONDS)
+
+PLAYER_EVENTS_CHUNK_ROWS = 500
+# Player-seasons whose events are stacked into one grouped extraction by the batch prediction route.
+PREDICTION_EXTRACTION_BATCH_SIZE = 64
+# Seasons after this age are not used as history of a prediction (only as the season predicted from).
+PREDICTION_MAX_HISTORY_AGE = 21
+
+MODEL_CACHE_MAX_MB = float(os.environ.get('MODEL_CACHE_MAX_MB', '96'))
+MODEL_CACHE_REVALIDATE_SECONDS = float(os.environ.get('MODEL_CACHE_REVALIDATE_SECONDS', '300'))
+MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR', os.path.join(BASE_DIR_SERVER_FLASK, "ml_models", "registry_cache"))
+model_registry = ModelRegistry(
+    s3_client, R2_BUCKET_NAME,
+    max_bytes=MODEL_CACHE_MAX_MB * 1024 * 1024,
+    revalidate_seconds=MODEL_CACHE_REVALIDATE_SECONDS,
+    disk_cache_dir=MODEL_CACHE_DIR or None
+)
+
+MODEL_CATALOG_REFRESH_SECONDS = float(os.environ.get('MODEL_CATALOG_REFRESH_SECONDS', '60'))
+model_catalog = ModelCatalog(s3_client, R2_BUCKET_NAME, refresh_interval_seconds=MODEL_CATALOG_REFRESH_SECONDS)
+
+LEADERBOARD_REFRESH_SECONDS = float(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '300'))
+potential_leaderboard = PotentialLeaderboard(s3_client, R2_BUCKET_NAME, refresh_interval_seconds=LEADERBOARD_REFRESH_SECONDS)
+
+TRAINING_JOBS_DIR = os.environ.get('TRAINING_JOBS_DIR', os.path.join(BASE_DIR_SERVER_FLASK, "ml_models", "training_jobs"))
+TRAINING_JOB_WORKERS = int(os.environ.get('TRAINING_JOB_WORKERS', '1'))
+training_job_queue = TrainingJobQueue(TRAINING_JOBS_DIR, max_workers=TRAINING_JOB_WORKERS)
+
+EVENT_STORE_PREFER_PARQUET = os.environ.get('EVENT_STORE_FORMAT', 'parquet').lower() != 'csv'
+
+SHOT_MAP_COLUMNS = ['type', 'location', 'shot_outcome', 'shot_statsbomb_xg']
+PASS_MAP_COLUMNS = ['type', 'location', 'pass_end_location', 'pass_outcome', 'pass_goal_assist']
+PASS_ZONE_COLUMNS = ['type', 'pass_end_location', 'pass_outcome']
+GOALKEEPER_COLUMNS = [
+    'player_id', 'type', 'pass_outcome', 'pass_height', 'goalkeeper_type', 'goalkeeper_outcome',
+    'location', 'shot_end_location', 'minute', 'second', 'shot_statsbomb_xg', 'goalkeeper.shot_statsbomb_xg', 'xg'
+]
+
 matplotlib.use("Agg")
 
 def safe_float(val, default=0.0):
@@ -93,12 +160,21 @@ def safe_float(val, default=0.0):
     except (ValueError, TypeError, AttributeError): 
         return default
 
-def safe_literal_eval(val):
-    try:
-        return literal_eval(val) if isinstance(val, str) else val
-    except Exception:
-        return None
 
+def _location_points(df, location_col, n_axes):
+    """
+    Return one ``[x, y(, z)]`` list (or None when any axis is missing) per row,
+    built from the split ``{location_col}_x/_y/_z`` float columns.
+    """
+    axis_cols = location_axis_columns(location_col)[:n_axes]
+    if df.empty or not all(c in df.columns for c in axis_cols):
+        return [None] * len(df)
+    coords = df[axis_cols].to_numpy(dtype=float)
+    valid = ~np.isnan(coords).any(axis=1)
+    return [row.tolist() if ok else None for row, ok in zip(coords, valid)]
+
+def _has_location(df, location_col):
+    return all(c in df.columns for c in location_axis_columns(location_col)[:2])
 
 def _format_value_counts(series, sort_index=False):
     if series is None or series.empty: return []
@@ -135,59 +211,38 @@ def load_translation(lang_code):
         logger.info("------------------------------------")
         return json.load(f)
 
-def load_player_data(player_id, season, data_dir): 
+def load_player_data(player_id, season, data_dir, columns=None):
+    """
+    Load the events of one player-season from R2.
+
+    The Parquet event store is preferred and the CSV is used as a fallback.
+    The full frame always goes through the in-process cache, so the routes of
+    one player page download the file once; when ``columns`` is given only
+    those columns of the cached frame are returned.
+    """
     def try_load_one_from_r2(player_id, season):
         if not s3_client:
             logger.error("Cannot load from R2: S3 client not initialized.")
             return None
-            
-        file_key_csv = f"data/{season}/players/{player_id}_{season}.csv"
-        
-        try:
-            logger.debug(f"Attempting to load from R2: {R2_BUCKET_NAME}/{file_key_csv}")
-            response = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key=file_key_csv)
-            
-            csv_content = response['Body'].read().decode('utf-8')
-            df = pd.read_csv(StringIO(csv_content), low_memory=False)
 
-            loc_cols = [col for col in df.columns if 'location' in col or 'end_location' in col]
-            for col in loc_cols:
-                if col in df.columns: df[col] = df[col].apply(lambda x: safe_literal_eval(x) if pd.notna(x) else None)
-            
-            bool_cols_to_check = [
-                'counterpress', 'offensive', 'recovery_failure', 'deflection', 'save_block', 'aerial_won', 'nutmeg', 'overrun',
-                'no_touch', 'leads_to_shot', 'advantage', 'penalty', 'defensive', 'backheel', 'deflected', 'miscommunication',
-                'cross', 'cut_back', 'switch', 'shot_assist', 'pass_goal_assist', 'follows_dribble', 'first_time', 'open_goal',
-                'under_pressure', 'out'
-            ]
-            bool_cols_to_check = sorted(list(set(bool_cols_to_check)))
-
-            for col in bool_cols_to_check:
-                if col in df.columns:
-                    if df[col].dtype == 'object':
-                        df[col] = df[col].astype(str).str.lower().map({'true': True, 'false': False, 'nan': pd.NA, '': pd.NA}).astype('boolean')
-                    elif pd.api.types.is_numeric_dtype(df[col]):
-                        df[col] = df[col].map({1.0: True, 1: True, 0.0: False, 0: False}).astype('boolean')
-            
-            numeric_cols_to_check = ['duration', 'pass_length', 'pass_angle', 'shot_statsbomb_xg', 'statsbomb_xg']
-            for col in numeric_cols_to_check:
-                if col in df.columns: df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            return df
-        except Exception as e:
-            if hasattr(e, 'response') and e.response.get('Error', {}).get('Code') == 'NoSuchKey':
-                    logger.warning(f"R2 object not found: {R2_BUCKET_NAME}/{file_key_csv}")
-            return None
+        try:
+            # Same loader and normalization as the trainer, so both see the same flag columns.
+            df, source = load_event_frame(s3_client, R2_BUCKET_NAME, player_id, season, prefer_parquet=EVENT_STORE_PREFER_PARQUET, low_memory=False)
+            if df is None:
+                logger.warning(f"R2 object not found: {R2_BUCKET_NAME}/{event_csv_key(player_id, season)}")
+                return None
+            return split_location_columns(df) if source == "csv" else df
         except Exception as e:
-            logger.error(f"Error loading {file_key_csv} from R2: {e}", exc_info=True)
+            logger.error(f"Error loading events for {player_id}/{season} from R2: {e}", exc_info=True)
             return None
 
 
     if season == "all":
         logger.warning("Loading 'all' seasons is not fully supported in production environment. Returning empty DataFrame.")
         return pd.DataFrame()
-    else:
-        return try_load_one_from_r2(player_id, season)
+
+    df = player_data_cache.get_or_load(player_id, season, lambda: try_load_one_from_r2(player_id, season))
+    return project_event_columns(df, columns)
 
 app = Flask(__name__, static_folder=os.path.join(BASE_DIR_SERVER_FLASK, 'static'), static_url_path='/static')
 CORS(app, resources={
@@ -195,6 +250,7 @@ CORS(app, resources={
         "origins": ["https://react-flask-psi.vercel.app", "http://localhost:5173", "http://localhost:5174"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Next-Cursor", "X-Total-Count"],
         "supports_credentials": True
     }
 })
@@ -307,9 +363,10 @@ def _calculate_goalkeeper_metrics(player_df, player_id_str):
                 xg_col_on_gk_event = col
                 break
 
-    for _, row in df_direct_shot_interactions.iterrows():
-        shot_loc = safe_literal_eval(row.get('location'))
-        shot_end_loc = safe_literal_eval(row.get('shot_end_location'))
+    shot_origins = _location_points(df_direct_shot_interactions, 'location', 2)
+    shot_end_locations = _location_points(df_direct_shot_interactions, 'shot_end_location', 3)
+
+    for (_, row), shot_loc, shot_end_loc in zip(df_direct_shot_interactions.iterrows(), shot_origins, shot_end_locations):
         
         is_goal_flag = None
         shot_outcome_for_map = row.get('goalkeeper_type')
@@ -328,8 +385,8 @@ def _calculate_goalkeeper_metrics(player_df, player_id_str):
 
 
         map_entry = {
-            "origin": shot_loc[:2] if shot_loc and len(shot_loc) >=2 else None,
-            "end_location": shot_end_loc[:3] if shot_end_loc and len(shot_end_loc) >=3 else None,
+            "origin": shot_loc,
+            "end_location": shot_end_loc,
             "outcome": shot_outcome_for_map, "is_goal": is_goal_flag,
             "minute": int(safe_float(row.get("minute"))), "second": int(safe_float(row.get("second")))
         }
@@ -465,29 +522,66 @@ def health_check():
     }), 200
 
 
+@app.route("/api/cache/stats")
+@limiter.exempt
+def cache_stats_route():
+    return jsonify({"player_data_cache": player_data_cache.stats(), "base_feature_store": base_feature_store.stats(),
+        "player_minutes": player_minutes_service.stats(),
+        "model_registry": model_registry.stats(),
+        "model_catalog": model_catalog.stats(),
+        "leaderboard": potential_leaderboard.stats(),
+        "training_jobs": training_job_queue.stats()
+    })
+
+
 player_index_main_data = {}
+player_directory = PlayerDirectory()
+players_response = PrecompressedJSON([])
+
+def set_player_index(player_index):
+    """Install a newly loaded player index and rebuild everything derived from it."""
+    global player_index_main_data, player_directory, players_response
+    directory = PlayerDirectory(player_index)
+    response_body = PrecompressedJSON(directory.players_payload())
+    player_index_main_data, player_directory, players_response = player_index, directory, response_body
+
 if s3_client:
     try:
         logger.info(f"Loading player_index.json from R2 bucket: {R2_BUCKET_NAME}")
         response = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key="data/player_index.json")
         content = response['Body'].read().decode('utf-8')
-        player_index_main_data = json.loads(content)
+        set_player_index(json.loads(content))
         logger.info("Successfully loaded player_index.json from R2.")
     except Exception as e:
         logger.error(f"Error loading player_index.json from R2: {e}")
+
+FEATURE_STORE_REFRESH_SECONDS = float(os.environ.get('FEATURE_STORE_REFRESH_SECONDS', '300'))
+base_feature_store = BaseFeatureStore(s3_client, R2_BUCKET_NAME, refresh_interval_seconds=FEATURE_STORE_REFRESH_SECONDS)
+if s3_client:
+    try:
+        logger.info("Loading base feature store from R2...")
+        loaded_rows = base_feature_store.reload()
+        logger.info(f"Base feature store loaded: {loaded_rows} player-seasons.")
+    except Exception as e:
+        logger.error(f"Error loading base feature store from R2, features will be extracted from events: {e}")
+
+def get_player_season_base_features(player_id, season_str, age_at_season, season_numeric, num_90s):
+    """
+    Base features of one player-season, from the feature store when present and
+    computed with the same age and minutes, and extracted from the event data otherwise.
+    """
+    base_features_series = base_feature_store.get(player_id, season_str, age=age_at_season, num_90s_played=num_90s)
+    if base_features_series is not None:
+        return base_features_series
+    df_events_season = load_player_data(player_id, season_str, DATA_DIR)
+    if df_events_season is None:
+        df_events_season = pd.DataFrame()
+    return trainer_extract_base_features(df_events_season, age_at_season, season_numeric, num_90s)
+
 @app.route("/players")
 def players_route():
     try:
-        return jsonify([
-            {
-                "name": name, 
-                "player_id": data["player_id"], 
-                "seasons": data.get("seasons", []), 
-                "dob": data.get("dob", ""),
-                "position": data.get("position", "")
-            }
-            for name, data in sorted(player_index_main_data.items()) if isinstance(data, dict) and "player_id" in data
-        ])
+        return players_response.make_response(request)
     except Exception as e: 
         logger.error(f"Error in /players: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -497,19 +591,73 @@ def player_seasons_route():
     player_id = request.args.get("player_id")
     if not player_id: return jsonify({"error": "Missing player_id"}), 400
     try:
-        player_data = next((data for data in player_index_main_data.values() if isinstance(data, dict) and str(data.get("player_id")) == str(player_id)), None)
+        player_data = player_directory.get(player_id)
         if not player_data: return jsonify({"error": "Player not found"}), 404
         return jsonify({"player_id": player_id, "seasons": player_data.get("seasons", [])})
     except Exception as e: logger.error(f"Error in /player_seasons: {e}", exc_info=True); return jsonify({"error": str(e)}), 500
 
+def _split_query_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+def _iter_event_records(df, as_ndjson):
+    """Serialize ``df`` chunk by chunk as one JSON array or as NDJSON lines."""
+    if not as_ndjson:
+        yield "["
+    for chunk_idx, start in enumerate(range(0, len(df), PLAYER_EVENTS_CHUNK_ROWS)):
+        chunk = df.iloc[start:start + PLAYER_EVENTS_CHUNK_ROWS]
+        if as_ndjson:
+            yield chunk.to_json(orient="records", lines=True, date_format="iso", default_handler=str) + "\n"
+        else:
+            records = chunk.to_json(orient="records", date_format="iso", default_handler=str)[1:-1]
+            yield ("," if chunk_idx else "") + records
+    if not as_ndjson:
+        yield "]"
+
 @app.route("/player_events")
 def player_events_route():
-    player_id = request.args.get("player_id"); season = request.args.get("season")
-    if not player_id or not season: return jsonify({"error": "Missing player_id or season"}), 400
+    """
+    Events of one player-season, streamed in chunks.
+
+    Query params: ``fields`` (comma-separated columns), ``type`` (comma-separated
+    event types), ``limit`` and ``cursor`` (row offset) for pagination, and
+    ``format`` = ``json`` (array, default) or ``ndjson``. When more rows remain
+    the next cursor is returned in the ``X-Next-Cursor`` header.
+    """
+    validated_data, error_response = validate_request_data(PlayerEventsQuerySchema, request.args.to_dict())
+    if error_response:
+        return error_response
+
+    player_id = validated_data["player_id"]; season = validated_data["season"]
+    selected_fields = _split_query_list(validated_data.get("fields_"))
+    event_types = _split_query_list(validated_data.get("type"))
+    cursor = validated_data.get("cursor", 0)
+    limit = validated_data.get("limit")
+    as_ndjson = validated_data.get("format", "json") == "ndjson"
     try:
-        df = load_player_data(player_id, season, DATA_DIR)
+        load_columns = None
+        if selected_fields:
+            load_columns = list(dict.fromkeys(selected_fields + (['type'] if event_types else [])))
+        df = load_player_data(player_id, season, DATA_DIR, columns=load_columns)
         if df is None or df.empty: return jsonify({"error": "No data found"}), 404
-        return df.to_json(orient="records", date_format="iso", default_handler=str)
+
+        if event_types:
+            if 'type' not in df.columns: return jsonify({"error": "Event type column not available"}), 400
+            df = df[df['type'].isin(event_types)]
+        if selected_fields:
+            df = project_event_columns(df, selected_fields)
+
+        total_rows = len(df)
+        end = total_rows if limit is None else min(total_rows, cursor + limit)
+        page_df = df.iloc[cursor:end]
+
+        response = Response(
+            stream_with_context(_iter_event_records(page_df, as_ndjson)),
+            mimetype="application/x-ndjson" if as_ndjson else "application/json"
+        )
+        response.headers["X-Total-Count"] = str(total_rows)
+        if end < total_rows:
+            response.headers["X-Next-Cursor"] = str(end)
+        return response
     except Exception as e: logger.error(f"Error in /player_events: {e}", exc_info=True); return jsonify({"error": str(e)}), 500
 
 
@@ -571,31 +719,22 @@ def pass_map_zona_stats_route():
     if not player_id or not season:
         return jsonify({"error": "Missing player_id or season"}), 400
     try:
-        df = load_player_data(player_id, season, DATA_DIR)
+        df = load_player_data(player_id, season, DATA_DIR, columns=PASS_ZONE_COLUMNS)
         if df is None or df.empty:
             return jsonify({"zonas": []})
 
         passes_df = df[df.get("type") == "Pass"].copy() if "type" in df.columns else pd.DataFrame()
-        if passes_df.empty or 'pass_end_location' not in passes_df.columns:
+        if passes_df.empty or not _has_location(passes_df, 'pass_end_location'):
              return jsonify({"zonas": []})
 
-        passes_df["end_loc_eval"] = passes_df["pass_end_location"].apply(safe_literal_eval)
-        passes_df = passes_df[passes_df["end_loc_eval"].apply(lambda x: isinstance(x, (list, tuple)) and len(x) >= 2)]
+        passes_df = passes_df.dropna(subset=["pass_end_location_x", "pass_end_location_y"])
         if passes_df.empty: return jsonify({"zonas": []})
 
-        def get_pitch_third(x_coord):
-            if x_coord < 40: return "Defensive Third" 
-            elif x_coord < 80: return "Middle Third"
-            else: return "Attacking Third"
-
-        def get_pitch_channel(y_coord):
-            if y_coord < 26.67: return "Left Channel"
-            elif y_coord < 53.33: return "Central Channel"
-            else: return "Right Channel"
-
-        passes_df["end_third"] = passes_df["end_loc_eval"].apply(lambda loc: get_pitch_third(loc[0]))
-        passes_df["end_channel"] = passes_df["end_loc_eval"].apply(lambda loc: get_pitch_channel(loc[1]))
-        passes_df["zona"] = passes_df["end_third"] + " - " + passes_df["end_channel"]
+        end_x = passes_df["pass_end_location_x"].to_numpy()
+        end_y = passes_df["pass_end_location_y"].to_numpy()
+        end_third = np.where(end_x < 40, "Defensive Third", np.where(end_x < 80, "Middle Third", "Attacking Third"))
+        end_channel = np.where(end_y < 26.67, "Left Channel", np.where(end_y < 53.33, "Central Channel", "Right Channel"))
+        passes_df["zona"] = np.char.add(np.char.add(end_third, " - "), end_channel)
 
         zonas_data = []
         for zona_name, group in passes_df.groupby("zona"):
@@ -623,35 +762,31 @@ def shot_map_route():
     try:
         if not player_id or not season:
             return jsonify({"shots": []})
-        df = load_player_data(player_id, season, DATA_DIR)
+        df = load_player_data(player_id, season, DATA_DIR, columns=SHOT_MAP_COLUMNS)
         if df is None or df.empty:
             return jsonify({"shots": []})
 
         df_shots = df[df.get("type") == "Shot"].copy() if "type" in df.columns else pd.DataFrame()
 
-        if df_shots.empty or not all(c in df_shots.columns for c in ["location"]):
+        if df_shots.empty or not _has_location(df_shots, "location"):
             return jsonify({"shots": []})
 
-        df_shots["location_eval"] = df_shots["location"].apply(safe_literal_eval)
-        df_shots = df_shots[df_shots["location_eval"].apply(lambda x: isinstance(x, (list, tuple)) and len(x) >= 2)]
+        df_shots = df_shots.dropna(subset=["location_x", "location_y"])
         if df_shots.empty: return jsonify({"shots": []})
 
-        df_shots["x"] = df_shots["location_eval"].apply(lambda loc: loc[0])
-        df_shots["y"] = df_shots["location_eval"].apply(lambda loc: loc[1])
-
         if 'shot_outcome' in df_shots.columns:
-            df_shots["is_goal"] = df_shots["shot_outcome"].astype(str) == "Goal"
+            is_goal = (df_shots["shot_outcome"].astype(str) == "Goal").to_numpy()
         else:
-            df_shots["is_goal"] = False
-
-        shot_data = []
-        for _, row in df_shots.iterrows():
-            shot_data.append({
-                "x": row["x"],
-                "y": row["y"],
-                "xg": safe_float(row.get("shot_statsbomb_xg", 0.0)),
-                "goal": bool(row["is_goal"])
-            })
+            is_goal = np.zeros(len(df_shots), dtype=bool)
+        if 'shot_statsbomb_xg' in df_shots.columns:
+            xg_values = pd.to_numeric(df_shots["shot_statsbomb_xg"], errors='coerce').to_numpy(dtype=float)
+        else:
+            xg_values = np.zeros(len(df_shots))
+
+        shot_data = [
+            {"x": float(x), "y": float(y), "xg": float(xg), "goal": bool(goal)}
+            for x, y, xg, goal in zip(df_shots["location_x"].to_numpy(), df_shots["location_y"].to_numpy(), xg_values, is_goal)
+        ]
         return jsonify({"shots": shot_data})
     except Exception as e:
         logger.error(f"Error in /shot_map for {player_id}/{season}: {e}", exc_info=True)
@@ -711,52 +846,54 @@ def get_default_v14_config():
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/custom_model/build", methods=['POST'])
+@limiter.limit("20 per hour")
 def handle_build_custom_model():
-    data = request.get_json()
+    """
+    Queues a custom model training run on this server's training worker processes.
+    Returns the job id right away; progress is served by /api/custom_model/jobs/<job_id>.
+    """
+    data = request.get_json(silent=True)
     if not data: return jsonify({"error": "Missing JSON payload"}), 400
 
-    position_group = data.get("position_group")
-    user_impact_kpis_list = data.get("impact_kpis")
-    user_target_kpis_list = data.get("target_kpis")
-    custom_model_name_prefix = data.get("model_name", f"custom_{position_group.lower() if position_group else 'model'}")
-    
-    user_ml_feature_selection = data.get("ml_features", None)
-
-    if not all([position_group, user_impact_kpis_list, user_target_kpis_list]):
-        return jsonify({"error": "Missing required fields: position_group, impact_kpis (for correlation), target_kpis (for weighting)"}), 400
-    if position_group not in ["Attacker", "Midfielder", "Defender"]:
-        return jsonify({"error": f"Invalid position_group: {position_group}"}), 400
-    
-    if user_ml_feature_selection is not None and not (isinstance(user_ml_feature_selection, list) and all(isinstance(item, str) for item in user_ml_feature_selection)):
-        return jsonify({"error": "Invalid format for ml_features. Must be a list of strings."}), 400
-
+    validated_data, error_response = validate_request_data(CustomModelTrainingSchema, data)
+    if error_response:
+        return error_response
+    if not s3_client:
+        return jsonify({"error": "Cloud storage is not configured. Models cannot be trained on this server."}), 503
 
+    position_group = validated_data["position_group"]
+    custom_model_name_prefix = validated_data.get("model_name", f"custom_{position_group.lower()}")
     custom_model_id = f"{custom_model_name_prefix.replace(' ', '_').replace('-', '_')}_{uuid.uuid4().hex[:6]}"
-    custom_model_display_name = custom_model_name_prefix
-
-    user_impact_kpis_config = {position_group: user_impact_kpis_list}
-    user_target_kpis_for_weight_derivation_config = {position_group: user_target_kpis_list}
+    time_budget_seconds = validated_data.get("time_budget_seconds")
 
     try:
-        success, message = build_and_train_model_from_script_logic(
-            r2_bucket_name=R2_BUCKET_NAME,
-            r2_endpoint_url=R2_ENDPOINT_URL,
-            r2_access_key_id=R2_ACCESS_KEY_ID,
-            r2_secret_access_key=R2_SECRET_ACCESS_KEY,
-            custom_model_id=custom_model_id,
-            position_group_to_train=position_group,
-            user_composite_impact_kpis=user_impact_kpis_config,
-            user_kpi_definitions_for_weight_derivation=user_target_kpis_for_weight_derivation_config,
-            user_ml_feature_subset=user_ml_feature_selection,
-            base_output_dir_for_custom_model=CUSTOM_MODELS_DIR
-        )
-        if success:
-            return jsonify({"message": message, "custom_model_id": custom_model_id}), 201
-        else:
-            return jsonify({"error": message}), 500
+        job_id = training_job_queue.submit({
+            "custom_model_id": custom_model_id,
+            "position_group": position_group,
+            "impact_kpis": validated_data["impact_kpis"],
+            "target_kpis": validated_data["target_kpis"],
+            "ml_features": validated_data.get("ml_features"),
+            "search_mode": validated_data.get("search_mode") or ("halving" if time_budget_seconds else "random"),
+            "time_budget_seconds": time_budget_seconds
+        })
     except Exception as e:
-        logger.error(f"Error building custom model '{custom_model_id}': {e}", exc_info=True)
-        return jsonify({"error": f"Internal server error during custom model build: {str(e)}"}), 500
+        logger.error(f"Error queueing custom model '{custom_model_id}': {e}", exc_info=True)
+        return jsonify({"error": f"Internal server error while queueing the training job: {str(e)}"}), 500
+    return jsonify({
+        "message": "Model training queued",
+        "job_id": job_id,
+        "custom_model_id": custom_model_id,
+        "status_url": f"/api/custom_model/jobs/{job_id}"
+    }), 202
+
+
+@app.route("/api/custom_model/jobs/<job_id>")
+def custom_model_job_status(job_id):
+    """Status, per-stage progress and ETA of a training job queued by /api/custom_model/build."""
+    job = training_job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Training job not found"}), 404
+    return jsonify(job)
 
 
 @app.route("/api/custom_model/trigger_github_training", methods=['POST'])
@@ -783,6 +920,8 @@ def trigger_github_training():
     user_target_kpis_list = validated_data["target_kpis"]
     custom_model_name_prefix = validated_data.get("model_name", f"custom_{position_group.lower()}")
     user_ml_feature_selection = validated_data.get("ml_features")
+    time_budget_seconds = validated_data.get("time_budget_seconds")
+    search_mode = validated_data.get("search_mode") or ("halving" if time_budget_seconds else "random")
 
     if not GITHUB_TOKEN:
         return jsonify({
@@ -802,7 +941,9 @@ def trigger_github_training():
             "position_group": position_group,
             "impact_kpis": user_impact_kpis_list,
             "target_kpis": user_target_kpis_list,
-            "ml_features": user_ml_feature_selection
+            "ml_features": user_ml_feature_selection,
+            "search_mode": search_mode,
+            "time_budget_seconds": time_budget_seconds
         }
     }
 
@@ -821,6 +962,8 @@ def trigger_github_training():
                 "success": True,
                 "message": f"Model training started successfully",
                 "custom_model_id": custom_model_id,
+                "search_mode": search_mode,
+                "time_budget_seconds": time_budget_seconds,
                 "estimated_time": "45-90 minutes",
                 "instructions": "The model will be available in the list once training completes. This typically takes 45-90 minutes depending on data size and complexity."
             }
@@ -852,44 +995,10 @@ def list_custom_models():
     
     if s3_client and R2_BUCKET_NAME:
         try:
-            logger.info("Listing custom models from R2...")
-            response = s3_client.list_objects_v2(
-                Bucket=R2_BUCKET_NAME,
-                Prefix='ml_models/custom_models/',
-                Delimiter='/'
-            )
-            
-            if 'CommonPrefixes' in response:
-                for prefix in response['CommonPrefixes']:
-                    model_folder = prefix['Prefix']
-                    model_id = model_folder.strip('/').split('/')[-1]
-                    
-                    for position_group in ['attacker', 'midfielder', 'defender']:
-                        config_key = f"{model_folder}{position_group}/model_config_{position_group}_{model_id}.json"
-                        try:
-                            config_obj = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key=config_key)
-                            config_content = config_obj['Body'].read().decode('utf-8')
-                            cfg = json.loads(config_content)
-                            
-                            position_display = position_group.capitalize()
-                            display_name = cfg.get("model_display_name", cfg.get("model_type", ""))
-
-                            custom_models_list.append({
-                                "id": model_id,
-                                "name": display_name,
-                                "position_group": cfg.get("position_group_trained_for", position_display),
-                                "description": cfg.get("description", "Custom Potential Model")
-                            })
-                            logger.info(f"Found custom model: {model_id} for {position_display}")
-                        except Exception as e:
-                            if 'NoSuchKey' in str(e) or '404' in str(e):
-                                pass
-                            else:
-                                logger.error(f"Error reading config for {model_id}/{position_group}: {e}")
-            
-            logger.info(f"Found {len(custom_models_list)} custom models in R2")
+            custom_models_list = model_catalog.models()
+            logger.info(f"Found {len(custom_models_list)} custom models in the R2 model catalog")
         except Exception as e:
-            logger.error(f"Error listing custom models from R2: {e}", exc_info=True)
+            logger.error(f"Error reading the custom model catalog: {e}", exc_info=True)
     
     if os.path.exists(CUSTOM_MODELS_DIR):
         for model_id_folder in os.listdir(CUSTOM_MODELS_DIR):
@@ -920,8 +1029,7 @@ def list_custom_models():
 
 def load_model_from_r2_cached(model_key: str, scaler_key: str, config_key: str):
     """
-    Load model, scaler, and config from R2.
-    Note: Caching temporarily disabled due to compatibility issues with lru_cache.
+    Load model, scaler, and config from R2 through the model registry cache.
     
     Args:
         model_key: R2 object key for the model file
@@ -931,29 +1039,325 @@ def load_model_from_r2_cached(model_key: str, scaler_key: str, config_key: str):
     Returns:
         tuple: (model, scaler, config_dict)
     """
-    logger.info(f"Loading model from R2: {model_key}")
-    
     try:
-        with BytesIO() as f_model:
-            s3_client.download_fileobj(Bucket=R2_BUCKET_NAME, Key=model_key, Fileobj=f_model)
-            f_model.seek(0)
-            model = joblib.load(f_model)
+        return model_registry.get(model_key, scaler_key, config_key)
+    except Exception as e:
+        logger.error(f" Failed to load model from R2: {str(e)}")
+        raise
+
+
+class PredictionError(Exception):
+    """Error raised while preparing a prediction, carrying the HTTP status to return."""
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _prediction_model_location(model_identifier):
+    """
+    Returns:
+        tuple: (models_prefix, effective_model_id_for_path, is_custom_model)
+    """
+    models_prefix, effective_model_id_for_path = model_artifact_location(model_identifier)
+    return models_prefix, effective_model_id_for_path, models_prefix == CUSTOM_MODELS_PREFIX
+
+
+def find_custom_model_position(model_identifier):
+    """Position a custom model was trained for (from the model catalog), or None if it is not in the catalog."""
+    _, effective_model_id_for_path, _ = _prediction_model_location(model_identifier)
+    model_position = model_catalog.position_of(effective_model_id_for_path)
+    if model_position:
+        logger.info(f"Found model files for position: {model_position}")
+    return model_position
+
+
+def load_prediction_model(model_identifier, model_position):
+    """
+    Load the model, scaler and config of ``model_identifier`` for ``model_position``.
+
+    Returns:
+        tuple: (model, scaler, config_dict, expected_ml_feature_names)
+
+    Raises:
+        PredictionError: when the files are missing or cannot be loaded
+    """
+    _, effective_model_id_for_path, _ = _prediction_model_location(model_identifier)
+    model_key, scaler_key, config_key = model_artifact_keys(model_identifier, model_position)
+    try:
+        model_to_load, scaler_to_load, model_cfg = load_model_from_r2_cached(model_key, scaler_key, config_key)
+    except Exception as e:
+        error_str = str(e)
+        if '404' in error_str or 'NoSuchKey' in error_str or 'Not Found' in error_str:
+            error_message = f"Model files not found in R2. Model ID: {model_identifier}, Position: {model_position}. Keys tried: model={model_key}, scaler={scaler_key}, config={config_key}"
+            logger.error(error_message)
+            raise PredictionError(error_message, 404)
+        logger.error(f"Failed to load model files from R2 for {model_identifier}. Keys: model={model_key}, scaler={scaler_key}, config={config_key}. Error: {error_str}", exc_info=True)
+        raise PredictionError(f"Could not load model files from cloud storage for {model_identifier}. Error: {error_str}", 500)
+
+    expected_ml_feature_names_for_model = model_cfg.get("features_used_for_ml_model", [])
+    if not expected_ml_feature_names_for_model:
+        raise PredictionError(f"Feature list missing in config for model {effective_model_id_for_path}", 500)
+    return model_to_load, scaler_to_load, model_cfg, expected_ml_feature_names_for_model
+
+
+def _position_mismatch_warning(model_identifier, model_position, player_position):
+    if not model_position or model_position == player_position:
+        return None
+    logger.warning(f"Position mismatch: Model {model_identifier} trained for {model_position}, but predicting for {player_position}")
+    return {
+        "message": f"This model was trained for {model_position}s, but the selected player is a {player_position}.",
+        "model_position": model_position,
+        "player_position": player_position
+    }
+
+
+def resolve_prediction_player(player_id_str, season_to_predict_for):
+    """
+    Look up the player and check a prediction is possible for them.
+
+    Returns:
+        dict: player_metadata, player_name, position_group and age_at_season
+
+    Raises:
+        PredictionError
+    """
+    player_metadata = player_directory.get(player_id_str)
+    if not player_metadata: raise PredictionError(f"Player metadata not found for ID {player_id_str}", 404)
+
+    primary_pos_str = player_metadata.get("position", "Unknown")
+    position_group_for_prediction = trainer_get_general_position(primary_pos_str)
+    if position_group_for_prediction not in ["Attacker", "Midfielder", "Defender"]:
+        raise PredictionError(f"Prediction not supported for position group: {position_group_for_prediction}", 400)
+
+    dob = player_metadata.get("dob")
+    if not dob: raise PredictionError("Player DOB not found", 400)
+    age_at_season = get_age_at_fixed_point_in_season(dob, season_to_predict_for)
+    if age_at_season is None: raise PredictionError("Could not calculate age", 400)
+
+    return {
+        "player_metadata": player_metadata,
+        "player_name": player_directory.get_name(player_id_str, "N/A"),
+        "position_group": position_group_for_prediction,
+        "age_at_season": age_at_season,
+    }
+
+
+def prediction_base_seasons(player_metadata, season_to_predict_for):
+    """
+    Seasons whose base features a prediction of ``season_to_predict_for`` uses:
+    the season itself and the earlier seasons played at most at
+    PREDICTION_MAX_HISTORY_AGE.
+
+    Returns:
+        list: (season, season_numeric, age_at_season) tuples, oldest first
+
+    Raises:
+        PredictionError
+    """
+    player_seasons_all = player_metadata.get("seasons", [])
+    if not player_seasons_all: raise PredictionError("No seasons for player", 404)
+
+    dob = player_metadata.get("dob")
+    target_s_numeric_pred = int(season_to_predict_for.split('_')[0])
+
+    base_seasons = []
+    for s_hist_or_current_pred in sorted(player_seasons_all):
+        s_numeric_hist_pred = int(s_hist_or_current_pred.split('_')[0])
+        if s_numeric_hist_pred > target_s_numeric_pred: continue 
         
-        with BytesIO() as f_scaler:
-            s3_client.download_fileobj(Bucket=R2_BUCKET_NAME, Key=scaler_key, Fileobj=f_scaler)
-            f_scaler.seek(0)
-            scaler = joblib.load(f_scaler)
+        age_for_this_s_pred = get_age_at_fixed_point_in_season(dob, s_hist_or_current_pred)
+        if age_for_this_s_pred is None: continue
+        if age_for_this_s_pred > PREDICTION_MAX_HISTORY_AGE and s_hist_or_current_pred != season_to_predict_for :
+             continue
+        base_seasons.append((s_hist_or_current_pred, s_numeric_hist_pred, age_for_this_s_pred))
+
+    if not base_seasons: 
+        raise PredictionError("Insufficient historical/current data for base feature extraction.", 404)
+    if season_to_predict_for not in [season for season, _, _ in base_seasons]:
+        raise PredictionError(f"Base features for target season {season_to_predict_for} not found after extraction.", 404)
+    return base_seasons
+
+
+def build_prediction_ml_features(player_id_str, season_to_predict_for, player_metadata, minutes_lookup):
+    """
+    Build the ML feature vector used to predict ``season_to_predict_for``
+    from the player's base features up to that season.
+
+    Returns:
+        pd.Series: ML features, as built by the trainer
+
+    Raises:
+        PredictionError
+    """
+    primary_pos_str = player_metadata.get("position", "Unknown")
+    target_s_numeric_pred = int(season_to_predict_for.split('_')[0])
+
+    df_all_base_features_for_player_list_pred = []
+    for s_hist_or_current_pred, s_numeric_hist_pred, age_for_this_s_pred in prediction_base_seasons(player_metadata, season_to_predict_for):
+        total_minutes_hist_pred = minutes_lookup.get(player_id_str, s_hist_or_current_pred)
+        num_90s_hist_pred = trainer_safe_division(total_minutes_hist_pred, 90.0)
         
-        response_cfg = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key=config_key)
-        config_content = response_cfg['Body'].read().decode('utf-8')
-        config = json.loads(config_content)
+        base_features_for_s_hist_pred = get_player_season_base_features(player_id_str, s_hist_or_current_pred, age_for_this_s_pred, s_numeric_hist_pred, num_90s_hist_pred)
         
-        logger.info(f" Model loaded successfully: {model_key}")
-        return model, scaler, config
+        base_features_for_s_hist_pred['player_id_identifier'] = player_id_str
+        base_features_for_s_hist_pred['target_season_identifier'] = s_hist_or_current_pred 
+        base_features_for_s_hist_pred['season_numeric'] = s_numeric_hist_pred
+        base_features_for_s_hist_pred['general_position_identifier'] = trainer_get_general_position(primary_pos_str)
+        df_all_base_features_for_player_list_pred.append(base_features_for_s_hist_pred)
+
+    df_all_base_features_for_player_df_pred = pd.DataFrame(df_all_base_features_for_player_list_pred).fillna(0.0)
     
+    current_season_data_row_for_ml = df_all_base_features_for_player_df_pred[
+        df_all_base_features_for_player_df_pred['target_season_identifier'] == season_to_predict_for
+    ].iloc[0]
+
+    historical_df_for_ml = df_all_base_features_for_player_df_pred[
+        df_all_base_features_for_player_df_pred['season_numeric'] < target_s_numeric_pred
+    ].sort_values(by='season_numeric') 
+
+    ml_features_series_pred = trainer_construct_ml_features_for_player_season(
+        current_season_base_features_row=current_season_data_row_for_ml,
+        historical_base_features_df=historical_df_for_ml,
+        all_base_metric_names=trainer_get_feature_names()
+    )
+
+    if ml_features_series_pred is None or ml_features_series_pred.empty:
+        raise PredictionError("Failed to construct ML features using trainer's logic.", 500)
+    return ml_features_series_pred
+
+
+def _extract_player_seasons_base_features(player_seasons):
+    """
+    Base features of the ``player_seasons`` rows (PLAYER_SEASON_KEY_COLUMNS,
+    age, season_numeric, num_90s_played) missing from the feature store,
+    extracted from their events with one grouped call per
+    PREDICTION_EXTRACTION_BATCH_SIZE player-seasons.
+
+    Returns:
+        DataFrame: base features, same index as ``player_seasons``
+    """
+    frames = []
+    for start in range(0, len(player_seasons), PREDICTION_EXTRACTION_BATCH_SIZE):
+        chunk = player_seasons.iloc[start:start + PREDICTION_EXTRACTION_BATCH_SIZE]
+        event_frames = []
+        for player_id, season in zip(chunk['player_id_identifier'], chunk['target_season_identifier']):
+            df_events_season = load_player_data(player_id, season, DATA_DIR)
+            event_frames.append((player_id, season, df_events_season if df_events_season is not None else pd.DataFrame()))
+        events_df, source_columns = trainer_stack_player_season_events(event_frames)
+        frames.append(trainer_extract_base_features_batch(events_df, chunk, source_columns))
+    return pd.concat(frames) if frames else pd.DataFrame(columns=trainer_get_feature_names())
+
+
+def build_batch_prediction_ml_features(instances, minutes_lookup):
+    """
+    ML feature vectors of many predictions, equal to calling
+    build_prediction_ml_features for each of them. Every needed player-season
+    is gathered once; those missing from the feature store are extracted with
+    grouped calls and the ML features of all instances are built in one
+    ml_feature_matrix pass.
+
+    Args:
+        instances: list of (player_id_str, season_to_predict_for, player_metadata)
+
+    Returns:
+        list: per instance, its ML features (pd.Series) or the PredictionError to report
+    """
+    outcomes = [None] * len(instances)
+    row_of_player_season = {}
+    player_season_rows = []
+    for i, (player_id_str, season_to_predict_for, player_metadata) in enumerate(instances):
+        try:
+            base_seasons = prediction_base_seasons(player_metadata, season_to_predict_for)
+        except PredictionError as e:
+            outcomes[i] = e
+            continue
+        general_position = trainer_get_general_position(player_metadata.get("position", "Unknown"))
+        for season, season_numeric, age in base_seasons:
+            if (player_id_str, season) in row_of_player_season:
+                continue
+            row_of_player_season[(player_id_str, season)] = len(player_season_rows)
+            player_season_rows.append({
+                'player_id_identifier': player_id_str, 'target_season_identifier': season, 'season_numeric': season_numeric,
+                'general_position_identifier': general_position, 'age': age,
+                'num_90s_played': trainer_safe_division(minutes_lookup.get(player_id_str, season), 90.0),
+            })
+    if not player_season_rows:
+        return outcomes
+
+    player_seasons = pd.DataFrame(player_season_rows)
+    stored = {}
+    for j, row in enumerate(player_season_rows):
+        base_features_series = base_feature_store.get(
+            row['player_id_identifier'], row['target_season_identifier'], age=row['age'], num_90s_played=row['num_90s_played']
+        )
+        if base_features_series is not None:
+            stored[j] = base_features_series
+    missing = player_seasons.drop(index=list(stored))
+    frames = [pd.DataFrame.from_dict(stored, orient='index')] if stored else []
+    if not missing.empty:
+        logger.info(f"Batch prediction: extracting base features of {len(missing)} player-seasons missing from the feature store.")
+        frames.append(_extract_player_seasons_base_features(missing))
+    df_all_seasons = pd.concat(frames).reindex(player_seasons.index).fillna(0.0)
+    for col in ('player_id_identifier', 'target_season_identifier', 'season_numeric', 'general_position_identifier'):
+        df_all_seasons[col] = player_seasons[col]
+
+    pending = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    instance_rows = [row_of_player_season[(instances[i][0], instances[i][1])] for i in pending]
+    ml_features = trainer_ml_feature_matrix(
+        df_all_seasons, df_all_seasons.iloc[instance_rows],
+        history_rows=player_seasons['age'] <= PREDICTION_MAX_HISTORY_AGE
+    )
+    ml_feature_names = get_trainer_all_possible_ml_feature_names()
+    for i, ml_feature_row in zip(pending, ml_features):
+        outcomes[i] = pd.Series(ml_feature_row, index=ml_feature_names, dtype='float64')
+    return outcomes
+
+
+def predict_potential_scores(model_to_load, scaler_to_load, expected_ml_feature_names_for_model, ml_feature_rows):
+    """
+    Scale and score a stack of ML feature vectors with one transform/predict call.
+
+    Args:
+        ml_feature_rows: list of pd.Series, one per instance
+
+    Returns:
+        np.ndarray: predicted potential scores clipped to [0, 200]
+    """
+    features_for_scaling_df_pred = pd.DataFrame(ml_feature_rows)
+    missing_features_in_generation = [col for col in expected_ml_feature_names_for_model if col not in features_for_scaling_df_pred.columns]
+    if missing_features_in_generation:
+        logger.warning(f"ML features expected by model but not generated by trainer's logic for prediction ({len(missing_features_in_generation)} missing): {missing_features_in_generation[:5]}...")
+
+    aligned_features_df_pred = features_for_scaling_df_pred.reindex(columns=expected_ml_feature_names_for_model).astype(float).fillna(0.0)
+    scaled_features_array_pred = scaler_to_load.transform(aligned_features_df_pred)
+    predicted_scores_raw = model_to_load.predict(scaled_features_array_pred)
+    return np.clip(np.asarray(predicted_scores_raw, dtype=float), 0.0, 200.0)
+
+
+def _prediction_result(player_id_str, season_to_predict_for, player_info, predicted_score, minutes_lookup, model_identifier, ml_features_series_pred, expected_ml_feature_names_for_model, position_mismatch_warning):
+    num_90s_target_season_pred = trainer_safe_division(minutes_lookup.get(player_id_str, season_to_predict_for), 90.0)
+    return {
+        "player_id": player_id_str, "player_name": player_info["player_name"],
+        "season_predicted_from": season_to_predict_for,
+        "age_at_season_start_of_year": player_info["age_at_season"], "position_group": player_info["position_group"],
+        "predicted_potential_score": round(float(predicted_score), 2),
+        "num_90s_played_in_season": round(num_90s_target_season_pred, 2),
+        "model_used": model_identifier,
+        "debug_num_ml_features_generated_for_pred": len(ml_features_series_pred) if ml_features_series_pred is not None else 0,
+        "debug_num_ml_features_expected_by_model": len(expected_ml_feature_names_for_model),
+        "position_mismatch_warning": position_mismatch_warning
+    }
+
+
+def _load_minutes_lookup_or_error():
+    if not s3_client:
+        raise PredictionError("Server not configured for cloud data access.", 500)
+    try:
+        return player_minutes_service.lookup()
     except Exception as e:
-        logger.error(f" Failed to load model from R2: {str(e)}")
-        raise
+        logger.error(f"Error loading player_season_minutes_with_names.csv from R2: {e}")
+        raise PredictionError("Could not load essential minutes data from cloud storage.", 500)
 
 
 @app.route("/scouting_predict")
@@ -964,7 +1368,7 @@ def scouting_predict():
         {
             "player_id": request.args.get("player_id"),
             "season": request.args.get("season"),
-            "model_id": request.args.get("model_id", "default_v14")
+            "model_id": request.args.get("model_id", DEFAULT_API_MODEL_ID)
         }
     )
     if error_response:
@@ -972,228 +1376,171 @@ def scouting_predict():
     
     player_id_str = validated_data["player_id"]
     season_to_predict_for = validated_data["season"]
-    model_identifier = validated_data.get("model_id", "default_v14")
+    model_identifier = validated_data.get("model_id", DEFAULT_API_MODEL_ID)
 
     try:
-        player_metadata = next((p_data for p_name, p_data in player_index_main_data.items() if isinstance(p_data, dict) and str(p_data.get("player_id")) == player_id_str), None)
-        player_name_from_index = next((p_name for p_name, p_data in player_index_main_data.items() if isinstance(p_data, dict) and str(p_data.get("player_id")) == player_id_str), "N/A")
-
-        if not player_metadata: return jsonify({"error": f"Player metadata not found for ID {player_id_str}"}), 404
-
-        primary_pos_str = player_metadata.get("position", "Unknown")
-        position_group_for_prediction = trainer_get_general_position(primary_pos_str)
-        if position_group_for_prediction not in ["Attacker", "Midfielder", "Defender"]:
-             return jsonify({"error": f"Prediction not supported for position group: {position_group_for_prediction}"}), 400
-
-        dob = player_metadata.get("dob")
-        if not dob: return jsonify({"error": "Player DOB not found"}), 400
-        age_at_season = get_age_at_fixed_point_in_season(dob, season_to_predict_for)
-        if age_at_season is None: return jsonify({"error": "Could not calculate age"}), 400
-
-        model_to_load = None; scaler_to_load = None; expected_ml_feature_names_for_model = []
-        effective_model_id_for_path = model_identifier
-        
-        is_custom_model = True
-        base_path_in_bucket = "ml_models/custom_models" 
-        
-        if model_identifier == "default_v14":
-            effective_model_id_for_path = "peak_potential_v2_15_16"
-            is_custom_model = False 
-            base_path_in_bucket = "ml_models/ml_model_files_peak_potential"
-
+        player_info = resolve_prediction_player(player_id_str, season_to_predict_for)
+        position_group_for_prediction = player_info["position_group"]
 
         if not s3_client:
             return jsonify({"error": "S3 client not initialized. Check server configuration."}), 500
-            
+
+        _, effective_model_id_for_path, is_custom_model = _prediction_model_location(model_identifier)
         logger.info(f"Loading model from R2. Bucket: {R2_BUCKET_NAME}, Model ID: {effective_model_id_for_path}, Player Position: {position_group_for_prediction}")
 
-        model_file_name_suffix = f"_{effective_model_id_for_path}"
-        
-        position_mismatch_warning = None
-        
         if is_custom_model:
-            possible_positions = ["Attacker", "Midfielder", "Defender"]
-            for pos in possible_positions:
-                test_config_key = f"{base_path_in_bucket}/{effective_model_id_for_path}/{pos.lower()}/model_config_{pos.lower()}{model_file_name_suffix}.json"
-                try:
-                    config_obj = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key=test_config_key)
-                    config_content = config_obj['Body'].read().decode('utf-8')
-                    test_cfg = json.loads(config_content)
-                    model_position_to_load_from = test_cfg.get("position_group_trained_for", pos)
-                    logger.info(f"Found model files for position: {model_position_to_load_from}")
-                    break
-                except Exception as e:
-                    if 'NoSuchKey' in str(e) or '404' in str(e):
-                        continue
-                    else:
-                        logger.warning(f"Error checking position {pos} for model {effective_model_id_for_path}: {e}")
-            
+            model_position_to_load_from = find_custom_model_position(model_identifier)
             if not model_position_to_load_from:
                 error_message = f"Model files not found in R2 for any position. Model ID: {model_identifier}. Checked positions: attacker, midfielder, defender"
                 logger.error(error_message)
                 return jsonify({"error": error_message}), 404
-            
-            if model_position_to_load_from != position_group_for_prediction:
-                position_mismatch_warning = {
-                    "message": f"This model was trained for {model_position_to_load_from}s, but the selected player is a {position_group_for_prediction}.",
-                    "model_position": model_position_to_load_from,
-                    "player_position": position_group_for_prediction
-                }
-                logger.warning(f"Position mismatch: Model {model_identifier} trained for {model_position_to_load_from}, but predicting for {position_group_for_prediction}")
         else:
             model_position_to_load_from = position_group_for_prediction
-        
-        model_key = f"{base_path_in_bucket}/{effective_model_id_for_path}/{model_position_to_load_from.lower()}/potential_model_{model_position_to_load_from.lower()}{model_file_name_suffix}.joblib"
-        scaler_key = f"{base_path_in_bucket}/{effective_model_id_for_path}/{model_position_to_load_from.lower()}/feature_scaler_{model_position_to_load_from.lower()}{model_file_name_suffix}.joblib"
-        config_key = f"{base_path_in_bucket}/{effective_model_id_for_path}/{model_position_to_load_from.lower()}/model_config_{model_position_to_load_from.lower()}{model_file_name_suffix}.json"
 
-        try:
-            model_to_load, scaler_to_load, model_cfg = load_model_from_r2_cached(
-                model_key, scaler_key, config_key
-            )
-            
-            expected_ml_feature_names_for_model = model_cfg.get("features_used_for_ml_model", [])
-            if not expected_ml_feature_names_for_model:
-                return jsonify({"error": f"Feature list missing in config for model {effective_model_id_for_path}"}), 500
-
-            if not is_custom_model:
-                model_position_trained = model_cfg.get("position_group_trained_for")
-                if model_position_trained and model_position_trained != position_group_for_prediction:
-                    position_mismatch_warning = {
-                        "message": f"This model was trained for {model_position_trained}s, but the selected player is a {position_group_for_prediction}.",
-                        "model_position": model_position_trained,
-                        "player_position": position_group_for_prediction
-                    }
-                    logger.warning(f"Position mismatch: Model {model_identifier} trained for {model_position_trained}, but predicting for {position_group_for_prediction}")
+        model_to_load, scaler_to_load, model_cfg, expected_ml_feature_names_for_model = load_prediction_model(model_identifier, model_position_to_load_from)
+        model_position_trained = model_position_to_load_from if is_custom_model else model_cfg.get("position_group_trained_for")
+        position_mismatch_warning = _position_mismatch_warning(model_identifier, model_position_trained, position_group_for_prediction)
 
-        except Exception as e:
-            error_str = str(e)
-            if '404' in error_str or 'NoSuchKey' in error_str or 'Not Found' in error_str:
-                error_message = f"Model files not found in R2. Model ID: {model_identifier}, Position: {model_position_to_load_from or position_group_for_prediction}. Keys tried: model={model_key}, scaler={scaler_key}, config={config_key}"
-                logger.error(error_message)
-                return jsonify({"error": error_message}), 404
-            else:
-                logger.error(f"Failed to load model files from R2 for {model_identifier}. Keys: model={model_key}, scaler={scaler_key}, config={config_key}. Error: {error_str}", exc_info=True)
-                return jsonify({"error": f"Could not load model files from cloud storage for {model_identifier}. Error: {error_str}"}), 500
+        minutes_lookup = _load_minutes_lookup_or_error()
+        ml_features_series_pred = build_prediction_ml_features(player_id_str, season_to_predict_for, player_info["player_metadata"], minutes_lookup)
 
-        player_seasons_all = player_metadata.get("seasons", [])
-        if not player_seasons_all: return jsonify({"error": "No seasons for player"}), 404
-        
-        minutes_df_global = pd.DataFrame()
-        if s3_client:
-            try:
-                response_minutes = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key="data/player_season_minutes_with_names.csv")
-                minutes_content = response_minutes['Body'].read().decode('utf-8')
-                minutes_df_global = pd.read_csv(StringIO(minutes_content))
-                minutes_df_global['season_name_std'] = minutes_df_global['season_name'].str.replace('/', '_', regex=False)
-            except Exception as e:
-                logger.error(f"Error loading player_season_minutes_with_names.csv from R2: {e}")
-                return jsonify({"error": "Could not load essential minutes data from cloud storage."}), 500
-        else:
-             return jsonify({"error": "Server not configured for cloud data access."}), 500
+        final_predicted_score = predict_potential_scores(model_to_load, scaler_to_load, expected_ml_feature_names_for_model, [ml_features_series_pred])[0]
 
-        target_s_numeric_pred = int(season_to_predict_for.split('_')[0])
-        all_base_metric_names_from_trainer = trainer_get_feature_names()
+        result = jsonify(_prediction_result(
+            player_id_str, season_to_predict_for, player_info, final_predicted_score, minutes_lookup, model_identifier,
+            ml_features_series_pred, expected_ml_feature_names_for_model, position_mismatch_warning
+        ))
+        gc.collect()
+        return result
 
-        df_all_base_features_for_player_list_pred = []
-        for s_hist_or_current_pred in sorted(player_seasons_all):
-            s_numeric_hist_pred = int(s_hist_or_current_pred.split('_')[0])
-            if s_numeric_hist_pred > target_s_numeric_pred: continue 
-            
-            age_for_this_s_pred = get_age_at_fixed_point_in_season(dob, s_hist_or_current_pred)
-            if age_for_this_s_pred is None: continue
-            if age_for_this_s_pred > 21 and s_hist_or_current_pred != season_to_predict_for :
-                 continue
-
-            player_minutes_row_hist_pred = minutes_df_global[(minutes_df_global['player_id'].astype(str) == player_id_str) & (minutes_df_global['season_name_std'] == s_hist_or_current_pred)]
-            total_minutes_hist_pred = player_minutes_row_hist_pred['total_minutes_played'].iloc[0] if not player_minutes_row_hist_pred.empty else 0.0
-            num_90s_hist_pred = trainer_safe_division(total_minutes_hist_pred, 90.0)
-            
-            df_events_hist_pred = load_player_data(player_id_str, s_hist_or_current_pred, DATA_DIR) 
-            if df_events_hist_pred is None: df_events_hist_pred = pd.DataFrame()
+    except PredictionError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        logger.error(f"Error in /scouting_predict (model: {model_identifier}): {e}", exc_info=True)
+        gc.collect()
+        return jsonify({"error": f"Unexpected error during prediction: {str(e)}"}), 500
 
-            base_features_for_s_hist_pred = trainer_extract_base_features(df_events_hist_pred, age_for_this_s_pred, s_numeric_hist_pred, num_90s_hist_pred)
-            
-            base_features_for_s_hist_pred['player_id_identifier'] = player_id_str
-            base_features_for_s_hist_pred['target_season_identifier'] = s_hist_or_current_pred 
-            base_features_for_s_hist_pred['season_numeric'] = s_numeric_hist_pred
-            base_features_for_s_hist_pred['general_position_identifier'] = trainer_get_general_position(primary_pos_str)
-            df_all_base_features_for_player_list_pred.append(base_features_for_s_hist_pred)
-
-        if not df_all_base_features_for_player_list_pred: 
-            return jsonify({"error": "Insufficient historical/current data for base feature extraction."}), 404
-        
-        df_all_base_features_for_player_df_pred = pd.DataFrame(df_all_base_features_for_player_list_pred).fillna(0.0)
-        
-        current_season_data_row_for_ml = df_all_base_features_for_player_df_pred[
-            df_all_base_features_for_player_df_pred['target_season_identifier'] == season_to_predict_for
-        ]
-        if current_season_data_row_for_ml.empty:
-            return jsonify({"error": f"Base features for target season {season_to_predict_for} not found after extraction."}), 404
-        current_season_data_row_for_ml = current_season_data_row_for_ml.iloc[0]
-
-        historical_df_for_ml = df_all_base_features_for_player_df_pred[
-            df_all_base_features_for_player_df_pred['season_numeric'] < target_s_numeric_pred
-        ].sort_values(by='season_numeric') 
-
-        ml_features_series_pred = trainer_construct_ml_features_for_player_season(
-            current_season_base_features_row=current_season_data_row_for_ml,
-            historical_base_features_df=historical_df_for_ml,
-            all_base_metric_names=all_base_metric_names_from_trainer
-        )
 
-        if ml_features_series_pred is None or ml_features_series_pred.empty:
-            return jsonify({"error": "Failed to construct ML features using trainer's logic."}), 500
+@app.route("/api/scouting_predict/batch", methods=['POST'])
+@limiter.limit("10 per minute")
+def scouting_predict_batch():
+    """
+    Predict the potential of many (player_id, season) pairs with one model.
 
-        features_for_scaling_df_pred = pd.DataFrame([ml_features_series_pred])
-        aligned_features_df_pred = pd.DataFrame(columns=expected_ml_feature_names_for_model)
-        
-        missing_features_in_generation = []
-        for col in expected_ml_feature_names_for_model:
-            if col in features_for_scaling_df_pred.columns: 
-                aligned_features_df_pred[col] = features_for_scaling_df_pred[col]
-            else: 
-                missing_features_in_generation.append(col)
-                aligned_features_df_pred[col] = 0.0 
-        
-        if missing_features_in_generation:
-            logger.warning(f"ML features expected by model but not generated by trainer's logic for prediction ({len(missing_features_in_generation)} missing): {missing_features_in_generation[:5]}...")
+    The model, scaler and minutes table are loaded once, the base features
+    missing from the feature store are extracted with grouped calls, the ML
+    feature vectors of all instances are built in one pass and scored with one
+    transform/predict call per model position. Rows that cannot be predicted carry their own error and
+    status instead of failing the whole request.
+    """
+    validated_data, error_response = validate_request_data(BatchPredictionRequestSchema, request.get_json(silent=True) or {})
+    if error_response:
+        return error_response
 
-        aligned_features_df_pred = aligned_features_df_pred.fillna(0.0)
+    model_identifier = validated_data.get("model_id") or DEFAULT_API_MODEL_ID
+    items = validated_data["players"]
+
+    try:
+        if not s3_client:
+            return jsonify({"error": "S3 client not initialized. Check server configuration."}), 500
+        minutes_lookup = _load_minutes_lookup_or_error()
 
-        scaled_features_array_pred = scaler_to_load.transform(aligned_features_df_pred)
-        predicted_potential_score_raw_pred = model_to_load.predict(scaled_features_array_pred)[0]
-        final_predicted_score = min(200.0, max(0.0, float(predicted_potential_score_raw_pred)))
+        _, _, is_custom_model = _prediction_model_location(model_identifier)
+        custom_model_position = None
+        if is_custom_model:
+            custom_model_position = find_custom_model_position(model_identifier)
+            if not custom_model_position:
+                return jsonify({"error": f"Model files not found in R2 for any position. Model ID: {model_identifier}. Checked positions: attacker, midfielder, defender"}), 404
 
-        num_90s_target_season_pred_row = minutes_df_global[(minutes_df_global['player_id'].astype(str) == player_id_str) & (minutes_df_global['season_name_std'] == season_to_predict_for)]
-        num_90s_target_season_pred = trainer_safe_division(num_90s_target_season_pred_row['total_minutes_played'].iloc[0], 90.0) if not num_90s_target_season_pred_row.empty else 0.0
+        results = [None] * len(items)
+        resolved = []
+        for i, item in enumerate(items):
+            try:
+                resolved.append((i, resolve_prediction_player(item["player_id"], item["season"])))
+            except PredictionError as e:
+                results[i] = {"player_id": item["player_id"], "season_predicted_from": item["season"], "error": e.message, "status": e.status_code}
 
-        result = jsonify({
-            "player_id": player_id_str, "player_name": player_name_from_index,
-            "season_predicted_from": season_to_predict_for,
-            "age_at_season_start_of_year": age_at_season, "position_group": position_group_for_prediction,
-            "predicted_potential_score": round(final_predicted_score, 2),
-            "num_90s_played_in_season": round(num_90s_target_season_pred, 2),
+        ml_features_by_item = build_batch_prediction_ml_features(
+            [(items[i]["player_id"], items[i]["season"], player_info["player_metadata"]) for i, player_info in resolved], minutes_lookup
+        )
+        pending_by_model_position = {}
+        for (i, player_info), ml_features_series_pred in zip(resolved, ml_features_by_item):
+            if isinstance(ml_features_series_pred, PredictionError):
+                results[i] = {"player_id": items[i]["player_id"], "season_predicted_from": items[i]["season"], "error": ml_features_series_pred.message, "status": ml_features_series_pred.status_code}
+                continue
+            model_position = custom_model_position or player_info["position_group"]
+            pending_by_model_position.setdefault(model_position, []).append((i, player_info, ml_features_series_pred))
+
+        for model_position, pending in pending_by_model_position.items():
+            try:
+                model_to_load, scaler_to_load, model_cfg, expected_ml_feature_names_for_model = load_prediction_model(model_identifier, model_position)
+                scores = predict_potential_scores(model_to_load, scaler_to_load, expected_ml_feature_names_for_model, [p[2] for p in pending])
+            except PredictionError as e:
+                for i, _, _ in pending:
+                    results[i] = {"player_id": items[i]["player_id"], "season_predicted_from": items[i]["season"], "error": e.message, "status": e.status_code}
+                continue
+
+            model_position_trained = model_position if is_custom_model else model_cfg.get("position_group_trained_for")
+            for (i, player_info, ml_features_series_pred), score in zip(pending, scores):
+                results[i] = _prediction_result(
+                    items[i]["player_id"], items[i]["season"], player_info, score, minutes_lookup, model_identifier, ml_features_series_pred,
+                    expected_ml_feature_names_for_model,
+                    _position_mismatch_warning(model_identifier, model_position_trained, player_info["position_group"])
+                )
+
+        num_failed = sum(1 for r in results if "error" in r)
+        gc.collect()
+        return jsonify({
             "model_used": model_identifier,
-            "debug_num_ml_features_generated_for_pred": len(ml_features_series_pred) if ml_features_series_pred is not None else 0,
-            "debug_num_ml_features_expected_by_model": len(expected_ml_feature_names_for_model),
-            "position_mismatch_warning": position_mismatch_warning
+            "results": results,
+            "num_requested": len(items),
+            "num_succeeded": len(items) - num_failed,
+            "num_failed": num_failed
         })
-        
-        if 'df_all_seasons_base_features' in locals():
-            del df_all_seasons_base_features
-        if 'minutes_df_global' in locals():
-            del minutes_df_global
-        if 'aligned_features_df_pred' in locals():
-            del aligned_features_df_pred
-        gc.collect()
-        
-        return result
 
+    except PredictionError as e:
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
-        logger.error(f"Error in /scouting_predict (model: {model_identifier}): {e}", exc_info=True)
+        logger.error(f"Error in /api/scouting_predict/batch (model: {model_identifier}): {e}", exc_info=True)
         gc.collect()
-        return jsonify({"error": f"Unexpected error during prediction: {str(e)}"}), 500
+        return jsonify({"error": f"Unexpected error during batch prediction: {str(e)}"}), 500
+
+
+@app.route("/api/leaderboard")
+@limiter.limit("60 per minute")
+def potential_leaderboard_route():
+    """
+    Ranked predicted potentials from the materialized leaderboard.
+
+    Query params: ``model_id`` (default ``default_v14``), ``season``,
+    ``position_group``, ``min_age``, ``max_age``, ``min_90s`` and ``limit`` /
+    ``offset`` for pagination. No model is run; see model_trainer.leaderboard.
+    """
+    validated_data, error_response = validate_request_data(LeaderboardQuerySchema, request.args.to_dict())
+    if error_response:
+        return error_response
+
+    model_identifier = validated_data.get("model_id") or DEFAULT_API_MODEL_ID
+    filters = {k: validated_data.get(k) for k in ("season", "position_group", "min_age", "max_age", "min_90s")}
+    offset = validated_data.get("offset", 0)
+    limit = validated_data.get("limit", 50)
+    try:
+        total, results = potential_leaderboard.query(model_identifier, offset=offset, limit=limit, **filters)
+    except Exception as e:
+        logger.error(f"Error reading the potential leaderboard: {e}", exc_info=True)
+        return jsonify({"error": "Leaderboard not available."}), 503
+    if total is None:
+        return jsonify({"error": f"No leaderboard materialized for model {model_identifier}."}), 404
+
+    return jsonify({
+        "model_used": model_identifier,
+        "filters": {k: v for k, v in filters.items() if v is not None},
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "results": results
+    })
 
 @app.route("/api/custom_model/available_ml_features")
 def available_ml_features_for_custom_model():
@@ -1204,6 +1551,32 @@ def available_ml_features_for_custom_model():
         logger.error(f"Error fetching available ML features: {e}", exc_info=True)
         return jsonify({"error": str(e), "available_ml_features": []}), 500
 
+@app.route("/api/custom_model/preview_weights", methods=['POST'])
+@limiter.limit("60 per minute")
+def preview_custom_model_weights():
+    """
+    KPI weights and peak potential target distribution a custom model would be
+    trained with, computed from the in-memory base feature store instead of
+    running the training workflow.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Missing JSON payload"}), 400
+    validated_data, error_response = validate_request_data(KpiWeightPreviewSchema, data)
+    if error_response:
+        return error_response
+    try:
+        training_table = base_feature_store.training_table(player_index_main_data)
+        if training_table.empty:
+            return jsonify({"error": "Base feature store is not loaded. The preview is not available."}), 503
+        preview = preview_potential_target(
+            training_table, validated_data["position_group"], validated_data["impact_kpis"], validated_data["target_kpis"]
+        )
+        return jsonify(preview)
+    except Exception as e:
+        logger.error(f"Error previewing KPI weights: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
 
 @app.route("/api/player/<player_id>/goalkeeper/analysis/<season>")
 @limiter.limit("20 per minute")
@@ -1212,7 +1585,7 @@ def goalkeeper_analysis_route(player_id, season):
     if not player_id or not season:
         return jsonify({"error": "Falta player_id o season"}), 400
     try:
-        df_player = load_player_data(player_id, season, DATA_DIR)
+        df_player = load_player_data(player_id, season, DATA_DIR, columns=GOALKEEPER_COLUMNS)
         analysis_results = _calculate_goalkeeper_metrics(df_player, player_id)
 
         del df_player
@@ -1232,36 +1605,35 @@ def pass_map_plot_route():
     season = request.args.get("season")
     try:
         if not player_id or not season: return jsonify({"error": "Missing player_id or season"}), 400
-        df = load_player_data(player_id, season, DATA_DIR)
+        df = load_player_data(player_id, season, DATA_DIR, columns=PASS_MAP_COLUMNS)
         if df is None or df.empty: return jsonify({"passes": []})
 
         df_passes = df[df.get("type") == "Pass"].copy() if "type" in df.columns else pd.DataFrame()
-        if df_passes.empty or not all(c in df_passes.columns for c in ["location", "pass_end_location"]):
+        if df_passes.empty or not (_has_location(df_passes, "location") and _has_location(df_passes, "pass_end_location")):
             return jsonify({"passes": []})
 
-        df_passes["location_eval"] = df_passes["location"].apply(safe_literal_eval)
-        df_passes["pass_end_location_eval"] = df_passes["pass_end_location"].apply(safe_literal_eval)
-        df_passes.dropna(subset=["location_eval", "pass_end_location_eval"], inplace=True)
+        df_passes = df_passes.dropna(subset=["location_x", "location_y", "pass_end_location_x", "pass_end_location_y"])
 
-        df_passes = df_passes[
-            df_passes["location_eval"].apply(lambda x: isinstance(x, (list, tuple)) and len(x) >= 2) &
-            df_passes["pass_end_location_eval"].apply(lambda x: isinstance(x, (list, tuple)) and len(x) >= 2)
-        ]
+        completed = df_passes["pass_outcome"].isna().to_numpy() if "pass_outcome" in df_passes.columns else np.ones(len(df_passes), dtype=bool)
+        if "pass_goal_assist" in df_passes.columns:
+            assists = (df_passes["pass_goal_assist"].astype(str).str.lower() == 'true').to_numpy()
+        else:
+            assists = np.zeros(len(df_passes), dtype=bool)
 
-        pass_data = []
-        for _, row in df_passes.iterrows():
-            loc = row["location_eval"]
-            end_loc = row["pass_end_location_eval"]
-            outcome = row.get("pass_outcome")
-            assist_flag = row.get("pass_goal_assist", False)
-
-            pass_data.append({
-                "start_x": loc[0], "start_y": loc[1],
-                "end_x": end_loc[0], "end_y": end_loc[1],
-                "completed": pd.isna(outcome),
-                "assist": str(assist_flag).lower() == 'true',
-                "final_third": end_loc[0] > 80
-            })
+        pass_data = [
+            {
+                "start_x": float(sx), "start_y": float(sy),
+                "end_x": float(ex), "end_y": float(ey),
+                "completed": bool(done),
+                "assist": bool(assist),
+                "final_third": bool(ex > 80)
+            }
+            for sx, sy, ex, ey, done, assist in zip(
+                df_passes["location_x"].to_numpy(), df_passes["location_y"].to_numpy(),
+                df_passes["pass_end_location_x"].to_numpy(), df_passes["pass_end_location_y"].to_numpy(),
+                completed, assists
+            )
+        ]
         return jsonify({"passes": pass_data})
     except Exception as e:
         logger.error(f"Error in /pass_map_plot for {player_id}/{season}: {e}", exc_info=True)
@@ -1313,11 +1685,7 @@ def player_seasonal_metric_trend_route():
         return jsonify({"error": "Missing player_id or metric"}), 400
 
     try:
-        player_metadata = None
-        if isinstance(player_index_main_data, dict):
-            player_metadata = next((data for name, data in player_index_main_data.items() if str(data.get("player_id")) == player_id), None)
-        elif isinstance(player_index_main_data, list):
-             player_metadata = next((data for data in player_index_main_data if str(data.get("player_id")) == player_id), None)
+        player_metadata = player_directory.get(player_id)
 
         if not player_metadata:
             return jsonify({"error": "Player not found"}), 404
@@ -1326,18 +1694,13 @@ def player_seasonal_metric_trend_route():
         if not player_seasons:
             return jsonify({"trend_data": [], "metric_label": metric_to_aggregate}), 200
 
-        minutes_df_global = pd.DataFrame()
-        if s3_client:
-            try:
-                response_minutes = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key="data/player_season_minutes_with_names.csv")
-                minutes_content = response_minutes['Body'].read().decode('utf-8')
-                minutes_df_global = pd.read_csv(StringIO(minutes_content))
-                minutes_df_global['season_name_std'] = minutes_df_global['season_name'].str.replace('/', '_', regex=False)
-            except Exception as e:
-                logger.error(f"Error loading player_season_minutes_with_names.csv from R2: {e}")
-                return jsonify({"error": "Could not load essential minutes data from cloud storage."}), 500
-        else:
+        if not s3_client:
              return jsonify({"error": "Server not configured for cloud data access."}), 500
+        try:
+            minutes_lookup = player_minutes_service.lookup()
+        except Exception as e:
+            logger.error(f"Error loading player_season_minutes_with_names.csv from R2: {e}")
+            return jsonify({"error": "Could not load essential minutes data from cloud storage."}), 500
 
         trend_data_list = []
         all_possible_base_features = trainer_get_feature_names() 
@@ -1345,12 +1708,8 @@ def player_seasonal_metric_trend_route():
         if metric_to_aggregate not in all_possible_base_features:
             return jsonify({"error": f"Metric '{metric_to_aggregate}' is not a valid aggregatable metric."}), 400
 
-        for season_str in player_seasons:
-            player_minutes_row = minutes_df_global[
-                (minutes_df_global['player_id'].astype(str) == player_id) & 
-                (minutes_df_global['season_name_std'] == season_str)
-            ]
-            total_minutes = player_minutes_row['total_minutes_played'].iloc[0] if not player_minutes_row.empty else 0.0
+        season_minutes = minutes_lookup.get_many([player_id] * len(player_seasons), player_seasons)
+        for season_str, total_minutes in zip(player_seasons, season_minutes):
             num_90s = trainer_safe_division(total_minutes, 90.0)
             
             dob = player_metadata.get("dob")
@@ -1360,16 +1719,7 @@ def player_seasonal_metric_trend_route():
             
             season_numeric = int(season_str.split('_')[0]) 
 
-            df_events_season = load_player_data(player_id, season_str, DATA_DIR)
-            if df_events_season is None: 
-                df_events_season = pd.DataFrame()
-            
-            base_features_series = trainer_extract_base_features(
-                df_events_season, 
-                age_at_season, 
-                season_numeric, 
-                num_90s
-            )
+            base_features_series = get_player_season_base_features(player_id, season_str, age_at_season, season_numeric, num_90s)
             
             metric_value = base_features_series.get(metric_to_aggregate, 0.0)
 
@@ -1426,11 +1776,7 @@ def player_single_season_aggregated_metric_route():
         return jsonify({"error": "This endpoint is for single seasons only. Use /player_seasonal_metric_trend for all seasons."}), 400
 
     try:
-        player_metadata = None
-        if isinstance(player_index_main_data, dict):
-            player_metadata = next((data for name, data in player_index_main_data.items() if str(data.get("player_id")) == player_id), None)
-        elif isinstance(player_index_main_data, list):
-             player_metadata = next((data for data in player_index_main_data if str(data.get("player_id")) == player_id), None)
+        player_metadata = player_directory.get(player_id)
 
         if not player_metadata:
             return jsonify({"error": "Player not found"}), 404
@@ -1439,24 +1785,15 @@ def player_single_season_aggregated_metric_route():
         if metric_to_aggregate not in all_possible_base_features:
             return jsonify({"error": f"Metric '{metric_to_aggregate}' is not a valid aggregatable metric."}), 400
 
-        minutes_df_global = pd.DataFrame()
-        if s3_client:
-            try:
-                response_minutes = s3_client.get_object(Bucket=R2_BUCKET_NAME, Key="data/player_season_minutes_with_names.csv")
-                minutes_content = response_minutes['Body'].read().decode('utf-8')
-                minutes_df_global = pd.read_csv(StringIO(minutes_content))
-                minutes_df_global['season_name_std'] = minutes_df_global['season_name'].str.replace('/', '_', regex=False)
-            except Exception as e:
-                logger.error(f"Error loading player_season_minutes_with_names.csv from R2: {e}")
-                return jsonify({"error": "Could not load essential minutes data from cloud storage."}), 500
-        else:
-            return jsonify({"error": "Server not configured for data access."}), 500
+        if not s3_client:
+             return jsonify({"error": "Server not configured for data access."}), 500
+        try:
+            minutes_lookup = player_minutes_service.lookup()
+        except Exception as e:
+            logger.error(f"Error loading player_season_minutes_with_names.csv from R2: {e}")
+            return jsonify({"error": "Could not load essential minutes data from cloud storage."}), 500
 
-        player_minutes_row = minutes_df_global[
-            (minutes_df_global['player_id'].astype(str) == player_id) & 
-            (minutes_df_global['season_name_std'] == season_str)
-        ]
-        total_minutes = player_minutes_row['total_minutes_played'].iloc[0] if not player_minutes_row.empty else 0.0
+        total_minutes = minutes_lookup.get(player_id, season_str)
         num_90s = trainer_safe_division(total_minutes, 90.0)
         
         dob = player_metadata.get("dob")
@@ -1470,16 +1807,7 @@ def player_single_season_aggregated_metric_route():
             logger.error(f"Could not parse season_numeric from season_str: {season_str}")
             return jsonify({"error": f"Invalid season format: {season_str}"}), 400
 
-        df_events_season = load_player_data(player_id, season_str, DATA_DIR)
-        if df_events_season is None: 
-            df_events_season = pd.DataFrame() 
-        
-        base_features_series = trainer_extract_base_features(
-            df_events_season, 
-            age_at_season, 
-            season_numeric, 
-            num_90s
-        )
+        base_features_series = get_player_season_base_features(player_id, season_str, age_at_season, season_numeric, num_90s)
         
         
         metric_value = base_features_series.get(metric_to_aggregate, 0.0)
@@ -1509,8 +1837,13 @@ def player_single_season_aggregated_metric_route():
         return jsonify({"error": str(e)}), 500
 
 # --- Flask App Finalization ---
+# Routes that set their own Cache-Control/ETag headers; every other route is served as no-store.
+CACHE_MANAGED_ENDPOINTS = {"players_route"}
+
 @app.after_request
 def add_header(response):
+    if request.endpoint in CACHE_MANAGED_ENDPOINTS:
+        return response
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate, max-age=0"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
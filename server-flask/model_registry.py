@@ -0,0 +1,214 @@
+"""
+Cache of trained model artifacts (model, scaler and config) loaded from R2.
+
+Artifacts are kept unpickled in memory, bounded by the size of their files, and
+keyed by their R2 object keys (one entry per model id and position). Entries
+are revalidated against the R2 ETags every ``revalidate_seconds``; unchanged
+artifacts are not downloaded again. A local on-disk mirror lets a restarted
+worker reload artifacts whose ETags still match without downloading them.
+Concurrent requests for the same entry wait for a single load.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+# Loads of the same entry are serialized through one of this many locks, picked by hashing its keys.
+KEY_LOCK_STRIPES = 64
+
+
+def _is_missing_key_error(e):
+    return 'NoSuchKey' in str(e) or '404' in str(e) or 'Not Found' in str(e)
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU cache of (model, scaler, config) tuples.
+
+    Args:
+        s3_client: boto3 S3 client for R2
+        bucket: R2 bucket name
+        max_bytes: upper bound for the summed artifact file sizes kept in memory
+        revalidate_seconds: how long an entry is served before its ETags are checked
+        disk_cache_dir: directory of the on-disk mirror, or None to disable it
+    """
+
+    def __init__(self, s3_client, bucket, max_bytes, revalidate_seconds=300, disk_cache_dir=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.max_bytes = int(max_bytes)
+        self.revalidate_seconds = revalidate_seconds
+        self.disk_cache_dir = disk_cache_dir
+        if disk_cache_dir:
+            os.makedirs(disk_cache_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = tuple(threading.Lock() for _ in range(KEY_LOCK_STRIPES))
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.downloads = 0
+        self.disk_loads = 0
+        self.evictions = 0
+
+    def get(self, model_key, scaler_key, config_key):
+        """
+        Return (model, scaler, config_dict) for the given R2 keys, loading or
+        revalidating them when needed. Errors from R2 propagate to the caller.
+        """
+        keys = (model_key, scaler_key, config_key)
+        with self._key_lock(keys):
+            with self._lock:
+                entry = self._entries.get(keys)
+                if entry is not None:
+                    self._entries.move_to_end(keys)
+            if entry is not None and time.monotonic() - entry["checked_at"] < self.revalidate_seconds:
+                with self._lock:
+                    self.hits += 1
+                return entry["artifacts"]
+
+            if entry is not None:
+                etags = self._head_etags(keys)
+                with self._lock:
+                    self.revalidations += 1
+                if etags == entry["etags"]:
+                    entry["checked_at"] = time.monotonic()
+                    with self._lock:
+                        self.hits += 1
+                    return entry["artifacts"]
+                logger.info(f"Model artifacts changed on R2, reloading: {model_key}")
+
+            with self._lock:
+                self.misses += 1
+            artifacts, etags, size = self._load(keys)
+            self._put(keys, {"artifacts": artifacts, "etags": etags, "size": size, "checked_at": time.monotonic()})
+            return artifacts
+
+    def invalidate(self, model_id=None):
+        """
+        Drop cached entries whose keys contain
+        ``model_id``, or everything when it is None.
+
+        Returns:
+            int: number of artifact entries removed
+        """
+        with self._lock:
+            keys = [k for k in self._entries if model_id is None or any(f"/{model_id}/" in key for key in k)]
+            for k in keys:
+                entry = self._entries.pop(k)
+                self._total_bytes -= entry["size"]
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "downloads": self.downloads,
+                "disk_loads": self.disk_loads,
+                "evictions": self.evictions,
+            }
+
+    def _key_lock(self, keys):
+        # A fixed pool of striped locks: nothing to prune when entries are evicted or invalidated.
+        return self._key_locks[hash(keys) % len(self._key_locks)]
+
+    def _head_etags(self, keys):
+        return tuple(self.s3_client.head_object(Bucket=self.bucket, Key=key).get('ETag') for key in keys)
+
+    def _load(self, keys):
+        blobs, etags = self._read_disk_mirror(keys)
+        if blobs is None:
+            blobs, etags = [], []
+            for key in keys:
+                response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+                blobs.append(response['Body'].read())
+                etags.append(response.get('ETag'))
+            etags = tuple(etags)
+            with self._lock:
+                self.downloads += 1
+            self._write_disk_mirror(keys, blobs, etags)
+        else:
+            with self._lock:
+                self.disk_loads += 1
+
+        model = joblib.load(BytesIO(blobs[0]))
+        scaler = joblib.load(BytesIO(blobs[1]))
+        config = json.loads(blobs[2].decode('utf-8'))
+        logger.info(f" Model loaded successfully: {keys[0]}")
+        return (model, scaler, config), etags, sum(len(b) for b in blobs)
+
+    def _put(self, keys, entry):
+        with self._lock:
+            previous = self._entries.pop(keys, None)
+            if previous is not None:
+                self._total_bytes -= previous["size"]
+            if entry["size"] > self.max_bytes:
+                logger.info(f"Not caching {keys[0]}: {entry['size']} bytes exceeds model cache capacity of {self.max_bytes} bytes.")
+                return
+            self._entries[keys] = entry
+            self._total_bytes += entry["size"]
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted["size"]
+                self.evictions += 1
+
+    def _mirror_dir(self, keys):
+        return os.path.join(self.disk_cache_dir, hashlib.sha1("|".join(keys).encode('utf-8')).hexdigest())
+
+    def _read_disk_mirror(self, keys):
+        """Return (blobs, etags) from the disk mirror if its ETags still match R2, else (None, None)."""
+        if not self.disk_cache_dir:
+            return None, None
+        mirror_dir = self._mirror_dir(keys)
+        meta_path = os.path.join(mirror_dir, "etags.json")
+        if not os.path.exists(meta_path):
+            return None, None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                cached_etags = tuple(json.load(f)["etags"])
+            if cached_etags != self._head_etags(keys):
+                return None, None
+            blobs = []
+            for i in range(len(keys)):
+                with open(os.path.join(mirror_dir, f"artifact_{i}"), 'rb') as f:
+                    blobs.append(f.read())
+            return blobs, cached_etags
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable model mirror for {keys[0]}: {e}")
+            return None, None
+
+    def _write_disk_mirror(self, keys, blobs, etags):
+        if not self.disk_cache_dir or not all(etags):
+            return
+        mirror_dir = self._mirror_dir(keys)
+        try:
+            os.makedirs(mirror_dir, exist_ok=True)
+            meta_path = os.path.join(mirror_dir, "etags.json")
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            for i, blob in enumerate(blobs):
+                tmp_path = os.path.join(mirror_dir, f"artifact_{i}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    f.write(blob)
+                os.replace(tmp_path, os.path.join(mirror_dir, f"artifact_{i}"))
+            tmp_meta = os.path.join(mirror_dir, "etags.json.tmp")
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump({"keys": list(keys), "etags": list(etags)}, f)
+            os.replace(tmp_meta, meta_path)
+        except Exception as e:
+            logger.warning(f"Could not write model mirror for {keys[0]}: {e}")
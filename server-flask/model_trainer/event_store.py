@@ -0,0 +1,435 @@
+"""
+Columnar event store for the per-player-season StatsBomb event files.
+
+The event data lives on R2 as ``data/{season}/players/{player_id}_{season}.csv``.
+This module converts those files into Parquet next to them
+(``{player_id}_{season}.parquet``) with typed columns, boolean flags and the
+``*location*`` columns already split into float ``_x``/``_y``/``_z`` columns, and
+provides the readers used by the API and by the trainer. Readers prefer the
+Parquet file, decode only the requested columns and fall back to the CSV when
+the Parquet file has not been generated yet.
+
+Usage (from ``server-flask/``):
+    python -m model_trainer.event_store --season 2015_2016
+    python -m model_trainer.event_store --all --overwrite
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet support is optional; readers fall back to CSV.
+    pa = None
+    pq = None
+
+logger_event_store = logging.getLogger(__name__ + "_event_store")
+
+EVENT_BOOL_COLUMNS = sorted(set([
+    'counterpress', 'offensive', 'recovery_failure', 'deflection', 'save_block', 'aerial_won', 'nutmeg', 'overrun',
+    'no_touch', 'leads_to_shot', 'advantage', 'penalty', 'defensive', 'backheel', 'deflected', 'miscommunication',
+    'cross', 'cut_back', 'switch', 'shot_assist', 'pass_goal_assist', 'follows_dribble', 'first_time', 'open_goal',
+    'under_pressure', 'out'
+]))
+EVENT_NUMERIC_COLUMNS = ['duration', 'pass_length', 'pass_angle', 'shot_statsbomb_xg', 'statsbomb_xg']
+LOCATION_AXES = ('x', 'y', 'z')
+
+EVENT_PREFETCH_WORKERS = int(os.environ.get('EVENT_PREFETCH_WORKERS', '16'))
+EVENT_PREFETCH_MAX_IN_FLIGHT = int(os.environ.get('EVENT_PREFETCH_MAX_IN_FLIGHT', str(4 * EVENT_PREFETCH_WORKERS)))
+EVENT_PREFETCH_THROTTLE_RETRIES = 4
+THROTTLING_ERROR_CODES = ('SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequests', '429', '503')
+
+
+def event_csv_key(player_id, season):
+    return f"data/{season}/players/{player_id}_{season}.csv"
+
+
+def event_parquet_key(player_id, season):
+    return f"data/{season}/players/{player_id}_{season}.parquet"
+
+
+def parquet_available():
+    return pq is not None
+
+
+def is_missing_key_error(e):
+    if hasattr(e, 'response') and isinstance(getattr(e, 'response'), dict):
+        return e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound')
+    return 'NoSuchKey' in str(e)
+
+
+def is_throttling_error(e):
+    if hasattr(e, 'response') and isinstance(getattr(e, 'response'), dict):
+        return e.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+    return False
+
+
+def r2_client_config(max_pool_connections=None):
+    """
+    botocore client config for R2: a connection pool large enough for the
+    event prefetcher and adaptive retries, which back off and rate-limit the
+    client when R2 answers with throttling errors.
+    """
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=max_pool_connections or max(10, EVENT_PREFETCH_WORKERS + 4),
+        retries={'max_attempts': 8, 'mode': 'adaptive'},
+        connect_timeout=10,
+        read_timeout=60,
+    )
+
+
+def r2_client_from_env():
+    """
+    S3 client for the R2 bucket configured in the R2_* environment variables.
+    Used by the CLIs and by worker processes, which cannot share a client.
+    """
+    import boto3
+    return boto3.client(
+        's3',
+        endpoint_url=os.environ['R2_ENDPOINT_URL'],
+        aws_access_key_id=os.environ['R2_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['R2_SECRET_ACCESS_KEY'],
+        region_name='auto',
+        config=r2_client_config()
+    )
+
+
+def r2_env_configured():
+    return all(os.environ.get(name) for name in ('R2_ENDPOINT_URL', 'R2_ACCESS_KEY_ID', 'R2_SECRET_ACCESS_KEY'))
+
+
+def is_location_column(col):
+    return 'location' in col and not col.endswith(tuple(f"_{axis}" for axis in LOCATION_AXES))
+
+
+def location_axis_columns(col):
+    return [f"{col}_{axis}" for axis in LOCATION_AXES]
+
+
+def _looks_like_flag_column(series):
+    non_null = series.dropna()
+    if non_null.empty:
+        return False
+    return non_null.astype(str).str.lower().isin(['true', 'false']).all()
+
+
+def normalize_event_frame(df, infer_flags=False):
+    """
+    Apply the dtype conventions shared by the API and the event store: known
+    StatsBomb flags become nullable booleans and the numeric event attributes
+    are coerced to floats. With ``infer_flags`` any other column holding only
+    True/False text is converted to a boolean as well.
+
+    The base features are computed from these frames: a change that alters
+    them must bump trainer_v2.FEATURE_CODE_VERSION.
+    """
+    for col in df.columns:
+        if is_location_column(col):
+            continue
+        if col in EVENT_BOOL_COLUMNS or (infer_flags and df[col].dtype == 'object' and _looks_like_flag_column(df[col])):
+            if df[col].dtype == 'object':
+                df[col] = df[col].astype(str).str.lower().map({'true': True, 'false': False, 'nan': pd.NA, '': pd.NA}).astype('boolean')
+            elif pd.api.types.is_bool_dtype(df[col]):
+                df[col] = df[col].astype('boolean')
+            elif pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].map({1.0: True, 1: True, 0.0: False, 0: False}).astype('boolean')
+
+    for col in EVENT_NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def parse_location_values(values):
+    """
+    Vectorized parser for StatsBomb location strings ("[x, y]" or "[x, y, z]").
+
+    Args:
+        values: Series or array-like of location strings (missing values allowed)
+
+    Returns:
+        np.ndarray: float64 array of shape (n, 3) with NaN for missing coordinates
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    coords = np.full((len(series), len(LOCATION_AXES)), np.nan)
+    if series.empty:
+        return coords
+    parts = series.astype(str).str.strip('[]() ').str.split(',', n=len(LOCATION_AXES) - 1, expand=True)
+    for j in range(min(parts.shape[1], len(LOCATION_AXES))):
+        coords[:, j] = pd.to_numeric(parts[j].str.strip(), errors='coerce').to_numpy(dtype=float)
+    return coords
+
+
+def split_location_columns(df):
+    """
+    Replace every ``*location*`` column holding "[x, y]" / "[x, y, z]" values
+    with float64 ``{col}_x``, ``{col}_y`` and ``{col}_z`` columns.
+    """
+    for col in [c for c in df.columns if is_location_column(c)]:
+        coords = parse_location_values(df[col])
+        for j, axis_col in enumerate(location_axis_columns(col)):
+            df[axis_col] = coords[:, j]
+        df.drop(columns=[col], inplace=True)
+    return df
+
+
+def expand_event_columns(columns, available):
+    """
+    Map the logical column names requested by a caller onto the physical
+    columns present in a stored file. A location column such as ``location``
+    expands to ``location_x``/``location_y``/``location_z``.
+    """
+    available = list(available)
+    available_set = set(available)
+    selected = []
+    for col in columns:
+        if col in available_set:
+            selected.append(col)
+        elif is_location_column(col):
+            selected.extend(c for c in location_axis_columns(col) if c in available_set)
+    return list(dict.fromkeys(selected))
+
+
+def project_event_columns(df, columns):
+    if columns is None or df is None:
+        return df
+    return df[expand_event_columns(columns, df.columns)]
+
+
+def prepare_event_frame_for_storage(df):
+    df = normalize_event_frame(df, infer_flags=True)
+    df = split_location_columns(df)
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            # Mixed python objects (ints and strings in the same column) cannot be
+            # written as one Arrow type; store them as text.
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def event_frame_to_parquet_bytes(df):
+    if pq is None:
+        raise ImportError("pyarrow is required to write Parquet event files.")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    buffer = BytesIO()
+    pq.write_table(table, buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+def read_event_parquet(s3_client, bucket, player_id, season, columns=None):
+    """
+    Read a Parquet event file from R2, decoding only ``columns`` when given.
+
+    Returns:
+        DataFrame or None when the file does not exist or pyarrow is missing.
+    """
+    if pq is None:
+        return None
+    key = event_parquet_key(player_id, season)
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if is_missing_key_error(e):
+            return None
+        raise
+    parquet_file = pq.ParquetFile(BytesIO(response['Body'].read()))
+    selected = None
+    if columns is not None:
+        selected = expand_event_columns(columns, parquet_file.schema_arrow.names)
+    return parquet_file.read(columns=selected).to_pandas()
+
+
+def read_event_csv(s3_client, bucket, player_id, season, **read_csv_kwargs):
+    """
+    Read the original CSV event file from R2.
+
+    Returns:
+        DataFrame or None when the file does not exist.
+    """
+    key = event_csv_key(player_id, season)
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if is_missing_key_error(e):
+            return None
+        raise
+    return pd.read_csv(BytesIO(response['Body'].read()), **read_csv_kwargs)
+
+
+def load_event_frame(s3_client, bucket, player_id, season, columns=None, prefer_parquet=True, **read_csv_kwargs):
+    """
+    Load one player-season, from Parquet when available and from the CSV
+    otherwise. CSV frames go through the same ``normalize_event_frame`` as
+    the frames stored as Parquet, so flags and numeric attributes have the
+    same dtypes whichever file was read (location columns are left as text).
+
+    Returns:
+        tuple: (DataFrame or None, "parquet" | "csv" | None)
+    """
+    if prefer_parquet:
+        df = read_event_parquet(s3_client, bucket, player_id, season, columns=columns)
+        if df is not None:
+            return df, "parquet"
+    if columns is not None:
+        wanted = set(columns)
+        read_csv_kwargs.setdefault('usecols', lambda c: c in wanted)
+    df = read_event_csv(s3_client, bucket, player_id, season, **read_csv_kwargs)
+    if df is None:
+        return None, None
+    return normalize_event_frame(df, infer_flags=True), "csv"
+
+
+def _load_event_frame_with_backoff(s3_client, bucket, player_id, season, **load_kwargs):
+    for attempt in range(EVENT_PREFETCH_THROTTLE_RETRIES + 1):
+        try:
+            return load_event_frame(s3_client, bucket, player_id, season, **load_kwargs)[0]
+        except Exception as e:
+            if not is_throttling_error(e) or attempt == EVENT_PREFETCH_THROTTLE_RETRIES:
+                raise
+            time.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random()))
+
+
+def _prefetch_worker_count(s3_client, max_workers):
+    workers = max_workers or EVENT_PREFETCH_WORKERS
+    pool_size = getattr(getattr(getattr(s3_client, 'meta', None), 'config', None), 'max_pool_connections', None)
+    if isinstance(pool_size, int) and pool_size < workers:
+        logger_event_store.info(f"Limiting event prefetch to {pool_size} workers, the S3 client's connection pool size.")
+        workers = pool_size
+    return max(1, workers)
+
+
+def prefetch_event_frames(s3_client, bucket, player_seasons, max_workers=None, max_in_flight=None, **load_kwargs):
+    """
+    Load many player-seasons with ``load_event_frame`` on a thread pool while
+    the caller consumes them.
+
+    At most ``max_in_flight`` files are being downloaded or waiting to be
+    consumed at any time, so a slow consumer stops the downloads instead of
+    buffering the whole season in memory. Throttling errors are retried with
+    backoff on top of the client's own retries.
+
+    Args:
+        player_seasons: iterable of (player_id, season)
+        max_workers: download threads; defaults to EVENT_PREFETCH_WORKERS
+        max_in_flight: defaults to EVENT_PREFETCH_MAX_IN_FLIGHT
+        **load_kwargs: passed to load_event_frame
+
+    Yields:
+        tuple: (player_id, season, DataFrame or None, Exception or None) in
+            the order of ``player_seasons``; the frame is None when the file
+            does not exist or could not be loaded
+    """
+    workers = _prefetch_worker_count(s3_client, max_workers)
+    max_in_flight = max(workers, max_in_flight or EVENT_PREFETCH_MAX_IN_FLIGHT)
+    pending = iter(player_seasons)
+    in_flight = deque()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="event-prefetch")
+    try:
+        def submit_next():
+            for player_id, season in pending:
+                in_flight.append((player_id, season, executor.submit(
+                    _load_event_frame_with_backoff, s3_client, bucket, player_id, season, **load_kwargs)))
+                return True
+            return False
+
+        while len(in_flight) < max_in_flight and submit_next():
+            pass
+        while in_flight:
+            player_id, season, future = in_flight.popleft()
+            submit_next()
+            try:
+                frame, error = future.result(), None
+            except Exception as e:
+                frame, error = None, e
+            yield player_id, season, frame, error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def convert_player_season(s3_client, bucket, player_id, season, overwrite=False):
+    """
+    Convert one CSV event file on R2 into its Parquet counterpart.
+
+    Returns:
+        bool: True if a Parquet file was written.
+    """
+    parquet_key = event_parquet_key(player_id, season)
+    if not overwrite:
+        try:
+            s3_client.head_object(Bucket=bucket, Key=parquet_key)
+            return False
+        except Exception as e:
+            if not is_missing_key_error(e) and '404' not in str(e):
+                raise
+    df = read_event_csv(s3_client, bucket, player_id, season, low_memory=False)
+    if df is None:
+        return False
+    df = prepare_event_frame_for_storage(df)
+    s3_client.put_object(Bucket=bucket, Key=parquet_key, Body=event_frame_to_parquet_bytes(df))
+    return True
+
+
+def iter_event_csv_keys(s3_client, bucket, season=None):
+    """Yield (player_id, season) for every CSV event file stored on R2."""
+    prefix = f"data/{season}/players/" if season else "data/"
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            parts = key.split('/')
+            if len(parts) != 4 or parts[2] != 'players' or not key.endswith('.csv'):
+                continue
+            file_season = parts[1]
+            stem = parts[3][:-len('.csv')]
+            if not stem.endswith(f"_{file_season}"):
+                continue
+            yield stem[:-len(file_season) - 1], file_season
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert per-player-season CSV event files on R2 to Parquet.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--season', help="Season to convert, e.g. 2015_2016")
+    group.add_argument('--all', action='store_true', help="Convert every season found under data/")
+    parser.add_argument('--overwrite', action='store_true', help="Rewrite Parquet files that already exist")
+    args = parser.parse_args(argv)
+
+    if pq is None:
+        logger_event_store.error("pyarrow is not installed. Install it to build the Parquet event store.")
+        return 1
+
+    bucket = os.environ['R2_BUCKET_NAME']
+    s3_client = r2_client_from_env()
+
+    converted, skipped, failed = 0, 0, 0
+    for i, (player_id, season) in enumerate(iter_event_csv_keys(s3_client, bucket, None if args.all else args.season)):
+        try:
+            if convert_player_season(s3_client, bucket, player_id, season, overwrite=args.overwrite):
+                converted += 1
+            else:
+                skipped += 1
+        except Exception as e:
+            failed += 1
+            logger_event_store.error(f"Failed to convert {event_csv_key(player_id, season)}: {e}")
+        if (i + 1) % 200 == 0:
+            logger_event_store.info(f"  Processed {i + 1} event files ({converted} converted, {skipped} skipped, {failed} failed)...")
+
+    logger_event_store.info(f"Event store conversion complete: {converted} converted, {skipped} skipped, {failed} failed.")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+Precomputed per-player-season base features.
+
+Every row holds the ``get_feature_names_for_extraction()`` columns of one
+(player_id, season), as computed by ``extract_season_features`` from that
+player-season's events, plus the ``*_identifier`` columns used by the trainer.
+The table is partitioned by season on R2
+(``data/feature_store/base_features_{season}.parquet``) so a new season can be
+added without recomputing the others.
+
+The API loads the whole table into memory at startup and serves metric
+lookups, predictions and custom model target previews from it; the trainer
+reads it instead of re-parsing every event file in Pass 1.
+
+Every partition carries, in its Parquet metadata, the fingerprint it was
+built with: FEATURE_CODE_VERSION and the ETag of the minutes file
+(``num_90s_played`` and every per-90 feature depend on it). Readers skip
+partitions whose fingerprint differs from the current one, so the features
+are extracted from the events again instead of being served stale, and the
+incremental build rebuilds them.
+
+Usage (from ``server-flask/``):
+    python -m model_trainer.feature_store                      # build seasons not stored yet
+    python -m model_trainer.feature_store --season 2020_2021   # (re)build one season
+    python -m model_trainer.feature_store --all                # rebuild everything
+    python -m model_trainer.feature_store --all --workers 4    # extract on 4 processes
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from model_trainer.event_store import is_missing_key_error, parquet_available, r2_client_from_env
+from model_trainer.trainer_v2 import (
+    BASE_FEATURE_ID_COLUMNS,
+    FEATURE_CODE_VERSION,
+    extract_base_feature_table,
+    get_feature_names_for_extraction,
+    iter_player_season_entries,
+    load_player_minutes_lookup
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger_feature_store = logging.getLogger(__name__ + "_feature_store")
+
+FEATURE_STORE_PREFIX = "data/feature_store/"
+FEATURE_STORE_MINUTES_KEY = "data/player_season_minutes_with_names.csv"
+_FINGERPRINT_METADATA_KEY = b"feature_store_fingerprint"
+
+
+def feature_store_key(season):
+    return f"{FEATURE_STORE_PREFIX}base_features_{season}.parquet"
+
+
+def season_from_feature_store_key(key):
+    name = key[len(FEATURE_STORE_PREFIX):]
+    if not (name.startswith("base_features_") and name.endswith(".parquet")):
+        return None
+    return name[len("base_features_"):-len(".parquet")]
+
+
+def feature_store_fingerprint(s3_client, bucket):
+    """
+    Fingerprint the partitions built now would carry: FEATURE_CODE_VERSION
+    and the ETag of the minutes file (None when it does not exist).
+    """
+    try:
+        minutes_etag = s3_client.head_object(Bucket=bucket, Key=FEATURE_STORE_MINUTES_KEY).get('ETag')
+    except Exception as e:
+        if not is_missing_key_error(e):
+            raise
+        minutes_etag = None
+    return {"code": FEATURE_CODE_VERSION, "minutes": minutes_etag}
+
+
+def feature_table_to_parquet_bytes(df, fingerprint):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_FINGERPRINT_METADATA_KEY] = json.dumps(fingerprint, sort_keys=True).encode('utf-8')
+    buffer = BytesIO()
+    pq.write_table(table.replace_schema_metadata(metadata), buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+def list_feature_store_seasons(s3_client, bucket):
+    """Return {season: etag} for every stored season partition."""
+    seasons = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=FEATURE_STORE_PREFIX):
+        for obj in page.get('Contents', []):
+            season = season_from_feature_store_key(obj['Key'])
+            if season:
+                seasons[season] = obj.get('ETag')
+    return seasons
+
+
+def read_feature_store_season(s3_client, bucket, season, fingerprint=None):
+    """
+    Read one season partition.
+
+    Args:
+        fingerprint: when given (see feature_store_fingerprint), a partition
+            built with a different fingerprint is treated as missing
+
+    Returns:
+        DataFrame or None when the partition does not exist (or is stale) or pyarrow is missing.
+    """
+    if pq is None:
+        return None
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=feature_store_key(season))
+    except Exception as e:
+        if is_missing_key_error(e):
+            return None
+        raise
+    table = pq.read_table(BytesIO(response['Body'].read()))
+    if fingerprint is not None:
+        stored_fingerprint = (table.schema.metadata or {}).get(_FINGERPRINT_METADATA_KEY)
+        if stored_fingerprint is None or json.loads(stored_fingerprint) != fingerprint:
+            logger_feature_store.warning(f"Feature store partition {season} was built from other feature code or minutes, ignoring it.")
+            return None
+    return table.to_pandas()
+
+
+def load_feature_store(s3_client, bucket, seasons=None):
+    """
+    Read the stored base features, optionally only for ``seasons``. Stale
+    partitions are left out.
+
+    Returns:
+        DataFrame, or None when nothing is stored (or pyarrow is missing).
+    """
+    if pq is None:
+        return None
+    stored_seasons = sorted(list_feature_store_seasons(s3_client, bucket))
+    if seasons is not None:
+        stored_seasons = [s for s in stored_seasons if s in set(seasons)]
+    fingerprint = feature_store_fingerprint(s3_client, bucket)
+    frames = [df for df in (read_feature_store_season(s3_client, bucket, s, fingerprint) for s in stored_seasons) if df is not None]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_feature_store_season(s3_client, bucket, player_index, minutes_lookup, season, workers=1, fingerprint=None):
+    """
+    Extract the base features of every player listed for ``season`` and
+    write them as that season's partition.
+
+    Args:
+        fingerprint: the feature_store_fingerprint the minutes were read
+            under; read from R2 when not given
+
+    Returns:
+        int: number of player-season rows written
+    """
+    entries = list(iter_player_season_entries(player_index, seasons={season}, training_only=False))
+    if not entries:
+        return 0
+    if fingerprint is None:
+        fingerprint = feature_store_fingerprint(s3_client, bucket)
+    df = extract_base_feature_table(s3_client, bucket, entries, minutes_lookup, workers=workers)
+    df = df[get_feature_names_for_extraction() + BASE_FEATURE_ID_COLUMNS]
+    s3_client.put_object(Bucket=bucket, Key=feature_store_key(season), Body=feature_table_to_parquet_bytes(df, fingerprint))
+    return len(df)
+
+
+def build_feature_store(s3_client, bucket, seasons=None, rebuild=False, workers=1):
+    """
+    Build the season partitions of the feature store.
+
+    Args:
+        seasons: seasons to build; defaults to every season in the player index
+        rebuild: rebuild seasons that are already stored. Without it only the
+            seasons with no partition yet, or a stale one, are built
+            (incremental refresh).
+        workers: worker processes for the base feature extraction
+
+    Returns:
+        dict: season -> number of rows written, for the seasons built
+    """
+    response = s3_client.get_object(Bucket=bucket, Key="data/player_index.json")
+    player_index = json.loads(response['Body'].read().decode('utf-8'))
+    # Fingerprint first: if the minutes file changes while building, the partitions are marked stale, not fresh.
+    fingerprint = feature_store_fingerprint(s3_client, bucket)
+    minutes_lookup = load_player_minutes_lookup(s3_client, bucket)
+
+    index_seasons = sorted({e["season"] for e in iter_player_season_entries(player_index, training_only=False)})
+    target_seasons = [s for s in index_seasons if seasons is None or s in set(seasons)]
+    if not rebuild:
+        stored = list_feature_store_seasons(s3_client, bucket)
+        target_seasons = [
+            s for s in target_seasons
+            if s not in stored or read_feature_store_season(s3_client, bucket, s, fingerprint) is None
+        ]
+
+    built = {}
+    for season in target_seasons:
+        logger_feature_store.info(f"Building base features for season {season}...")
+        built[season] = build_feature_store_season(s3_client, bucket, player_index, minutes_lookup, season, workers=workers, fingerprint=fingerprint)
+        logger_feature_store.info(f"  Stored {built[season]} player-seasons for {season}.")
+    return built
+
+
+class BaseFeatureStore:
+    """
+    In-memory view of the feature store used by the API.
+
+    ``reload()`` re-reads only the season partitions whose ETag changed since
+    the last load, and drops the partitions built with another fingerprint.
+    Lookups return None for player-seasons that are not stored (or were
+    stored with other minutes), so callers can fall back to extracting the
+    features from the events.
+
+    With ``refresh_interval_seconds`` lookups revalidate the partitions at
+    most that often, so rebuilt partitions reach a running API. One request
+    reloads while the others keep being served from the loaded copy.
+    """
+
+    def __init__(self, s3_client, bucket, refresh_interval_seconds=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._checked_at = None
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+        self._frames = {}
+        self._etags = {}
+        self._fingerprint = None
+        self._stale = {}
+        self._index = {}
+        self._training_table = None
+        self._feature_names = get_feature_names_for_extraction()
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """
+        Returns:
+            int: number of player-season rows held after the reload
+        """
+        with self._reload_lock:
+            return self._reload()
+
+    def _current(self):
+        if self.refresh_interval_seconds is None:
+            return
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.refresh_interval_seconds:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_interval_seconds:
+                return
+            try:
+                self._reload()
+            except Exception as e:
+                logger_feature_store.warning(f"Could not revalidate the feature store, keeping the loaded partitions: {e}")
+                self._checked_at = time.monotonic()
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self):
+        if self.s3_client is None or not parquet_available():
+            return 0
+        self.reloads += 1
+        current = list_feature_store_seasons(self.s3_client, self.bucket)
+        fingerprint = feature_store_fingerprint(self.s3_client, self.bucket)
+        unchanged = fingerprint == self._fingerprint
+        frames = {s: df for s, df in self._frames.items() if unchanged and s in current and current[s] == self._etags.get(s)}
+        # Partitions already found stale under this fingerprint are not downloaded again until they change.
+        stale = {s: etag for s, etag in self._stale.items() if unchanged and current.get(s) == etag}
+        for season, etag in current.items():
+            if season in frames or season in stale:
+                continue
+            df = read_feature_store_season(self.s3_client, self.bucket, season, fingerprint)
+            if df is not None:
+                frames[season] = df
+            else:
+                stale[season] = etag
+
+        index = {}
+        for season, df in frames.items():
+            values = df.reindex(columns=self._feature_names).fillna(0.0).to_numpy(dtype='float64')
+            for row_pos, player_id in enumerate(df['player_id_identifier'].astype(str)):
+                index[(player_id, season)] = values[row_pos]
+
+        with self._lock:
+            self._frames = frames
+            self._etags = {s: current[s] for s in frames}
+            self._fingerprint = fingerprint
+            self._stale = stale
+            self._index = index
+            self._training_table = None
+        self._checked_at = time.monotonic()
+        return len(index)
+
+    def get(self, player_id, season, age=None, num_90s_played=None):
+        """
+        Base features of one player-season as a Series, or None if not stored.
+
+        Args:
+            age, num_90s_played: when given, the stored row is only returned if
+                it was computed with the same values
+        """
+        self._current()
+        values = self._index.get((str(player_id), str(season)))
+        if values is None:
+            return None
+        features = pd.Series(values, index=self._feature_names, dtype='float64')
+        if age is not None and not np.isclose(features['age'], age):
+            return None
+        if num_90s_played is not None and not np.isclose(features['num_90s_played'], num_90s_played):
+            return None
+        return features
+
+    def training_table(self, player_index):
+        """
+        The trainer's Pass 1 table (the player-seasons it trains on, in its
+        order) taken from the stored partitions. Built on first use for a
+        given player index and kept until the next reload.
+
+        Returns:
+            DataFrame, empty when nothing is stored
+        """
+        self._current()
+        with self._lock:
+            frames, cached = self._frames, self._training_table
+        if cached is not None and cached[0] is player_index:
+            return cached[1]
+        entries = pd.DataFrame(
+            [(e["player_id"], e["season"]) for e in iter_player_season_entries(player_index)],
+            columns=['player_id_identifier', 'target_season_identifier']
+        )
+        if entries.empty or not frames:
+            table = pd.DataFrame(columns=self._feature_names + BASE_FEATURE_ID_COLUMNS)
+        else:
+            stored = pd.concat(frames.values(), ignore_index=True)
+            stored['player_id_identifier'] = stored['player_id_identifier'].astype(str)
+            table = entries.merge(stored, on=['player_id_identifier', 'target_season_identifier'], how='inner')
+            table = table[self._feature_names + BASE_FEATURE_ID_COLUMNS]
+        with self._lock:
+            if self._frames is frames:
+                self._training_table = (player_index, table)
+        return table
+
+    def stats(self):
+        return {"seasons": sorted(self._frames), "stale_seasons": sorted(self._stale), "player_seasons": len(self._index), "reloads": self.reloads}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the per-player-season base feature store on R2.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--season', action='append', help="Season to (re)build, e.g. 2020_2021. Can be repeated.")
+    group.add_argument('--all', action='store_true', help="Rebuild every season")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for base feature extraction")
+    args = parser.parse_args(argv)
+
+    if not parquet_available():
+        logger_feature_store.error("pyarrow is not installed. Install it to build the feature store.")
+        return 1
+
+    bucket = os.environ['R2_BUCKET_NAME']
+    s3_client = r2_client_from_env()
+
+    built = build_feature_store(s3_client, bucket, seasons=args.season, rebuild=bool(args.season) or args.all, workers=args.workers)
+    logger_feature_store.info(f"Feature store build complete: {len(built)} seasons, {sum(built.values())} player-seasons written.")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+Materialized potential leaderboard.
+
+The batch job predicts the peak potential of every player-season with every
+model (the default model and every custom model in the model catalog), each
+position model scoring the player-seasons of its position group, and stores
+the result as one Parquet table on R2
+(``ml_models/leaderboard/potential_leaderboard.parquet``): model id, player,
+season, position group, age, 90s played and predicted score, sorted by model
+and descending score.
+
+ML features are built exactly as ``/scouting_predict`` builds them (history =
+earlier U21 seasons), once for all models, from the base feature store.
+
+The API loads the table into ``PotentialLeaderboard``, which keeps the rows of
+every (model, season, position group) combination as an index array already
+in ranking order; a query only masks that array by age and 90s played and
+slices a page, it never runs a model.
+
+Usage (from ``server-flask/``):
+    python -m model_trainer.leaderboard                     # every model
+    python -m model_trainer.leaderboard --model my_model    # refresh one model's rows
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from io import BytesIO
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from model_trainer.event_store import event_frame_to_parquet_bytes, is_missing_key_error, parquet_available, r2_client_from_env
+from model_trainer.model_catalog import CUSTOM_MODELS_PREFIX, read_model_catalog
+from model_trainer.trainer_v2 import (
+    DEFAULT_MODEL_ID,
+    DEFAULT_MODELS_PREFIX,
+    get_trainer_all_possible_ml_feature_names,
+    load_base_features_for_training,
+    load_player_minutes_lookup,
+    ml_feature_matrix,
+    position_model_keys,
+    safe_division
+)
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+logger_leaderboard = logging.getLogger(__name__ + "_leaderboard")
+
+LEADERBOARD_KEY = "ml_models/leaderboard/potential_leaderboard.parquet"
+# Model id the API and the leaderboard use for the default model (trainer_v2's DEFAULT_MODEL_ID).
+DEFAULT_API_MODEL_ID = "default_v14"
+POSITION_GROUPS = ("Attacker", "Midfielder", "Defender")
+# Only U21 seasons count as history, as in /scouting_predict.
+MAX_HISTORY_AGE = 21
+LEADERBOARD_COLUMNS = ['model_id', 'player_id', 'player_name', 'season', 'position_group', 'age', 'num_90s_played', 'predicted_potential_score']
+
+
+def model_artifact_location(model_id):
+    """
+    Returns:
+        tuple: (models prefix, model id in the artifact keys) of an API model id
+    """
+    if model_id == DEFAULT_API_MODEL_ID:
+        return DEFAULT_MODELS_PREFIX, DEFAULT_MODEL_ID
+    return CUSTOM_MODELS_PREFIX, model_id
+
+
+def model_artifact_keys(model_id, position_group):
+    """
+    Returns:
+        tuple: R2 keys of (model, scaler, config) of one position model
+    """
+    return position_model_keys(*model_artifact_location(model_id), position_group)
+
+
+def leaderboard_models(s3_client, bucket):
+    """Return {model id: [position groups]} for the default model and every catalogued custom model."""
+    models = {DEFAULT_API_MODEL_ID: list(POSITION_GROUPS)}
+    catalog, _ = read_model_catalog(s3_client, bucket)
+    for model_id, positions in sorted((catalog or {}).get("models", {}).items()):
+        models[model_id] = [p for p in POSITION_GROUPS if positions.get(p)]
+    return models
+
+
+def _load_position_model(s3_client, bucket, model_id, position_group):
+    model_key, scaler_key, config_key = model_artifact_keys(model_id, position_group)
+    blobs = [s3_client.get_object(Bucket=bucket, Key=key)['Body'].read() for key in (model_key, scaler_key, config_key)]
+    return joblib.load(BytesIO(blobs[0])), joblib.load(BytesIO(blobs[1])), json.loads(blobs[2].decode('utf-8'))
+
+
+def build_leaderboard_table(s3_client, bucket, model_ids=None, workers=1):
+    """
+    Predict every player-season with every position model.
+
+    Args:
+        model_ids: models to score; defaults to leaderboard_models()
+        workers: worker processes for base features missing from the feature store
+
+    Returns:
+        DataFrame: LEADERBOARD_COLUMNS, sorted by model and descending score
+    """
+    response = s3_client.get_object(Bucket=bucket, Key="data/player_index.json")
+    player_index = json.loads(response['Body'].read().decode('utf-8'))
+    minutes_lookup = load_player_minutes_lookup(s3_client, bucket)
+    base = load_base_features_for_training(s3_client, bucket, player_index, minutes_lookup, workers=workers).reset_index(drop=True)
+    if base.empty:
+        return pd.DataFrame(columns=LEADERBOARD_COLUMNS)
+
+    logger_leaderboard.info(f"Building ML features for {len(base)} player-seasons...")
+    ml_features = pd.DataFrame(
+        ml_feature_matrix(base, base, history_rows=base['age'] <= MAX_HISTORY_AGE),
+        columns=get_trainer_all_possible_ml_feature_names()
+    )
+    player_ids = base['player_id_identifier'].astype(str)
+    seasons = base['target_season_identifier'].astype(str)
+    rows = pd.DataFrame({
+        'player_id': player_ids,
+        'player_name': base['player_name_identifier'].astype(str),
+        'season': seasons,
+        'position_group': base['general_position_identifier'].astype(str),
+        'age': base['age'].astype('int16'),
+        'num_90s_played': np.array([safe_division(minutes_lookup.get(k, 0.0), 90.0) for k in zip(player_ids, seasons)], dtype='float32'),
+    })
+
+    available_models = leaderboard_models(s3_client, bucket)
+    frames = []
+    for model_id in (model_ids or list(available_models)):
+        for position_group in available_models.get(model_id, []):
+            instances = (rows['position_group'] == position_group).to_numpy()
+            if not instances.any():
+                continue
+            try:
+                model, scaler, config = _load_position_model(s3_client, bucket, model_id, position_group)
+            except Exception as e:
+                logger_leaderboard.warning(f"Skipping {model_id} ({position_group}): could not load its artifacts: {e}")
+                continue
+            X = ml_features[instances].reindex(columns=config['features_used_for_ml_model']).astype(float).fillna(0.0)
+            scores = np.clip(np.asarray(model.predict(scaler.transform(X)), dtype=float), 0.0, 200.0)
+            frame = rows[instances].copy()
+            frame.insert(0, 'model_id', model_id)
+            frame['predicted_potential_score'] = scores
+            frames.append(frame)
+            logger_leaderboard.info(f"  Scored {len(frame)} player-seasons with {model_id} ({position_group}).")
+
+    if not frames:
+        return pd.DataFrame(columns=LEADERBOARD_COLUMNS)
+    table = pd.concat(frames, ignore_index=True)
+    return _sorted_leaderboard(table)
+
+
+def _sorted_leaderboard(table):
+    table = table.sort_values(['model_id', 'predicted_potential_score', 'player_id', 'season'], ascending=[True, False, True, True], kind='mergesort')
+    table = table.reset_index(drop=True)[LEADERBOARD_COLUMNS]
+    for col in ('model_id', 'season', 'position_group'):
+        table[col] = table[col].astype('category')
+    return table
+
+
+def read_leaderboard(s3_client, bucket):
+    """
+    Returns:
+        tuple: (DataFrame, ETag), or (None, None) when no leaderboard is stored
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=LEADERBOARD_KEY)
+    except Exception as e:
+        if is_missing_key_error(e):
+            return None, None
+        raise
+    return pq.read_table(BytesIO(response['Body'].read())).to_pandas(), response.get('ETag')
+
+
+def materialize_leaderboard(s3_client, bucket, model_ids=None, workers=1):
+    """
+    Build the leaderboard and store it on R2. With ``model_ids`` only those
+    models are scored again; the stored rows of the other models are kept,
+    except for models no longer in the catalog.
+
+    Returns:
+        int: number of rows stored
+    """
+    table = build_leaderboard_table(s3_client, bucket, model_ids=model_ids, workers=workers)
+    if model_ids:
+        stored, _ = read_leaderboard(s3_client, bucket)
+        if stored is not None and not stored.empty:
+            keep = stored['model_id'].astype(str).isin(set(leaderboard_models(s3_client, bucket)) - set(model_ids))
+            stored = stored[keep.to_numpy()].astype({'model_id': str, 'season': str, 'position_group': str})
+            table = _sorted_leaderboard(pd.concat([stored, table.astype({'model_id': str, 'season': str, 'position_group': str})], ignore_index=True))
+    s3_client.put_object(Bucket=bucket, Key=LEADERBOARD_KEY, Body=event_frame_to_parquet_bytes(table))
+    return len(table)
+
+
+class PotentialLeaderboard:
+    """
+    In-memory leaderboard used by the API, reloaded when the stored table's
+    ETag changes (checked at most every ``refresh_interval_seconds``).
+    """
+
+    def __init__(self, s3_client, bucket, refresh_interval_seconds=300):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._state = None
+        self._etag = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.downloads = 0
+
+    def _current(self):
+        state = self._state
+        if state is not None and time.monotonic() - self._checked_at < self.refresh_interval_seconds:
+            return state
+        with self._lock:
+            if self._state is not None and time.monotonic() - self._checked_at < self.refresh_interval_seconds:
+                return self._state
+            try:
+                self._refresh()
+            except Exception as e:
+                if self._state is None:
+                    raise
+                logger_leaderboard.warning(f"Could not revalidate the leaderboard, keeping the loaded one: {e}")
+            self._checked_at = time.monotonic()
+            return self._state
+
+    def _refresh(self):
+        if self.s3_client is None or not parquet_available():
+            raise RuntimeError("Leaderboard storage not available.")
+        if self._state is not None:
+            try:
+                etag = self.s3_client.head_object(Bucket=self.bucket, Key=LEADERBOARD_KEY).get('ETag')
+            except Exception as e:
+                if not is_missing_key_error(e):
+                    raise
+                etag = None
+            if etag and etag == self._etag:
+                return
+        table, etag = read_leaderboard(self.s3_client, self.bucket)
+        self.downloads += 1
+        self._state = self._index(table) if table is not None else {"rows": 0, "groups": {}}
+        self._etag = etag
+        logger_leaderboard.info(f"Loaded potential leaderboard: {self._state['rows']} rows (ETag {etag}).")
+
+    @staticmethod
+    def _index(table):
+        # The stored order is already the ranking; every group is an index array into it, in that order.
+        table = table.reset_index(drop=True)
+        columns = {col: table[col].astype(str).to_numpy() for col in ('player_id', 'player_name')}
+        columns['age'] = table['age'].to_numpy(dtype='int16')
+        columns['num_90s_played'] = table['num_90s_played'].to_numpy(dtype='float32')
+        columns['predicted_potential_score'] = table['predicted_potential_score'].to_numpy(dtype='float64')
+        model_ids, seasons, positions = (table[col].astype(str).to_numpy() for col in ('model_id', 'season', 'position_group'))
+        columns.update({'season': seasons, 'position_group': positions})
+
+        groups = {}
+        for model_id in np.unique(model_ids):
+            in_model = np.flatnonzero(model_ids == model_id)
+            groups[(model_id, None, None)] = in_model
+            for season in np.unique(seasons[in_model]):
+                groups[(model_id, season, None)] = in_model[seasons[in_model] == season]
+            for position in np.unique(positions[in_model]):
+                in_position = in_model[positions[in_model] == position]
+                groups[(model_id, None, position)] = in_position
+                for season in np.unique(seasons[in_position]):
+                    groups[(model_id, season, position)] = in_position[seasons[in_position] == season]
+        return {"rows": len(table), "columns": columns, "groups": groups,
+                "models": sorted(np.unique(model_ids).tolist()), "seasons": sorted(np.unique(seasons).tolist())}
+
+    def query(self, model_id, season=None, position_group=None, min_age=None, max_age=None, min_90s=None, offset=0, limit=50):
+        """
+        Ranked player-seasons of ``model_id`` matching the filters.
+
+        Returns:
+            tuple: (total number of matches, list of result dicts for the
+                ``offset``/``limit`` page), or (None, []) when the model is
+                not in the leaderboard
+        """
+        state = self._current()
+        self.queries += 1
+        if (model_id, None, None) not in state["groups"]:
+            return None, []
+        rows = state["groups"].get((model_id, season, position_group), np.empty(0, dtype=np.int64))
+        columns = state["columns"]
+        mask = None
+        for values, bound, keep in (
+            (columns['age'], min_age, np.greater_equal), (columns['age'], max_age, np.less_equal),
+            (columns['num_90s_played'], min_90s, np.greater_equal),
+        ):
+            if bound is not None:
+                condition = keep(values[rows], bound)
+                mask = condition if mask is None else mask & condition
+        if mask is not None:
+            rows = rows[mask]
+        page = rows[offset:offset + limit]
+        results = [{
+            "rank": offset + i + 1,
+            "player_id": columns['player_id'][row],
+            "player_name": columns['player_name'][row],
+            "season": columns['season'][row],
+            "position_group": columns['position_group'][row],
+            "age_at_season_start_of_year": int(columns['age'][row]),
+            "num_90s_played_in_season": round(float(columns['num_90s_played'][row]), 2),
+            "predicted_potential_score": round(float(columns['predicted_potential_score'][row]), 2),
+        } for i, row in enumerate(page)]
+        return len(rows), results
+
+    def stats(self):
+        state = self._state
+        return {
+            "loaded": state is not None,
+            "rows": state["rows"] if state else 0,
+            "models": len(state.get("models", [])) if state else 0,
+            "etag": self._etag,
+            "queries": self.queries,
+            "downloads": self.downloads,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Materialize the potential leaderboard on R2.")
+    parser.add_argument('--model', action='append', help="Model id to (re)score, e.g. default_v14. Can be repeated; defaults to every model.")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for base features missing from the feature store")
+    args = parser.parse_args(argv)
+
+    if not parquet_available():
+        logger_leaderboard.error("pyarrow is not installed. Install it to build the leaderboard.")
+        return 1
+
+    rows = materialize_leaderboard(r2_client_from_env(), os.environ['R2_BUCKET_NAME'], model_ids=args.model, workers=args.workers)
+    logger_leaderboard.info(f"Potential leaderboard stored: {rows} rows.")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
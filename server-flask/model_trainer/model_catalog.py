@@ -0,0 +1,293 @@
+"""
+Catalog of the custom models stored on R2.
+
+``ml_models/custom_models_catalog.json`` lists every custom model with, for
+each position it was trained for, the fields shown in the model list and the
+key of that position's config. The trainer adds the entry of a position after
+uploading its artifacts. The update is a conditional write (If-Match on the
+catalog's ETag, If-None-Match when creating it) retried on conflict, so two
+trainings finishing at the same time never drop each other's entries.
+
+The API keeps the catalog in memory (``ModelCatalog``), revalidated by ETag,
+instead of listing the model folders and probing their configs. When no
+catalog exists yet it is built once from the stored configs.
+
+Usage (from ``server-flask/``):
+    python -m model_trainer.model_catalog    # rebuild the catalog from the stored configs
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from model_trainer.event_store import is_missing_key_error, r2_client_from_env
+
+logger_model_catalog = logging.getLogger(__name__ + "_model_catalog")
+
+MODEL_CATALOG_KEY = "ml_models/custom_models_catalog.json"
+CUSTOM_MODELS_PREFIX = "ml_models/custom_models/"
+MODEL_CATALOG_FORMAT_VERSION = 1
+MODEL_CATALOG_UPDATE_ATTEMPTS = 8
+POSITION_GROUPS = ("Attacker", "Midfielder", "Defender")
+_CONFIG_KEY_PATTERN = re.compile(r'^' + re.escape(CUSTOM_MODELS_PREFIX) + r'([^/]+)/([^/]+)/model_config_\2_\1\.json$')
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _empty_catalog():
+    return {"format": MODEL_CATALOG_FORMAT_VERSION, "updated_at": None, "models": {}}
+
+
+def is_write_conflict(e):
+    """True for the errors of a conditional write that lost against another writer."""
+    code = e.response.get('Error', {}).get('Code') if isinstance(getattr(e, 'response', None), dict) else None
+    return code in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409') or 'PreconditionFailed' in str(e)
+
+
+def catalog_entry(model_id, position_group, config, config_key):
+    """Catalog entry of one trained position, from its model config."""
+    return {
+        "id": model_id,
+        "name": config.get("model_display_name", config.get("model_type", "")),
+        "position_group": config.get("position_group_trained_for", position_group),
+        "description": config.get("description", "Custom Potential Model"),
+        "config_key": config_key,
+        "training_engine": config.get("training_engine"),
+        "evaluation_metrics": config.get("evaluation_metrics_on_test_set"),
+        "updated_at": _now(),
+    }
+
+
+def read_model_catalog(s3_client, bucket):
+    """
+    Returns:
+        tuple: (catalog dict, ETag), or (None, None) when there is no catalog
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=MODEL_CATALOG_KEY)
+    except Exception as e:
+        if is_missing_key_error(e):
+            return None, None
+        raise
+    return json.loads(response['Body'].read().decode('utf-8')), response.get('ETag')
+
+
+def _seeded_catalog(scanned):
+    catalog = _empty_catalog()
+    for model_id, positions in scanned.items():
+        catalog["models"][model_id] = dict(positions)
+    return catalog
+
+
+def update_model_catalog(s3_client, bucket, update, attempts=MODEL_CATALOG_UPDATE_ATTEMPTS, stored_models=None):
+    """
+    Apply ``update`` (a function changing the catalog dict in place) to the
+    stored catalog with a conditional write, re-reading and re-applying it
+    when another writer got there first.
+
+    When there is no catalog yet it is first seeded from the stored model
+    configs (``stored_models`` if already scanned), so creating it never
+    hides the models trained before.
+
+    Returns:
+        dict: the catalog as written
+    """
+    scanned = stored_models
+    for attempt in range(attempts):
+        catalog, etag = read_model_catalog(s3_client, bucket)
+        if catalog is None:
+            if scanned is None:
+                logger_model_catalog.info("No model catalog on R2 yet, seeding it from the stored model configs.")
+                scanned = scan_model_configs(s3_client, bucket)
+            catalog = _seeded_catalog(scanned)
+        update(catalog)
+        catalog["updated_at"] = _now()
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(
+                Bucket=bucket, Key=MODEL_CATALOG_KEY, Body=json.dumps(catalog, indent=2).encode('utf-8'),
+                ContentType='application/json', **condition
+            )
+            return catalog
+        except Exception as e:
+            if not is_write_conflict(e) or attempt == attempts - 1:
+                raise
+            logger_model_catalog.info(f"Model catalog changed while updating it, retrying ({attempt + 1}/{attempts}).")
+            time.sleep(random.uniform(0.05, 0.2) * 2 ** attempt)
+
+
+def register_model_position(s3_client, bucket, model_id, position_group, config, config_key):
+    """Add (or replace) the catalog entry of one trained position of ``model_id``."""
+    entry = catalog_entry(model_id, position_group, config, config_key)
+
+    def add_entry(catalog):
+        catalog["models"].setdefault(model_id, {})[position_group] = entry
+    return update_model_catalog(s3_client, bucket, add_entry)
+
+
+def scan_model_configs(s3_client, bucket, max_workers=16):
+    """
+    Catalog entries of every model config stored under CUSTOM_MODELS_PREFIX.
+
+    Returns:
+        dict: model id -> {position group: entry}
+    """
+    config_keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=CUSTOM_MODELS_PREFIX):
+        for obj in page.get('Contents', []):
+            match = _CONFIG_KEY_PATTERN.match(obj['Key'])
+            if match and match.group(2).capitalize() in POSITION_GROUPS:
+                config_keys.append((match.group(1), match.group(2).capitalize(), obj['Key']))
+
+    def read_entry(item):
+        model_id, position_group, config_key = item
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=config_key)
+            return catalog_entry(model_id, position_group, json.loads(response['Body'].read().decode('utf-8')), config_key)
+        except Exception as e:
+            logger_model_catalog.warning(f"Skipping unreadable model config {config_key}: {e}")
+            return None
+
+    models = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(config_keys) or 1))) as executor:
+        for (model_id, position_group, _), entry in zip(config_keys, executor.map(read_entry, config_keys)):
+            if entry is not None:
+                models.setdefault(model_id, {})[position_group] = entry
+    return models
+
+
+def rebuild_model_catalog(s3_client, bucket):
+    """
+    Recreate the catalog from the stored model configs, keeping entries
+    registered meanwhile by a training.
+
+    Returns:
+        dict: the catalog as written
+    """
+    scanned = scan_model_configs(s3_client, bucket)
+
+    def merge(catalog):
+        for model_id, positions in scanned.items():
+            for position_group, entry in positions.items():
+                catalog["models"].setdefault(model_id, {}).setdefault(position_group, entry)
+    return update_model_catalog(s3_client, bucket, merge, stored_models=scanned)
+
+
+class ModelCatalog:
+    """
+    In-memory copy of the model catalog used by the API.
+
+    The stored catalog is revalidated with a HEAD request at most every
+    ``refresh_interval_seconds``; lookups of a model that is not in the copy
+    revalidate it at most every ``miss_refresh_seconds``, so a model trained
+    a moment ago is found without waiting for the next refresh.
+    """
+
+    def __init__(self, s3_client, bucket, refresh_interval_seconds=60, miss_refresh_seconds=5):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.miss_refresh_seconds = miss_refresh_seconds
+        self._catalog = None
+        self._etag = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.downloads = 0
+
+    def _current(self, max_age_seconds):
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() - self._checked_at < max_age_seconds:
+            return catalog
+        with self._lock:
+            if self._catalog is not None and time.monotonic() - self._checked_at < max_age_seconds:
+                return self._catalog
+            try:
+                self._refresh()
+            except Exception as e:
+                if self._catalog is None:
+                    raise
+                logger_model_catalog.warning(f"Could not revalidate the model catalog, keeping the loaded copy: {e}")
+            self._checked_at = time.monotonic()
+            return self._catalog
+
+    def _refresh(self):
+        if self.s3_client is None:
+            raise RuntimeError("S3 client not initialized.")
+        self.refreshes += 1
+        if self._catalog is not None:
+            try:
+                etag = self.s3_client.head_object(Bucket=self.bucket, Key=MODEL_CATALOG_KEY).get('ETag')
+            except Exception as e:
+                if not is_missing_key_error(e):
+                    raise
+                etag = None
+            if etag and etag == self._etag:
+                return
+        catalog, etag = read_model_catalog(self.s3_client, self.bucket)
+        if catalog is None:
+            logger_model_catalog.info("No model catalog on R2 yet, building it from the stored model configs.")
+            catalog = rebuild_model_catalog(self.s3_client, self.bucket)
+            catalog, etag = read_model_catalog(self.s3_client, self.bucket)
+        self.downloads += 1
+        self._catalog, self._etag = catalog, etag
+        logger_model_catalog.info(f"Loaded model catalog: {len(catalog.get('models', {}))} models (ETag {etag}).")
+
+    def models(self):
+        """
+        One item per trained model position (id, name, position_group,
+        description), ordered by model id and position.
+        """
+        catalog = self._current(self.refresh_interval_seconds)
+        items = []
+        for model_id in sorted(catalog.get("models", {})):
+            positions = catalog["models"][model_id]
+            for position_group in POSITION_GROUPS:
+                entry = positions.get(position_group)
+                if entry:
+                    items.append({k: entry[k] for k in ("id", "name", "position_group", "description")})
+        return items
+
+    def position_of(self, model_id):
+        """Position ``model_id`` was trained for (the first of POSITION_GROUPS it has), or None."""
+        for max_age_seconds in (self.refresh_interval_seconds, self.miss_refresh_seconds):
+            positions = self._current(max_age_seconds).get("models", {}).get(model_id)
+            for position_group in POSITION_GROUPS:
+                if positions and positions.get(position_group):
+                    return positions[position_group]["position_group"]
+        return None
+
+    def stats(self):
+        catalog = self._catalog
+        return {
+            "loaded": catalog is not None,
+            "models": len(catalog.get("models", {})) if catalog is not None else 0,
+            "etag": self._etag,
+            "refreshes": self.refreshes,
+            "downloads": self.downloads,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the custom model catalog on R2 from the stored model configs.")
+    parser.parse_args(argv)
+    bucket = os.environ['R2_BUCKET_NAME']
+    catalog = rebuild_model_catalog(r2_client_from_env(), bucket)
+    logger_model_catalog.info(f"Model catalog rebuilt: {len(catalog['models'])} models.")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
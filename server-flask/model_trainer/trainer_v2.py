@@ -3,15 +3,20 @@ import pandas as pd
 from datetime import datetime
 import os
 import numpy as np
-from sklearn.model_selection import train_test_split, GroupKFold, RandomizedSearchCV
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from sklearn.model_selection import train_test_split, GroupKFold, KFold, ParameterSampler, RandomizedSearchCV
+from sklearn.preprocessing import StandardScaler
+import xgboost as xgb
 from xgboost import XGBRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import joblib
 import warnings
 import logging 
-from ast import literal_eval 
+import time
 from io import BytesIO, StringIO
+from concurrent.futures import ProcessPoolExecutor
+
+from model_trainer.event_store import prefetch_event_frames, event_csv_key, parse_location_values, r2_client_from_env, r2_env_configured
+from model_trainer.model_catalog import CUSTOM_MODELS_PREFIX, register_model_position
 
 logger_trainer = logging.getLogger(__name__ + "_trainer") 
 
@@ -23,7 +28,25 @@ _TRAINER_SCRIPT_DIR = os.path.dirname(__file__)
 _PROJECT_ROOT = os.path.abspath(os.path.join(_TRAINER_SCRIPT_DIR, '..', '..')) 
 _DATA_DIR_FOR_TRAINER = os.path.join(_PROJECT_ROOT, 'data')
 
+# Version of the base feature extraction (extract_season_features and the event normalization it relies on).
+# Bump it whenever a change alters the extracted values: stored feature store partitions are rebuilt then.
+FEATURE_CODE_VERSION = 1
+# Version of the Pass 2 ML features and of the target generation; bump it when either changes its results.
+ML_FEATURE_CODE_VERSION = 1
 MIN_90S_PLAYED_FOR_P90_STATS = 3
+BASE_FEATURE_ID_COLUMNS = ['player_id_identifier', 'player_name_identifier', 'target_season_identifier', 'general_position_identifier']
+PLAYER_SEASON_KEY_COLUMNS = ['player_id_identifier', 'target_season_identifier']
+ML_TARGET_COLUMNS = ['peak_potential_target', 'raw_composite_score_heuristic_value']
+PASS1_BATCH_SIZE = 200  # player-seasons whose events are stacked into one extract_season_features_batch call
+EVALUATION_SEASON = "2015_2016"
+DEFAULT_MODEL_ID = "peak_potential_v2_15_16"
+DEFAULT_MODELS_PREFIX = "ml_models/ml_model_files_peak_potential/"  # where the API loads the default_v14 models from
+TRAINING_ENGINES = ("sklearn", "native")
+SEARCH_MODES = ("random", "halving")
+# Successive halving: candidates in the first rung, fraction kept per rung (1/eta) and early stopping patience.
+HALVING_CANDIDATES = 27
+HALVING_ETA = 3
+HALVING_EARLY_STOPPING_ROUNDS = 10
 
 def generate_kpi_variants(base_name, include_sum=True, include_p90=True, include_p90_sqrt=False):
     variants = []
@@ -104,15 +127,10 @@ def safe_division(numerator, denominator, default=0.0):
     except (TypeError, ValueError): return default
 
 def parse_location(loc_str):
-    try:
-        if pd.isna(loc_str) or not isinstance(loc_str, str): return None
-        if not (loc_str.startswith('[') and loc_str.endswith(']')) and \
-           not (loc_str.startswith('(') and loc_str.endswith(')')):
-            parts = loc_str.split(',')
-            if len(parts) >= 2: return tuple(map(float, parts))
-            return None
-        return tuple(map(float, literal_eval(loc_str.strip('[]()'))))
-    except: return None
+    if pd.isna(loc_str) or not isinstance(loc_str, str): return None
+    coords = parse_location_values([loc_str])[0]
+    coords = coords[~np.isnan(coords)]
+    return tuple(coords.tolist()) if len(coords) >= 2 else None
 
 # --- Feature Extraction Functions ---
 def get_feature_names_for_extraction():
@@ -177,311 +195,517 @@ def get_feature_names_for_extraction():
     return sorted(list(all_features_set))
 
 
-def extract_season_features(event_df, age_in_season, season_str_numeric, num_90s_played):
-    s = pd.Series(dtype='float64')
-    s['age'] = float(age_in_season) if age_in_season is not None else 0.0
-    s['season_numeric'] = float(season_str_numeric) if season_str_numeric is not None else 0.0
-    s['num_90s_played'] = float(num_90s_played) if pd.notna(num_90s_played) else 0.0
-    s['matches_played_events'] = float(event_df['match_id'].nunique()) if 'match_id' in event_df.columns and not event_df.empty else 0.0
-    
+_EXTRACTION_FEATURE_NAMES = get_feature_names_for_extraction()
+_EXTRACTION_CONTEXT_FEATURES = ['age', 'season_numeric', 'num_90s_played', 'matches_played_events']
+_EXTRACTION_P90_SOURCE_METRICS = [
+    m for m in _EXTRACTION_FEATURE_NAMES
+    if not m.endswith(('_p90', '_kpi', '_sqrt_', '_base')) and
+       m not in _EXTRACTION_CONTEXT_FEATURES + ['avg_carry_duration']
+]
+
+_EVENT_TYPE_COUNT_FEATURES = {
+    'passes_total': 'Pass', 'shots_total': 'Shot', 'dribbles_attempted': 'Dribble',
+    'duels_total': 'Duel', 'interceptions': 'Interception', 'clearances': 'Clearance',
+    'fouls_committed': 'Foul Committed', 'fouls_won': 'Foul Won',
+    'ball_recoveries': 'Ball Recovery', 'miscontrols': 'Miscontrol',
+    'dispossessed_events': 'Dispossessed', 'pressures': 'Pressure',
+    'carries_total': 'Carry', 'blocks_total': 'Block',
+    'shields_total': 'Shield', 'bad_behaviours_total': 'Bad Behaviour'
+}
+
+# (feature, event type, flag column): flagged events of one type.
+_EVENT_FLAG_FEATURES = [
+    ('errors_leading_to_shot_or_goal', 'Error', 'leads_to_shot'),
+    ('shots_first_time', 'Shot', 'shot_first_time'),
+    ('shots_open_goal', 'Shot', 'shot_open_goal'),
+    ('shots_aerial_won', 'Shot', 'shot_aerial_won'),
+    ('goal_assists', 'Pass', 'pass_goal_assist'),
+    ('shot_assists', 'Pass', 'pass_shot_assist'),
+    ('crosses_total', 'Pass', 'pass_cross'),
+    ('switches_total', 'Pass', 'pass_switch'),
+    ('through_balls_total', 'Pass', 'pass_through_ball'),
+    ('passes_backheel', 'Pass', 'pass_backheel'),
+    ('passes_deflected_by_opponent', 'Pass', 'deflected'),
+    ('passes_miscommunication', 'Pass', 'miscommunication'),
+    ('dribbles_nutmeg', 'Dribble', 'nutmeg'),
+    ('dribbles_overrun', 'Dribble', 'overrun'),
+    ('dribbles_no_touch', 'Dribble', 'no_touch'),
+    ('ball_recoveries_offensive', 'Ball Recovery', 'offensive'),
+    ('ball_recoveries_failed', 'Ball Recovery', 'recovery_failure'),
+    ('blocks_deflection', 'Block', 'deflection'),
+    ('blocks_offensive', 'Block', 'offensive'),
+    ('blocks_save_attempt', 'Block', 'save_block'),
+    ('clearances_aerial_won', 'Clearance', 'aerial_won'),
+    ('fouls_committed_penalty', 'Foul Committed', 'penalty'),
+    ('fouls_won_penalty', 'Foul Won', 'penalty'),
+]
+
+# (feature, event type, value column, accepted values): events of one type whose column matches.
+_EVENT_VALUE_FEATURES = [
+    ('shots_penalty', 'Shot', 'shot_type_name', ['Penalty']),
+    ('shots_freekick', 'Shot', 'shot_type_name', ['Free Kick']),
+    ('passes_ground', 'Pass', 'pass_height_name', ['Ground Pass']),
+    ('passes_low', 'Pass', 'pass_height_name', ['Low Pass']),
+    ('passes_high', 'Pass', 'pass_height_name', ['High Pass']),
+    ('passes_outcome_incomplete', 'Pass', 'pass_outcome_name', ['Incomplete']),
+    ('passes_outcome_out', 'Pass', 'pass_outcome_name', ['Out']),
+    ('passes_outcome_offside', 'Pass', 'pass_outcome_name', ['Pass Offside']),
+    ('passes_outcome_injury_clearance', 'Pass', 'pass_outcome_name', ['Injury Clearance']),
+    ('dribbles_completed', 'Dribble', 'dribble_outcome_name', ['Complete']),
+    ('duels_tackle_type', 'Duel', 'duel_type_name', ['Tackle']),
+    ('duels_aerial_lost', 'Duel', 'duel_type_name', ['Aerial Lost']),
+    ('yellow_cards', 'Bad Behaviour', 'bad_behaviour_card_name', ['Yellow Card']),
+    ('red_cards', 'Bad Behaviour', 'bad_behaviour_card_name', ['Red Card', 'Second Yellow']),
+    ('interceptions_successful_gain_possession', 'Interception', 'interception_outcome_name', ['Success', 'Success In Play', 'Won']),
+    ('interceptions_failed_gain_possession', 'Interception', 'interception_outcome_name', ['Lost', 'Lost In Play', 'Lost Out']),
+]
+
+_SHOT_OUTCOME_FEATURES = [
+    ('goals', ['Goal']),
+    ('shots_on_target', ['Saved', 'Goal', 'Post', 'Saved To Post', 'Saved Off Target']),
+    ('shots_blocked_by_opponent', ['Blocked']),
+    ('shots_hit_post', ['Post']),
+    ('shots_off_target', ['Off T', 'Wayward']),
+]
+
+
+class _EventTypeTotals:
+    """
+    Per-(player-season, event type) totals over a table of events.
+
+    ``type`` is factorized once and every row is assigned a cell
+    ``group * n_types + type``; counts and sums of boolean row masks are then
+    one ``np.bincount`` over the cells instead of a boolean filter and copy of
+    the frame per event type. Rows with a negative group code are ignored.
+    """
+
+    def __init__(self, event_df, group_codes, n_groups):
+        if 'type' in event_df.columns:
+            type_codes, type_names = pd.factorize(event_df['type'])
+        else:
+            type_codes, type_names = np.full(len(event_df), -1, dtype=np.intp), []
+        self.n_groups = n_groups
+        self.groups = np.where(group_codes >= 0, group_codes, n_groups)  # n_groups collects ignored rows
+        self._n_types = len(type_names) + 1  # type 0 holds rows without a type
+        self._types = type_codes + 1
+        self._cells = self.groups * self._n_types + self._types
+        self._code_of = {name: code + 1 for code, name in enumerate(type_names)}
+        self.row_counts = np.bincount(self.groups, minlength=n_groups + 1)[:n_groups]
+        self._counts = self._cell_sums(None)
+
+    def _cell_sums(self, weights):
+        sums = np.bincount(self._cells, weights=weights, minlength=(self.n_groups + 1) * self._n_types)
+        return sums.reshape(self.n_groups + 1, self._n_types)[:self.n_groups]
+
+    def count(self, event_type):
+        code = self._code_of.get(event_type)
+        return self._counts[:, code].astype('float64') if code is not None else np.zeros(self.n_groups)
+
+    def rows(self, event_type):
+        """Positions of the rows of ``event_type`` in listed groups, in table order."""
+        code = self._code_of.get(event_type)
+        if code is None:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero((self._types == code) & (self.groups < self.n_groups))
+
+    def masked_count(self, mask, event_type):
+        """Per group, the number of rows of ``event_type`` where the boolean ``mask`` is set."""
+        code = self._code_of.get(event_type)
+        if code is None or mask is None:
+            return np.zeros(self.n_groups)
+        return self._cell_sums(mask)[:, code]
+
+    def group_sums(self, values, rows):
+        """
+        Per group, the sum of ``values`` (aligned with ``rows``). Each group's
+        values are summed as one contiguous array in table order, so results
+        are identical to ``Series.sum()`` over that group's rows.
+        """
+        sums = np.zeros(self.n_groups)
+        groups = self.groups[rows]
+        order = np.argsort(groups, kind='stable')
+        values, bounds = values[order], np.concatenate([[0], np.cumsum(np.bincount(groups, minlength=self.n_groups + 1))])
+        for g in np.flatnonzero(np.diff(bounds)[:self.n_groups]):
+            sums[g] = values[bounds[g]:bounds[g + 1]].sum()
+        return sums
+
+
+def _event_flag_mask(event_df, col):
+    """StatsBomb flag column as a boolean array (missing values are False), or None if absent."""
+    if col not in event_df.columns:
+        return None
+    return event_df[col].fillna(False).astype(bool).to_numpy(dtype=bool)
+
+
+def _event_value_mask(values, accepted):
+    """Boolean array of ``values`` that are in ``accepted`` (missing values never match)."""
+    if values is None:
+        return None
+    mask = values == accepted[0] if len(accepted) == 1 else values.isin(accepted)
+    return mask.to_numpy(dtype=bool, na_value=False)
+
+
+def _safe_division_array(numerator, denominator, default=0.0):
+    """Elementwise safe_division."""
+    numerator, denominator = np.asarray(numerator, dtype='float64'), np.asarray(denominator, dtype='float64')
+    valid = ~np.isnan(numerator) & ~np.isnan(denominator) & (denominator != 0)
+    result = np.full(np.broadcast(numerator, denominator).shape, default, dtype='float64')
+    np.divide(numerator, denominator, out=result, where=valid)
+    return result
+
+
+def _extract_grouped_season_features(event_df, group_codes, n_groups, ages, season_numerics, num_90s_played, source_columns=None):
+    """
+    Engine behind extract_season_features and extract_season_features_batch.
+
+    Args:
+        event_df: events of all groups (player-seasons)
+        group_codes: group of every event row, -1 for rows to ignore
+        n_groups: number of groups
+        ages, season_numerics, num_90s_played: float arrays, one value per group
+        source_columns: per group, the columns of its own event frame, or None to
+            treat a column as present for a group when any of its rows has a value
+
+    Returns:
+        np.ndarray: (n_groups, len(get_feature_names_for_extraction())) float64
+    """
+    totals = _EventTypeTotals(event_df, np.asarray(group_codes, dtype=np.intp), n_groups)
+    s = {name: np.zeros(n_groups) for name in _EXTRACTION_FEATURE_NAMES}
+    s['age'] = ages
+    s['season_numeric'] = season_numerics
+    s['num_90s_played'] = np.where(np.isnan(num_90s_played), 0.0, num_90s_played)
     use_p90 = s['num_90s_played'] >= MIN_90S_PLAYED_FOR_P90_STATS
-    
-    all_expected_features = get_feature_names_for_extraction()
-    for fname in all_expected_features:
-        if fname not in ['age', 'season_numeric', 'num_90s_played', 'matches_played_events']:
-             s[fname] = 0.0 # Initialize all to 0.0
-
-    if event_df.empty or len(event_df) == 0:
-        if 'turnovers_p90_inv_kpi_base' in s.index: s['turnovers_p90_inv_kpi_base'] = 999.0
-        # Initialize sqrt kpis to 0 if df is empty
-        sqrt_kpis_to_init = [k for k in all_expected_features if k.endswith("_sqrt_")]
-        for skpi in sqrt_kpis_to_init:
-            s[skpi] = 0.0
-        return s.reindex(all_expected_features).fillna(0.0)
+
+    flags = {}
+
+    def flag(col):
+        if col not in flags:
+            flags[col] = _event_flag_mask(event_df, col)
+        return flags[col]
+
+    def column(col):
+        return event_df[col] if col in event_df.columns else None
+
+    def present(col):
+        if col not in event_df.columns:
+            return np.zeros(n_groups, dtype=bool)
+        if source_columns is not None:
+            return np.array([col in cols for cols in source_columns], dtype=bool)
+        return np.bincount(totals.groups, weights=event_df[col].notna().to_numpy(), minlength=n_groups + 1)[:n_groups] > 0
+
+    def numeric(col, rows):
+        return pd.to_numeric(event_df[col].iloc[rows], errors='coerce').to_numpy(dtype='float64')
+
+    if 'match_id' in event_df.columns:
+        match_codes = pd.factorize(event_df['match_id'])[0]
+        listed = (match_codes >= 0) & (totals.groups < n_groups)
+        group_matches = np.unique(np.stack([totals.groups[listed], match_codes[listed]]), axis=1)[0]
+        s['matches_played_events'] = np.bincount(group_matches, minlength=n_groups).astype('float64')
 
     # --- Canonical Event Counts ---
-    type_counts = event_df['type'].value_counts() if 'type' in event_df.columns else pd.Series(dtype='int64')
-    
-    event_name_map = {
-        'passes_total': 'Pass', 'shots_total': 'Shot', 'dribbles_attempted': 'Dribble', 
-        'duels_total': 'Duel', 'interceptions': 'Interception', 'clearances': 'Clearance',
-        'fouls_committed': 'Foul Committed', 'fouls_won': 'Foul Won', 
-        'ball_recoveries': 'Ball Recovery', 'miscontrols': 'Miscontrol', 
-        'dispossessed_events': 'Dispossessed', 'pressures': 'Pressure', 
-        'carries_total': 'Carry', 'blocks_total': 'Block', 
-        'fifty_fifties_total': '50/50', 
-        'shields_total': 'Shield', 'errors_leading_to_shot_or_goal': 'Error', 
-        'bad_behaviours_total': 'Bad Behaviour'
-    }
-    for canonical_name, event_type_str in event_name_map.items():
-        if canonical_name in s.index:
-            if canonical_name == 'errors_leading_to_shot_or_goal': 
-                 error_df = event_df[event_df['type'] == 'Error'] if 'type' in event_df.columns else pd.DataFrame()
-                 s[canonical_name] = float(error_df.get('leads_to_shot', pd.Series(dtype=bool)).fillna(False).astype(bool).sum())
-            elif canonical_name == 'fifty_fifties_total':
-                count_from_type = float(type_counts.get('50/50', 0))
-                
-                count_from_duel_type = 0
-                if 'Duel' in type_counts and 'duel_type_name' in event_df.columns: #
-                    duel_df_temp = event_df[event_df['type'] == 'Duel']
-                    count_from_duel_type = float((duel_df_temp['duel_type_name'].astype(str) == '50/50').sum())
-
-                s[canonical_name] = count_from_type if count_from_type > 0 else count_from_duel_type
+    for feature, event_type in _EVENT_TYPE_COUNT_FEATURES.items():
+        s[feature] = totals.count(event_type)
 
-            else:
-                s[canonical_name] = float(type_counts.get(event_type_str, 0))
+    fifty_fifties_from_type = totals.count('50/50')
+    fifty_fifties_from_duel_type = np.zeros(n_groups)
+    if 'duel_type_name' in event_df.columns:
+        fifty_fifties_from_duel_type = totals.masked_count(event_df['duel_type_name'].astype(str).to_numpy() == '50/50', 'Duel')
+    s['fifty_fifties_total'] = np.where(fifty_fifties_from_type > 0, fifty_fifties_from_type, fifty_fifties_from_duel_type)
 
-    # --- Other Specific Aggregates & KPIs ---
+    for feature, event_type, col in _EVENT_FLAG_FEATURES:
+        s[feature] = totals.masked_count(flag(col), event_type)
 
-    # Player caused ball out
-    if 'player_caused_ball_out' in s.index and 'out' in event_df.columns:
-        s['player_caused_ball_out'] = float(event_df['out'].fillna(False).astype(bool).sum())
+    for feature, event_type, col, accepted in _EVENT_VALUE_FEATURES:
+        s[feature] = totals.masked_count(_event_value_mask(column(col), accepted), event_type)
+
+    # --- Whole-frame flags ---
+    for feature, col in (('player_caused_ball_out', 'out'), ('counterpress_actions', 'counterpress'), ('actions_under_pressure', 'under_pressure')):
+        if col in event_df.columns:
+            s[feature] = np.bincount(totals.groups, weights=flag(col), minlength=n_groups + 1)[:n_groups]
 
     # Shots
-    shots_df = event_df[event_df['type'] == 'Shot'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not shots_df.empty:
-        shot_outcome_series = shots_df.get('shot_outcome_name', pd.Series(dtype=str)) 
-        shot_type_series = shots_df.get('shot_type_name', pd.Series(dtype=str))
-        shots_df = event_df[event_df['type'] == 'Shot'].copy() if 'type' in event_df.columns else pd.DataFrame()
-        if not shots_df.empty:
-            shot_outcome_series = shots_df.get('shot_outcome_name', pd.Series(dtype=str))
-            if shot_outcome_series.empty and 'shot_outcome' in shots_df.columns:
-                shot_outcome_series = shots_df['shot_outcome'].apply(lambda x: x.get('name') if isinstance(x, dict) else x)
-            if 'goals' in s.index:
-                s['goals'] = float((shot_outcome_series == 'Goal').sum())
-        
-        if 'shots_on_target' in s.index: s['shots_on_target'] = float(shot_outcome_series.isin(['Saved', 'Goal', 'Post', 'Saved To Post', 'Saved Off Target']).sum())
-        if 'sum_xg' in s.index: s['sum_xg'] = pd.to_numeric(shots_df.get('shot_statsbomb_xg', shots_df.get('statsbomb_xg')), errors='coerce').sum() # Check both common XG col names
-        if 'shots_first_time' in s.index: s['shots_first_time'] = (shots_df.get('shot_first_time', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
-        if 'shots_open_goal' in s.index: s['shots_open_goal'] = (shots_df.get('shot_open_goal', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
-        if 'shots_deflected' in s.index: s['shots_deflected'] = ((shots_df.get('deflected', pd.Series(dtype=bool)).fillna(False).astype(bool)) | (shot_outcome_series == 'Deflected')).sum()
-        if 'shots_aerial_won' in s.index: s['shots_aerial_won'] = (shots_df.get('shot_aerial_won', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
-        if 'shots_blocked_by_opponent' in s.index: s['shots_blocked_by_opponent'] = float((shot_outcome_series == 'Blocked').sum())
-        if 'shots_hit_post' in s.index: s['shots_hit_post'] = float((shot_outcome_series == 'Post').sum())
-        if 'shots_off_target' in s.index: s['shots_off_target'] = float((shot_outcome_series.isin(['Off T', 'Wayward'])).sum())
-        if 'shots_penalty' in s.index: s['shots_penalty'] = float((shot_type_series == 'Penalty').sum())
-        if 'shots_freekick' in s.index: s['shots_freekick'] = float((shot_type_series == 'Free Kick').sum())
-
-    if 'conversion_rate_excl_xg_kpi' in s.index: s['conversion_rate_excl_xg_kpi'] = safe_division(s.get('goals',0.0), s.get('shots_total',0.0)) * 100
-    if 'xg_performance' in s.index: s['xg_performance'] = s.get('goals',0.0) - s.get('sum_xg',0.0)
+    shot_rows = totals.rows('Shot')
+    if len(shot_rows):
+        has_outcome_name = present('shot_outcome_name')
+        if has_outcome_name.all():
+            shot_outcomes = event_df['shot_outcome_name']
+        else:
+            shot_outcomes = pd.Series(np.full(len(event_df), None, dtype=object))
+            named = shot_rows[has_outcome_name[totals.groups[shot_rows]]]
+            if len(named):
+                shot_outcomes.iloc[named] = event_df['shot_outcome_name'].iloc[named].to_numpy()
+            unnamed = shot_rows[~has_outcome_name[totals.groups[shot_rows]] & present('shot_outcome')[totals.groups[shot_rows]]]
+            if len(unnamed):
+                shot_outcomes.iloc[unnamed] = [x.get('name') if isinstance(x, dict) else x for x in event_df['shot_outcome'].iloc[unnamed]]
+        for feature, accepted in _SHOT_OUTCOME_FEATURES:
+            s[feature] = totals.masked_count(_event_value_mask(shot_outcomes, accepted), 'Shot')
 
-    # Passes
-    pass_df = event_df[event_df['type'] == 'Pass'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not pass_df.empty:
-        pass_outcome_series = pass_df.get('pass_outcome_name', pd.Series(dtype=str))
-        pass_height_series = pass_df.get('pass_height_name', pd.Series(dtype=str))
-
-        if 'successful_passes' in s.index:
-            if not pass_outcome_series.empty:
-                successful_mask = pass_outcome_series.isna() | (pass_outcome_series == 'nan') | (pass_outcome_series == '')
-                s['successful_passes'] = float(successful_mask.sum())
-            else: s['successful_passes'] = 0.0
-        
-        if 'avg_pass_length' in s.index: s['avg_pass_length'] = pd.to_numeric(pass_df.get('pass_length'), errors='coerce').mean()
-        if 'goal_assists' in s.index: s['goal_assists'] = float((pass_df.get('pass_goal_assist', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'shot_assists' in s.index: s['shot_assists'] = float((pass_df.get('pass_shot_assist', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'crosses_total' in s.index: s['crosses_total'] = float((pass_df.get('pass_cross', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'switches_total' in s.index: s['switches_total'] = float((pass_df.get('pass_switch', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'through_balls_total' in s.index: s['through_balls_total'] = float((pass_df.get('pass_through_ball', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        
-        if 'passes_ground' in s.index: s['passes_ground'] = float((pass_height_series == 'Ground Pass').sum())
-        if 'passes_low' in s.index: s['passes_low'] = float((pass_height_series == 'Low Pass').sum())
-        if 'passes_high' in s.index: s['passes_high'] = float((pass_height_series == 'High Pass').sum())
-
-        if 'passes_outcome_incomplete' in s.index: s['passes_outcome_incomplete'] = float((pass_outcome_series == 'Incomplete').sum())
-        if 'passes_outcome_out' in s.index: s['passes_outcome_out'] = float((pass_outcome_series == 'Out').sum())
-        if 'passes_outcome_offside' in s.index: s['passes_outcome_offside'] = float((pass_outcome_series == 'Pass Offside').sum())
-        if 'passes_outcome_injury_clearance' in s.index: s['passes_outcome_injury_clearance'] = float((pass_outcome_series == 'Injury Clearance').sum())
-        
-        if 'passes_backheel' in s.index: s['passes_backheel'] = float((pass_df.get('pass_backheel', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'passes_deflected_by_opponent' in s.index: s['passes_deflected_by_opponent'] = float((pass_df.get('deflected', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'passes_miscommunication' in s.index: s['passes_miscommunication'] = float((pass_df.get('miscommunication', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        # Without a deflected column nothing counts, as in the per-frame version (an empty flag Series aligns to all False).
+        deflected = flag('deflected')
+        if deflected is not None:
+            outcome_deflected = _event_value_mask(shot_outcomes, ['Deflected'])
+            s['shots_deflected'] = np.where(present('deflected'), totals.masked_count(deflected | outcome_deflected, 'Shot'), 0.0)
 
-    if 'pass_completion_rate_kpi' in s.index: s['pass_completion_rate_kpi'] = safe_division(s.get('successful_passes',0.0), s.get('passes_total',0.0)) * 100
-    if 'avg_pass_length_kpi' in s.index: s['avg_pass_length_kpi'] = s.get('avg_pass_length', 0.0) if pd.notna(s.get('avg_pass_length')) else 0.0
+        # xG comes from shot_statsbomb_xg, else statsbomb_xg; without either it is undefined (NaN).
+        shot_groups = totals.groups[shot_rows]
+        use_shot_xg = present('shot_statsbomb_xg')
+        use_xg = ~use_shot_xg & present('statsbomb_xg')
+        shooting = totals.count('Shot') > 0
+        s['sum_xg'] = np.where(shooting & ~use_shot_xg & ~use_xg, np.nan, 0.0)
+        for col, used in (('shot_statsbomb_xg', use_shot_xg), ('statsbomb_xg', use_xg)):
+            rows = shot_rows[used[shot_groups]]
+            if len(rows):
+                s['sum_xg'] = s['sum_xg'] + totals.group_sums(np.nan_to_num(numeric(col, rows), nan=0.0), rows)
 
-    # Dribbles
-    dribble_df = event_df[event_df['type'] == 'Dribble'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not dribble_df.empty:
-        dribble_outcome_series = dribble_df.get('dribble_outcome_name', pd.Series(dtype=str))
-        if 'dribbles_completed' in s.index: s['dribbles_completed'] = float((dribble_outcome_series == 'Complete').sum())
-        if 'dribbles_nutmeg' in s.index: s['dribbles_nutmeg'] = float((dribble_df.get('nutmeg', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'dribbles_overrun' in s.index: s['dribbles_overrun'] = float((dribble_df.get('overrun', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'dribbles_no_touch' in s.index: s['dribbles_no_touch'] = float((dribble_df.get('no_touch', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+    s['conversion_rate_excl_xg_kpi'] = _safe_division_array(s['goals'], s['shots_total']) * 100
+    s['xg_performance'] = s['goals'] - s['sum_xg']
 
-    if 'dribble_success_rate_kpi' in s.index: s['dribble_success_rate_kpi'] = safe_division(s.get('dribbles_completed', 0.0), s.get('dribbles_attempted',0.0)) * 100
+    # Passes
+    pass_rows = totals.rows('Pass')
+    if len(pass_rows):
+        pass_outcomes = column('pass_outcome_name')
+        if pass_outcomes is not None:
+            successful = pass_outcomes.isna() | (pass_outcomes == 'nan') | (pass_outcomes == '')
+            s['successful_passes'] = np.where(present('pass_outcome_name'), totals.masked_count(successful.to_numpy(dtype=bool, na_value=False), 'Pass'), 0.0)
+
+        # Mean of the numeric pass lengths; undefined (NaN) when the column is missing or has no numbers.
+        passing = totals.count('Pass') > 0
+        s['avg_pass_length'] = np.where(passing, np.nan, 0.0)
+        has_length = present('pass_length')
+        rows = pass_rows[has_length[totals.groups[pass_rows]]]
+        if len(rows):
+            lengths = numeric('pass_length', rows)
+            counts = np.bincount(totals.groups[rows], weights=~np.isnan(lengths), minlength=n_groups + 1)[:n_groups]
+            sums = totals.group_sums(np.nan_to_num(lengths, nan=0.0), rows)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                s['avg_pass_length'] = np.where(passing & has_length & (counts > 0), sums / counts, s['avg_pass_length'])
+
+    s['pass_completion_rate_kpi'] = _safe_division_array(s['successful_passes'], s['passes_total']) * 100
+    s['avg_pass_length_kpi'] = np.where(np.isnan(s['avg_pass_length']), 0.0, s['avg_pass_length'])
+    s['dribble_success_rate_kpi'] = _safe_division_array(s['dribbles_completed'], s['dribbles_attempted']) * 100
 
     # Duels (Tackles, Aerials)
-    duel_df = event_df[event_df['type'] == 'Duel'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not duel_df.empty:
-        duel_type_series = duel_df.get('duel_type_name', pd.Series(dtype=str))
-        duel_outcome_series = duel_df.get('duel_outcome_name', pd.Series(dtype=str))
+    duel_rows = totals.rows('Duel')
+    s['tackles_attempted'] = s['duels_tackle_type']
+    if len(duel_rows) and 'duel_type_name' in event_df.columns:
+        aerial = np.zeros(len(event_df), dtype=bool)
+        aerial[duel_rows] = event_df['duel_type_name'].iloc[duel_rows].str.contains("Aerial", case=False, na=False).to_numpy(dtype=bool)
+        s['aerial_duels_total'] = totals.masked_count(aerial, 'Duel')
+        duel_outcomes = column('duel_outcome_name')
+        if duel_outcomes is not None:
+            tackle = _event_value_mask(event_df['duel_type_name'], ['Tackle'])
+            s['tackles_won'] = totals.masked_count(tackle & _event_value_mask(duel_outcomes, ['Won', 'Success', 'Success In Play', 'Success Out']), 'Duel')
+            s['aerial_duels_won'] = totals.masked_count(aerial & _event_value_mask(duel_outcomes, ['Won', 'Success']), 'Duel')
 
-        if 'duels_tackle_type' in s.index: s['duels_tackle_type'] = float((duel_type_series == 'Tackle').sum())
-        if 'tackles_attempted' in s.index: s['tackles_attempted'] = s.get('duels_tackle_type', 0.0) # Àlies
+    s['tackle_win_rate_kpi'] = _safe_division_array(s['tackles_won'], s['tackles_attempted']) * 100
+    s['aerial_duel_win_rate_kpi'] = _safe_division_array(s['aerial_duels_won'], s['aerial_duels_total']) * 100
+
+    # 50/50 Events: outcome_name, else outcome
+    has_outcome_name = present('outcome_name')
+    for feature, accepted in (('fifty_fifties_won', ['Won', 'Success To Team']), ('fifty_fifties_lost', ['Lost', 'Success To Opposition'])):
+        from_name = totals.masked_count(_event_value_mask(column('outcome_name'), accepted), '50/50')
+        from_outcome = totals.masked_count(_event_value_mask(column('outcome'), accepted), '50/50')
+        s[feature] = np.where(has_outcome_name, from_name, from_outcome)
 
-        aerial_duels_mask = duel_type_series.str.contains("Aerial", case=False, na=False)
-        if 'aerial_duels_total' in s.index: s['aerial_duels_total'] = float(aerial_duels_mask.sum())
-        if 'duels_aerial_lost' in s.index: s['duels_aerial_lost'] = float((duel_type_series == 'Aerial Lost').sum())
-        
-        if 'tackles_won' in s.index:
-            s['tackles_won'] = float(((duel_type_series == 'Tackle') & 
-                                     (duel_outcome_series.isin(['Won', 'Success', 'Success In Play', 'Success Out']))).sum())
-        if 'aerial_duels_won' in s.index:
-             s['aerial_duels_won'] = float((aerial_duels_mask & duel_outcome_series.isin(['Won', 'Success'])).sum())
-    
-    if 'tackle_win_rate_kpi' in s.index: s['tackle_win_rate_kpi'] = safe_division(s.get('tackles_won',0.0), s.get('tackles_attempted',0.0)) * 100
-    if 'aerial_duel_win_rate_kpi' in s.index: s['aerial_duel_win_rate_kpi'] = safe_division(s.get('aerial_duels_won',0.0), s.get('aerial_duels_total',0.0)) * 100
-    
-    # 50/50 Events 
-    fifty_fifty_df = event_df[event_df['type'] == '50/50'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not fifty_fifty_df.empty:
-        fifty_outcome_series = fifty_fifty_df.get('outcome_name', fifty_fifty_df.get('outcome', pd.Series(dtype=str))) # outcome_name si ja parsejat
-        if 'fifty_fifties_won' in s.index: s['fifty_fifties_won'] = float(fifty_outcome_series.isin(['Won', 'Success To Team']).sum())
-        if 'fifty_fifties_lost' in s.index: s['fifty_fifties_lost'] = float(fifty_outcome_series.isin(['Lost', 'Success To Opposition']).sum())
-
-    # Ball Recovery
-    ball_recovery_df = event_df[event_df['type'] == 'Ball Recovery'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not ball_recovery_df.empty: 
-        if 'ball_recoveries_offensive' in s.index: s['ball_recoveries_offensive'] = float((ball_recovery_df.get('offensive', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'ball_recoveries_failed' in s.index: s['ball_recoveries_failed'] = float((ball_recovery_df.get('recovery_failure', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-
-    # Blocks
-    block_df = event_df[event_df['type'] == 'Block'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not block_df.empty:
-        if 'blocks_deflection' in s.index: s['blocks_deflection'] = float((block_df.get('deflection', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'blocks_offensive' in s.index: s['blocks_offensive'] = float((block_df.get('offensive', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-        if 'blocks_save_attempt' in s.index: s['blocks_save_attempt'] = float((block_df.get('save_block', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-
-    # Clearances
-    clearance_df = event_df[event_df['type'] == 'Clearance'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not clearance_df.empty:
-        if 'clearances_aerial_won' in s.index: s['clearances_aerial_won'] = float((clearance_df.get('aerial_won', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-
-    # Fouls
-    foul_committed_df = event_df[event_df['type'] == 'Foul Committed'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not foul_committed_df.empty: 
-        if 'fouls_committed_penalty' in s.index: s['fouls_committed_penalty'] = float((foul_committed_df.get('penalty', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-    
-    foul_won_df = event_df[event_df['type'] == 'Foul Won'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not foul_won_df.empty: 
-        if 'fouls_won_penalty' in s.index: s['fouls_won_penalty'] = float((foul_won_df.get('penalty', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-
-    # Cards (from Bad Behaviour)
-    bad_behaviour_df = event_df[event_df['type'] == 'Bad Behaviour'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not bad_behaviour_df.empty:
-        card_series = bad_behaviour_df.get('bad_behaviour_card_name', pd.Series(dtype=str))
-        if 'yellow_cards' in s.index: s['yellow_cards'] = float((card_series == 'Yellow Card').sum())
-        if 'red_cards' in s.index: s['red_cards'] = float((card_series.isin(['Red Card', 'Second Yellow'])).sum())
-
-    # Interceptions
-    interception_df = event_df[event_df['type'] == 'Interception'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not interception_df.empty:
-        interception_outcome_series = interception_df.get('interception_outcome_name', pd.Series(dtype=str)) 
-        if 'interceptions_successful_gain_possession' in s.index: s['interceptions_successful_gain_possession'] = float(interception_outcome_series.isin(['Success', 'Success In Play', 'Won']).sum())
-        if 'interceptions_failed_gain_possession' in s.index: s['interceptions_failed_gain_possession'] = float(interception_outcome_series.isin(['Lost', 'Lost In Play', 'Lost Out']).sum())
-    
     # Carries (duration)
-    carry_df = event_df[event_df['type'] == 'Carry'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not carry_df.empty and 'duration' in carry_df.columns:
-        valid_durations = pd.to_numeric(carry_df['duration'], errors='coerce').dropna()
-        if 'sum_carry_duration' in s.index: s['sum_carry_duration'] = float(valid_durations.sum())
-        if 'avg_carry_duration' in s.index: s['avg_carry_duration'] = float(valid_durations.mean()) if not valid_durations.empty else 0.0
-    
-    # Miscontrol (aerial_won)
-    miscontrol_df = event_df[event_df['type'] == 'Miscontrol'].copy() if 'type' in event_df.columns else pd.DataFrame()
-    if not miscontrol_df.empty:
-         if 'count_miscontrol_aerial_won' in s.index: 
-             s['count_miscontrol_aerial_won'] = float((miscontrol_df.get('aerial_won', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
-    
-    # General defensive / pressure
-    if 'counterpress_actions' in s.index: s['counterpress_actions'] = (event_df.get('counterpress', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
-    if 'actions_under_pressure' in s.index: s['actions_under_pressure'] = (event_df.get('under_pressure', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
-    
-    if 'turnovers_total' in s.index:
-        s['turnovers_total'] = s.get('miscontrols', 0.0) + s.get('dispossessed_events', 0.0) + \
-                               (s.get('dribbles_attempted', 0.0) - s.get('dribbles_completed', 0.0))
-    if 'turnovers_p90_inv_kpi_base' in s.index:
-        s['turnovers_p90_inv_kpi_base'] = safe_division(s.get('turnovers_total',0.0), num_90s_played) if use_p90 else (999.0 if s.get('turnovers_total',0.0) == 0 else s.get('turnovers_total',0.0))
+    carry_rows = totals.rows('Carry')
+    if len(carry_rows) and 'duration' in event_df.columns:
+        durations = numeric('duration', carry_rows)
+        valid = ~np.isnan(durations)
+        valid_counts = np.bincount(totals.groups[carry_rows[valid]], minlength=n_groups + 1)[:n_groups]
+        s['sum_carry_duration'] = totals.group_sums(durations[valid], carry_rows[valid])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            s['avg_carry_duration'] = np.where(valid_counts > 0, s['sum_carry_duration'] / valid_counts, 0.0)
 
+    s['turnovers_total'] = s['miscontrols'] + s['dispossessed_events'] + (s['dribbles_attempted'] - s['dribbles_completed'])
+    s['turnovers_p90_inv_kpi_base'] = np.where(
+        use_p90,
+        _safe_division_array(s['turnovers_total'], s['num_90s_played']),
+        np.where(s['turnovers_total'] == 0, 999.0, s['turnovers_total'])
+    )
+    s['turnovers_p90_inv_kpi_base'][totals.row_counts == 0] = 999.0
 
     # --- P90 Calculations ---
-    metrics_for_p90_conversion_from_func = [
-        m for m in get_feature_names_for_extraction() 
-        if not m.endswith(('_p90', '_kpi', '_sqrt_', '_base')) and 
-           not m in ['age', 'season_numeric', 'num_90s_played', 'matches_played_events', 'avg_carry_duration']
-    ]
-    
-    for col_raw in metrics_for_p90_conversion_from_func:
-        if f'{col_raw}_p90' in s.index:
-            s[f'{col_raw}_p90'] = safe_division(s.get(col_raw, 0.0), num_90s_played) if use_p90 else 0.0
-    if 'progressive_carries_p90' in s.index and 'carries_total_p90' in s.index :
-        s['progressive_carries_p90'] = s['carries_total_p90']
-    if 'interceptions_p90' in s.index and 'interceptions_p90' in s.index:
-        pass # ja calculat
-    if 'clearances_p90' in s.index and 'clearances_p90' in s.index: 
-        pass
-    if 'blocks_p90' in s.index and 'blocks_total_p90' in s.index:
-        s['blocks_p90'] = s['blocks_total_p90']
-    if 'pressures_p90' in s.index and 'pressures_p90' in s.index: 
-        pass
+    for col_raw in _EXTRACTION_P90_SOURCE_METRICS:
+        if f'{col_raw}_p90' in s:
+            s[f'{col_raw}_p90'] = np.where(use_p90, _safe_division_array(s[col_raw], s['num_90s_played']), 0.0)
 
     # SQRT P90
-    sqrt_transformed_kpis_base_p90 = ["goals_p90", "sum_xg_p90", "goal_assists_p90"]
-    for kpi_base_p90_name in sqrt_transformed_kpis_base_p90:
-        if f"{kpi_base_p90_name}_sqrt_" in s.index: 
-            val = s.get(kpi_base_p90_name, 0.0) 
-            s[f"{kpi_base_p90_name}_sqrt_"] = np.sqrt(val) if pd.notna(val) and val > 0 else 0.0
-        
-    return s.reindex(all_expected_features).fillna(0.0)
+    for kpi_base_p90_name in ["goals_p90", "sum_xg_p90", "goal_assists_p90"]:
+        val = s[kpi_base_p90_name]
+        with np.errstate(invalid='ignore'):
+            s[f"{kpi_base_p90_name}_sqrt_"] = np.where(val > 0, np.sqrt(np.where(val > 0, val, 0.0)), 0.0)
+
+    features = np.column_stack([s[name] for name in _EXTRACTION_FEATURE_NAMES]).astype('float64')
+    return np.where(np.isnan(features), 0.0, features)
+
+
+def extract_season_features(event_df, age_in_season, season_str_numeric, num_90s_played):
+    """
+    Aggregate one player-season of events into the features of
+    ``get_feature_names_for_extraction()``.
+
+    Args:
+        event_df: events of the player in the season
+        age_in_season: player age at the fixed point of the season
+        season_str_numeric: numeric season (start year)
+        num_90s_played: minutes played / 90
+
+    Returns:
+        pd.Series: float64 features in ``get_feature_names_for_extraction()`` order
+    """
+    features = _extract_grouped_season_features(
+        event_df, np.zeros(len(event_df), dtype=np.intp), 1,
+        np.array([age_in_season], dtype='float64'),
+        np.array([season_str_numeric], dtype='float64'),
+        np.array([num_90s_played if pd.notna(num_90s_played) else np.nan], dtype='float64'),
+        source_columns=[event_df.columns]
+    )
+    return pd.Series(features[0], index=_EXTRACTION_FEATURE_NAMES, dtype='float64')
+
+
+def stack_player_season_events(event_frames):
+    """
+    Concatenate per-player-season event frames into the table taken by
+    extract_season_features_batch.
+
+    Args:
+        event_frames: iterable of (player_id, season, event_df)
+
+    Returns:
+        tuple: (events_df with the PLAYER_SEASON_KEY_COLUMNS added,
+            list of the column names of every input frame, in input order)
+    """
+    frames, source_columns = [], []
+    for player_id, season, event_df in event_frames:
+        source_columns.append(list(event_df.columns))
+        if not event_df.empty:
+            frames.append(event_df.assign(**{PLAYER_SEASON_KEY_COLUMNS[0]: str(player_id), PLAYER_SEASON_KEY_COLUMNS[1]: str(season)}))
+    if not frames:
+        return pd.DataFrame(columns=PLAYER_SEASON_KEY_COLUMNS), source_columns
+    return pd.concat(frames, ignore_index=True, sort=False), source_columns
+
+
+def extract_season_features_batch(events_df, player_seasons, source_columns=None):
+    """
+    Base features of many player-seasons in one grouped computation.
+
+    Gives the same values as calling extract_season_features on the events of
+    each player-season separately, without paying the per-call overhead.
+
+    Args:
+        events_df: events of all player-seasons; the PLAYER_SEASON_KEY_COLUMNS
+            give the player-season of every row
+        player_seasons: DataFrame with one row per player-season: the
+            PLAYER_SEASON_KEY_COLUMNS plus 'age', 'season_numeric' and 'num_90s_played'
+        source_columns: optional, aligned with player_seasons: the columns of
+            every player-season's own event file (see stack_player_season_events).
+            A few features depend on whether a column exists at all; without
+            this a column counts as present for a player-season when any of
+            its events has a value in it.
+
+    Returns:
+        DataFrame: get_feature_names_for_extraction() columns, one row per
+            player_seasons row (same index). Events of unlisted player-seasons
+            are ignored; player-seasons without events get the empty-season values.
+    """
+    keys = pd.MultiIndex.from_arrays([player_seasons[c].astype(str) for c in PLAYER_SEASON_KEY_COLUMNS])
+    if not keys.is_unique:
+        raise ValueError("extract_season_features_batch: player_seasons has duplicated (player_id, season) keys.")
+    if len(events_df) and all(c in events_df.columns for c in PLAYER_SEASON_KEY_COLUMNS):
+        event_keys = pd.MultiIndex.from_arrays([events_df[c].astype(str) for c in PLAYER_SEASON_KEY_COLUMNS])
+        group_codes = keys.get_indexer(event_keys)
+    else:
+        group_codes = np.full(len(events_df), -1, dtype=np.intp)
+
+    features = _extract_grouped_season_features(
+        events_df, group_codes, len(keys),
+        pd.to_numeric(player_seasons['age'], errors='coerce').to_numpy(dtype='float64'),
+        pd.to_numeric(player_seasons['season_numeric'], errors='coerce').to_numpy(dtype='float64'),
+        pd.to_numeric(player_seasons['num_90s_played'], errors='coerce').to_numpy(dtype='float64'),
+        source_columns=source_columns
+    )
+    return pd.DataFrame(features, index=player_seasons.index, columns=_EXTRACTION_FEATURE_NAMES)
 
 # --- Target Generation Functions  ---
+def _kpi_data_column(kpi_name):
+    """Column holding a KPI's values; inverse KPIs ('*_inv_kpi') are stored as '*_inv_kpi_base'."""
+    return kpi_name.replace('_inv_kpi', '_inv_kpi_base') if kpi_name.endswith('_inv_kpi') else kpi_name
+
+def _column_ranges(block):
+    """Per-column (min, max) of a 2-D block ignoring NaN; NaN for all-NaN columns."""
+    if block.shape[0] == 0:
+        nan_range = np.full(block.shape[1], np.nan)
+        return nan_range, nan_range
+    return np.nanmin(block, axis=0), np.nanmax(block, axis=0)
+
+def _reliable_rows(df):
+    """Rows with enough minutes for per-90 KPIs, or None when num_90s_played is missing."""
+    if 'num_90s_played' not in df.columns:
+        return None
+    return pd.to_numeric(df['num_90s_played'], errors='coerce').to_numpy(dtype='float64') >= MIN_90S_PLAYED_FOR_P90_STATS
+
 def derive_kpi_weights_from_impact_correlation(df_all_features, position_group, impact_kpi_list, kpi_definitions_for_pos):
-    pos_df = df_all_features[df_all_features['general_position_identifier'] == position_group].copy()
+    """
+    Weight of every target KPI of ``position_group``: its absolute Pearson
+    correlation with the composite impact score (sum of the min-max scaled
+    impact KPIs), normalised so the weights add up to 1. Equal weights when
+    nothing correlates.
+
+    Per-90 impact KPIs are scaled over the player-seasons with at least
+    MIN_90S_PLAYED_FOR_P90_STATS and count as 0 for the others. All impact
+    KPIs are scaled in one pass over the KPI block and all target KPIs are
+    correlated with one matrix product.
+
+    Returns:
+        dict: target KPI -> weight
+    """
+    pos_df = df_all_features[df_all_features['general_position_identifier'] == position_group]
     if pos_df.empty or len(impact_kpi_list) == 0 or len(kpi_definitions_for_pos) == 0:
         logger_trainer.warning(f"    Trainer: Not enough data or definitions to derive weights for {position_group}. Using equal weights.")
         return {kpi: 1.0/len(kpi_definitions_for_pos) if kpi_definitions_for_pos else 1.0 for kpi in kpi_definitions_for_pos}
-    impact_score_components_normalized = pd.DataFrame(index=pos_df.index)
-    for kpi_impact_comp_orig in impact_kpi_list:
-        kpi_impact_comp = kpi_impact_comp_orig.replace('_inv_kpi', '_inv_kpi_base') if kpi_impact_comp_orig.endswith('_inv_kpi') else kpi_impact_comp_orig
+
+    impact_cols = []
+    for kpi_impact_comp in dict.fromkeys(_kpi_data_column(k) for k in impact_kpi_list):
         if kpi_impact_comp in pos_df.columns:
-            col_data = pos_df[kpi_impact_comp].copy()
-            if kpi_impact_comp.endswith(('_p90', '_sqrt_')) and 'num_90s_played' in pos_df.columns:
-                reliable_mask_pos = pos_df['num_90s_played'] >= MIN_90S_PLAYED_FOR_P90_STATS
-                col_data_reliable = col_data[reliable_mask_pos]
-                if not col_data_reliable.empty and col_data_reliable.nunique() > 1:
-                    scaler_impact_comp = MinMaxScaler()
-                    scaled_reliable = scaler_impact_comp.fit_transform(col_data_reliable.values.reshape(-1,1)).flatten()
-                    impact_score_components_normalized[kpi_impact_comp] = pd.Series(np.nan, index=col_data.index)
-                    impact_score_components_normalized.loc[reliable_mask_pos, kpi_impact_comp] = scaled_reliable
-                    impact_score_components_normalized[kpi_impact_comp].fillna(0.0, inplace=True)
-                elif not col_data_reliable.empty:
-                    impact_score_components_normalized[kpi_impact_comp] = 0.5 
-                    impact_score_components_normalized.loc[~reliable_mask_pos, kpi_impact_comp] = 0.0
-                else: impact_score_components_normalized[kpi_impact_comp] = 0.0
-            elif col_data.nunique() > 1:
-                scaler_impact_comp = MinMaxScaler()
-                impact_score_components_normalized[kpi_impact_comp] = scaler_impact_comp.fit_transform(col_data.values.reshape(-1,1)).flatten()
-            else: impact_score_components_normalized[kpi_impact_comp] = 0.5 if col_data.notna().any() else 0.0
+            impact_cols.append(kpi_impact_comp)
         else:
             logger_trainer.warning(f"    Trainer: Impact KPI {kpi_impact_comp} not found in features for {position_group}. Assigning 0 for impact.")
-            impact_score_components_normalized[kpi_impact_comp] = 0.0
-    pos_df['composite_impact_score'] = impact_score_components_normalized.sum(axis=1)
-    correlations = {}
-    for kpi_to_weight in kpi_definitions_for_pos:
-        data_col_for_corr = kpi_to_weight.replace('_inv_kpi', '_inv_kpi_base') if kpi_to_weight.endswith('_inv_kpi') else kpi_to_weight
-        if data_col_for_corr in pos_df.columns and \
-           pos_df['composite_impact_score'].nunique() > 1 and \
-           pos_df[data_col_for_corr].nunique() > 1:
-            corr_series_data = pos_df[data_col_for_corr].copy()
-            if kpi_to_weight.endswith('_inv_kpi'):
-                max_val, min_val = corr_series_data.max(), corr_series_data.min()
-                if max_val > min_val : corr_series_data = (max_val - corr_series_data) / (max_val - min_val)
-                elif corr_series_data.notna().any(): corr_series_data[:] = 0.5
-                else: corr_series_data[:] = 0.0
-            correlation = pos_df['composite_impact_score'].corr(corr_series_data)
-            correlations[kpi_to_weight] = abs(correlation if pd.notna(correlation) else 0.0)
-        else: correlations[kpi_to_weight] = 0.0
+    impact_block = pos_df[impact_cols].to_numpy(dtype='float64')
+    reliable = _reliable_rows(pos_df)
+    per_90 = np.array([reliable is not None and c.endswith(('_p90', '_sqrt_')) for c in impact_cols], dtype=bool)
+    if reliable is not None:
+        impact_block = np.where(per_90 & ~reliable[:, None], np.nan, impact_block)
+    low, high = _column_ranges(impact_block)
+    varies = high > low
+    # Same arithmetic as MinMaxScaler: x * scale + (0 - min * scale)
+    scale = 1.0 / np.where(varies, high - low, 1.0)
+    scaled = impact_block * scale + (0 - low * scale)
+    any_value = per_90 & reliable.any() if reliable is not None else np.zeros(len(impact_cols), dtype=bool)
+    any_value = any_value | (~per_90 & ~np.isnan(impact_block).all(axis=0))
+    constant_value = np.where(per_90[None, :], np.where(reliable[:, None], 0.5, 0.0) if reliable is not None else 0.0, 0.5)
+    components = np.where(varies, scaled, np.where(any_value, constant_value, 0.0))
+    composite_impact_score = np.where(np.isnan(components), 0.0, components).sum(axis=1)
+
+    data_cols = [_kpi_data_column(k) for k in kpi_definitions_for_pos]
+    correlations = dict.fromkeys(kpi_definitions_for_pos, 0.0)
+    composite_low, composite_high = _column_ranges(composite_impact_score[:, None])
+    present = [i for i, c in enumerate(data_cols) if c in pos_df.columns]
+    if composite_high[0] > composite_low[0] and present:
+        target_block = pos_df[[data_cols[i] for i in present]].to_numpy(dtype='float64')
+        target_low, target_high = _column_ranges(target_block)
+        complete = ~np.isnan(target_block).any(axis=0)
+        # Inverse KPIs are correlated as stored: min-max inverting a column only flips the sign of its correlation.
+        centered_impact = composite_impact_score - composite_impact_score.mean()
+        centered_targets = np.where(complete, target_block - target_block.mean(axis=0), 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            abs_corr = np.abs(centered_impact @ centered_targets) / np.sqrt((centered_impact @ centered_impact) * (centered_targets * centered_targets).sum(axis=0))
+        for j, i in enumerate(present):
+            if not target_high[j] > target_low[j]:
+                continue
+            if not complete[j]:
+                abs_corr[j] = abs(pd.Series(composite_impact_score).corr(pd.Series(target_block[:, j])))
+            correlations[kpi_definitions_for_pos[i]] = min(float(abs_corr[j]), 1.0) if np.isfinite(abs_corr[j]) else 0.0
     abs_correlations_sum = sum(correlations.values())
     if abs_correlations_sum == 0:
         num_kpis = len(kpi_definitions_for_pos)
@@ -489,53 +713,95 @@ def derive_kpi_weights_from_impact_correlation(df_all_features, position_group,
     return {kpi: val / abs_correlations_sum for kpi, val in correlations.items()}
 
 def generate_potential_target(df_all_player_seasons, derived_kpi_weights_config):
-    df = df_all_player_seasons.copy()
-    df['raw_composite_score'] = 0.0
-    df['potential_target'] = 0.0
+    """
+    Seasonal potential score of every player-season: the weighted sum of its
+    position group's KPIs, each min-max normalised over the group (0.5 for a
+    constant non-zero KPI, per-90 KPIs 0 below MIN_90S_PLAYED_FOR_P90_STATS),
+    rescaled to 0-200 over the group. Player-seasons of groups without
+    weights score 0.
+
+    Returns:
+        DataFrame with the player and season identifiers, 'potential_target'
+            and 'raw_composite_score', indexed like the input
+    """
+    df = df_all_player_seasons
+    raw_composite_score = np.zeros(len(df))
+    potential_target = np.zeros(len(df))
+    positions = df['general_position_identifier'].to_numpy()
+    reliable = _reliable_rows(df)
     for position_group, weights in derived_kpi_weights_config.items():
-        pos_mask = (df['general_position_identifier'] == position_group)
-        if pos_mask.sum() == 0: 
+        pos_mask = positions == position_group
+        if not pos_mask.any():
             logger_trainer.debug(f"No players found for position group {position_group} in generate_potential_target. Skipping.")
             continue
         current_total_weight = sum(w for w in weights.values() if isinstance(w, (int, float)))
-        if current_total_weight == 0: 
+        if current_total_weight == 0:
             logger_trainer.warning(f"Total weight is 0 for {position_group}. KPIs in this group will have 0 contribution.")
             current_total_weight = 1.0
-        position_composite_score_series = pd.Series(0.0, index=df[pos_mask].index)
-        df_pos_group_subset = df[pos_mask].copy()
-        for kpi_col_name_in_weights, weight_value in weights.items():
-            actual_weight = safe_division(weight_value, current_total_weight)
-            data_col_for_calc = kpi_col_name_in_weights.replace('_inv_kpi', '_inv_kpi_base') if kpi_col_name_in_weights.endswith('_inv_kpi') else kpi_col_name_in_weights
-            if data_col_for_calc not in df_pos_group_subset.columns: 
-                logger_trainer.warning(f"KPI column {data_col_for_calc} not found for position {position_group}.")
-                continue
-            kpi_data_for_pos = df_pos_group_subset[data_col_for_calc].copy()
-            min_val_kpi_pos, max_val_kpi_pos = kpi_data_for_pos.min(), kpi_data_for_pos.max()
-            norm_value_series = pd.Series(0.0, index=kpi_data_for_pos.index)
-            if pd.notna(min_val_kpi_pos) and pd.notna(max_val_kpi_pos):
-                if max_val_kpi_pos > min_val_kpi_pos :
-                    norm_value_series = (kpi_data_for_pos - min_val_kpi_pos) / (max_val_kpi_pos - min_val_kpi_pos)
-                elif max_val_kpi_pos == min_val_kpi_pos and max_val_kpi_pos != 0:
-                     norm_value_series[:] = 0.5
-            if data_col_for_calc.endswith(('_p90', '_sqrt_', '_base')):
-                 if 'num_90s_played' in df_pos_group_subset.columns:
-                    low_mins_mask = df_pos_group_subset['num_90s_played'] < MIN_90S_PLAYED_FOR_P90_STATS
-                    if not kpi_col_name_in_weights.endswith('_inv_kpi_base'):
-                        norm_value_series[low_mins_mask] = 0.0
-            if kpi_col_name_in_weights.endswith('_inv_kpi_base'):
-                 position_composite_score_series += norm_value_series.fillna(0.0) * actual_weight
+        kpi_names = []
+        for kpi_col_name_in_weights in weights:
+            if _kpi_data_column(kpi_col_name_in_weights) in df.columns:
+                kpi_names.append(kpi_col_name_in_weights)
             else:
-                position_composite_score_series += norm_value_series.fillna(0.0) * actual_weight
-        df.loc[pos_mask, 'raw_composite_score'] = position_composite_score_series
-        if pos_mask.sum() > 0:
-            min_raw_score_group = df.loc[pos_mask, 'raw_composite_score'].min()
-            max_raw_score_group = df.loc[pos_mask, 'raw_composite_score'].max()
-            if max_raw_score_group == min_raw_score_group or pd.isna(max_raw_score_group) or pd.isna(min_raw_score_group):
-                df.loc[pos_mask, 'potential_target'] = 100.0
-            else:
-                scaled_potential = ((df.loc[pos_mask, 'raw_composite_score'] - min_raw_score_group) / (max_raw_score_group - min_raw_score_group)) * 200.0
-                df.loc[pos_mask, 'potential_target'] = scaled_potential.clip(0, 200).round(2)
-    return df[['player_id_identifier', 'target_season_identifier', 'potential_target', 'raw_composite_score']]
+                logger_trainer.warning(f"KPI column {_kpi_data_column(kpi_col_name_in_weights)} not found for position {position_group}.")
+        kpi_block = df.loc[pos_mask, [_kpi_data_column(k) for k in kpi_names]].to_numpy(dtype='float64')
+        low, high = _column_ranges(kpi_block)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            normalized = np.where(high > low, (kpi_block - low) / (high - low), np.where((high == low) & (high != 0), 0.5, 0.0))
+        if reliable is not None:
+            # Per-90 KPIs of player-seasons with few minutes do not count, except the '*_inv_kpi_base' weights.
+            per_90 = np.array([_kpi_data_column(k).endswith(('_p90', '_sqrt_', '_base')) and not k.endswith('_inv_kpi_base') for k in kpi_names], dtype=bool)
+            normalized = np.where(per_90 & ~reliable[pos_mask][:, None], 0.0, normalized)
+        normalized = np.where(np.isnan(normalized), 0.0, normalized)
+        kpi_weights = np.array([safe_division(weights[k], current_total_weight) for k in kpi_names], dtype='float64')
+        position_composite_score = normalized @ kpi_weights
+        raw_composite_score[pos_mask] = position_composite_score
+
+        min_raw_score_group, max_raw_score_group = position_composite_score.min(), position_composite_score.max()
+        if max_raw_score_group == min_raw_score_group or np.isnan(max_raw_score_group) or np.isnan(min_raw_score_group):
+            potential_target[pos_mask] = 100.0
+        else:
+            scaled_potential = ((position_composite_score - min_raw_score_group) / (max_raw_score_group - min_raw_score_group)) * 200.0
+            potential_target[pos_mask] = np.round(np.clip(scaled_potential, 0, 200), 2)
+    return pd.DataFrame({
+        'player_id_identifier': df['player_id_identifier'],
+        'target_season_identifier': df['target_season_identifier'],
+        'potential_target': potential_target,
+        'raw_composite_score': raw_composite_score,
+    }, index=df.index)
+
+def preview_potential_target(df_all_features, position_group, impact_kpi_list, kpi_definitions_for_pos, histogram_bins=10):
+    """
+    What a custom model for ``position_group`` would be trained on, without
+    training it: the KPI weights derived from the impact KPIs and the
+    distribution of the peak potential target over its U21 instances.
+
+    Args:
+        df_all_features: Pass 1 base features (all ages) with the
+            ``*_identifier`` columns
+
+    Returns:
+        dict with "derived_kpi_weights" and "target_distribution" (instances,
+            mean, std, min, max, percentiles and a 0-200 histogram)
+    """
+    derived_kpi_weights = derive_kpi_weights_from_impact_correlation(df_all_features, position_group, impact_kpi_list, kpi_definitions_for_pos)
+    pos_df = df_all_features[df_all_features['general_position_identifier'] == position_group]
+    targets = generate_potential_target(pos_df, {position_group: derived_kpi_weights})
+    peak_target = targets.groupby('player_id_identifier')['potential_target'].transform('max').to_numpy()
+    u21_peak_target = peak_target[pd.to_numeric(pos_df['age'], errors='coerce').to_numpy() <= 21]
+
+    distribution = {"instances": int(len(u21_peak_target))}
+    if len(u21_peak_target):
+        counts, bin_edges = np.histogram(u21_peak_target, bins=histogram_bins, range=(0.0, 200.0))
+        distribution.update({
+            "mean": round(float(u21_peak_target.mean()), 2),
+            "std": round(float(u21_peak_target.std()), 2),
+            "min": round(float(u21_peak_target.min()), 2),
+            "max": round(float(u21_peak_target.max()), 2),
+            "percentiles": {f"p{q}": round(float(v), 2) for q, v in zip((10, 25, 50, 75, 90), np.percentile(u21_peak_target, [10, 25, 50, 75, 90]))},
+            "histogram": {"bin_edges": bin_edges.tolist(), "counts": counts.tolist()},
+        })
+    return {"position_group": position_group, "derived_kpi_weights": derived_kpi_weights, "target_distribution": distribution}
 
 # --- Config Saving Function ---
 def trainer_save_model_run_config(filepath, model_name, feature_cols, model_params, 
@@ -579,87 +845,375 @@ def trainer_save_model_run_config(filepath, model_name, feature_cols, model_para
     except TypeError as e: logger_trainer.error(f"TypeError during JSON serialization for {position_group_trained} custom model config: {e}.")
 
 
-def build_and_train_model_from_script_logic(
-    s3_client,
-    r2_bucket_name,
-    custom_model_id: str,
-    position_group_to_train: str,
-    user_kpi_definitions_for_weight_derivation: dict,
-    user_composite_impact_kpis: dict,
-    base_output_dir_for_custom_model: str,
-    user_ml_feature_subset: list = None
-):
-    EVALUATION_SEASON = "2015_2016"
-    
-    logger_trainer.info(f"Starting Custom Model Build (ID: {custom_model_id}) for Position: {position_group_to_train}")
-    logger_trainer.info(f"  STRATEGY: Train on all U21 data EXCEPT {EVALUATION_SEASON}, Evaluate EXCLUSIVELY on {EVALUATION_SEASON}.")
-
-    if not s3_client:
-        return False, "Trainer Error: S3 client is not available."
-
-    try:
-        response = s3_client.get_object(Bucket=r2_bucket_name, Key="data/player_index.json")
-        content = response['Body'].read().decode('utf-8')
-        player_index = json.loads(content)
-    except Exception as e:
-        msg = f"Trainer Error: Player index file not found in R2. Error: {e}"
-        logger_trainer.error(msg); return False, msg
+def load_player_minutes_lookup(s3_client, r2_bucket_name):
+    """
+    Load the per-season minutes file from R2.
 
+    Returns:
+        dict: (player_id, season) -> total minutes played
+    """
     try:
         response_minutes = s3_client.get_object(Bucket=r2_bucket_name, Key="data/player_season_minutes_with_names.csv")
         minutes_content = response_minutes['Body'].read().decode('utf-8')
         minutes_df = pd.read_csv(StringIO(minutes_content))
         minutes_df['season_name_std'] = minutes_df['season_name'].str.replace('/', '_', regex=False)
-        minutes_df_dict = { (str(row['player_id']), row['season_name_std']): row['total_minutes_played'] for _, row in minutes_df.iterrows() }
+        return { (str(row['player_id']), row['season_name_std']): row['total_minutes_played'] for _, row in minutes_df.iterrows() }
     except Exception as e:
         logger_trainer.warning(f"Trainer Warning: Player minutes file not found in R2. Error: {e}");
-        minutes_df_dict = {}
+        return {}
 
-    all_season_features = []
-    logger_trainer.info("Trainer Pass 1: Extracting base features for ALL player-seasons from R2.")
-    
-    player_items = list(player_index.items()) if isinstance(player_index, dict) else [(p.get("name", str(p.get("player_id"))), p) for p in player_index]
+def iter_player_season_entries(player_index, seasons=None, training_only=True):
+    """
+    Yield one dict per (player, season) listed in the player index.
 
-    for i, (player_name_from_key, p_info) in enumerate(player_items):
-        if (i + 1) % 200 == 0: logger_trainer.info(f"  Trainer Pass 1 - Processed {i+1}/{len(player_items)} players...")
+    Args:
+        player_index: player index as stored in data/player_index.json
+        seasons: optional collection of seasons to restrict to
+        training_only: skip goalkeepers, unknown positions and players whose age
+            cannot be computed, as the trainer does. Otherwise every player-season
+            is yielded, with age 0 when the date of birth is missing.
+    """
+    player_items = list(player_index.items()) if isinstance(player_index, dict) else [(p.get("name", str(p.get("player_id"))), p) for p in player_index]
+    for player_name_from_key, p_info in player_items:
+        if not isinstance(p_info, dict): continue
         player_id_str, dob, specific_pos_idx = str(p_info.get("player_id")), p_info.get("dob"), p_info.get("position")
-        if not all([player_id_str, dob, specific_pos_idx]): continue
         general_pos_idx = get_general_position(specific_pos_idx)
-        if general_pos_idx in ["Goalkeeper", "Unknown"]: continue
+        if training_only:
+            if not all([player_id_str, dob, specific_pos_idx]): continue
+            if general_pos_idx in ["Goalkeeper", "Unknown"]: continue
+        elif p_info.get("player_id") is None:
+            continue
 
         for season_str in p_info.get("seasons", []):
             if not (isinstance(season_str, str) and '_' in season_str): continue
-            
-            age_at_season = get_age_at_fixed_point_in_season(dob, season_str)
-            if age_at_season is None: continue 
-            
-            season_numeric = int(season_str.split('_')[0])
-            total_minutes = minutes_df_dict.get((player_id_str, season_str), 0.0); num_90s = safe_division(total_minutes, 90.0)
-            
-            event_file_key = f"data/{season_str}/players/{player_id_str}_{season_str}.csv"
-            current_season_event_df = pd.DataFrame()
-            try:
-                response_event = s3_client.get_object(Bucket=r2_bucket_name, Key=event_file_key)
-                event_content = response_event['Body'].read().decode('utf-8')
-                current_season_event_df = pd.read_csv(StringIO(event_content), dtype=object, low_memory=False)
-            except s3_client.exceptions.NoSuchKey:
-                pass
-            except Exception as e:
-                 logger_trainer.warning(f"Could not load event file {event_file_key} from R2: {e}")
+            if seasons is not None and season_str not in seasons: continue
+
+            age_at_season = get_age_at_fixed_point_in_season(dob, season_str) if dob else None
+            if age_at_season is None:
+                if training_only: continue
+                age_at_season = 0
+
+            yield {
+                "player_id": player_id_str,
+                "player_name": player_name_from_key,
+                "season": season_str,
+                "season_numeric": int(season_str.split('_')[0]),
+                "age": age_at_season,
+                "general_position": general_pos_idx,
+            }
+
+def _pass1_batches(entries, minutes_df_dict):
+    batches = []
+    for start in range(0, len(entries), PASS1_BATCH_SIZE):
+        batch_entries = entries[start:start + PASS1_BATCH_SIZE]
+        batch_df = pd.DataFrame({
+            'player_id_identifier': [e["player_id"] for e in batch_entries],
+            'player_name_identifier': [e["player_name"] for e in batch_entries],
+            'target_season_identifier': [e["season"] for e in batch_entries],
+            'general_position_identifier': [e["general_position"] for e in batch_entries],
+            'age': [e["age"] for e in batch_entries],
+            'season_numeric': [e["season_numeric"] for e in batch_entries],
+            'num_90s_played': [safe_division(minutes_df_dict.get((e["player_id"], e["season"]), 0.0), 90.0) for e in batch_entries],
+        })
+        # A player listed twice in the index shares one event file; extract it once.
+        player_seasons = batch_df.drop_duplicates(subset=PLAYER_SEASON_KEY_COLUMNS).reset_index(drop=True)
+        batches.append((batch_df, player_seasons))
+    return batches
+
+def _extract_pass1_feature_blocks(s3_client, r2_bucket_name, player_seasons_list):
+    """
+    Base features of every batch of player-seasons, as float64 arrays aligned
+    to get_feature_names_for_extraction(). One prefetch stream feeds all the
+    batches, so downloads for the next batch overlap the current extraction.
+    """
+    event_stream = prefetch_event_frames(
+        s3_client, r2_bucket_name,
+        ((pid, season) for player_seasons in player_seasons_list
+         for pid, season in zip(player_seasons['player_id_identifier'], player_seasons['target_season_identifier'])),
+        dtype=object, low_memory=False
+    )
+    try:
+        for player_seasons in player_seasons_list:
+            event_frames = []
+            for _ in range(len(player_seasons)):
+                player_id_str, season_str, loaded_event_df, error = next(event_stream)
+                if error is not None:
+                    logger_trainer.warning(f"Could not load event file {event_csv_key(player_id_str, season_str)} from R2: {error}")
+                event_frames.append((player_id_str, season_str, loaded_event_df if loaded_event_df is not None else pd.DataFrame()))
+            events_df, source_columns = stack_player_season_events(event_frames)
+            yield extract_season_features_batch(events_df, player_seasons, source_columns).to_numpy(dtype='float64')
+    finally:
+        event_stream.close()
+
+_PASS1_WORKER_S3_CLIENT = None
+
+def _init_pass1_worker(client_factory):
+    global _PASS1_WORKER_S3_CLIENT
+    _PASS1_WORKER_S3_CLIENT = client_factory()
+
+def _extract_pass1_batch_in_worker(r2_bucket_name, player_seasons):
+    return next(_extract_pass1_feature_blocks(_PASS1_WORKER_S3_CLIENT, r2_bucket_name, [player_seasons]))
+
+def extract_base_feature_table(s3_client, r2_bucket_name, entries, minutes_df_dict, workers=1, client_factory=None, progress=None):
+    """
+    Load the events of every player-season in ``entries`` and extract its base
+    features (Trainer Pass 1).
+
+    With ``workers`` > 1 the batches are spread over a process pool. Each
+    worker opens its own R2 client, fetches and extracts whole batches and
+    sends back only the float feature block; results are assembled in batch
+    order, so the table is identical to the serial one.
+
+    Args:
+        entries: iterable of dicts as yielded by iter_player_season_entries
+        minutes_df_dict: (player_id, season) -> total minutes played
+        workers: number of worker processes; 1 extracts in this process
+        client_factory: picklable callable returning the S3 client of a worker;
+            defaults to an R2 client built from the R2_* environment variables
+        progress: optional callable(stage, done, total), called with "pass1"
+            after every batch
+
+    Returns:
+        DataFrame: one row per player-season with all get_feature_names_for_extraction()
+            columns plus the *_identifier columns
+    """
+    entries = list(entries)
+    batches = _pass1_batches(entries, minutes_df_dict)
+    player_seasons_list = [player_seasons for _, player_seasons in batches]
+
+    workers = max(1, min(workers or 1, len(batches)))
+    if workers > 1 and client_factory is None:
+        if r2_env_configured():
+            client_factory = r2_client_from_env
+        else:
+            logger_trainer.warning("Trainer Pass 1: R2_* environment variables not set, worker processes cannot open R2 clients. Extracting in a single process.")
+            workers = 1
+
+    if workers > 1:
+        logger_trainer.info(f"Trainer Pass 1: extracting {len(batches)} batches on {workers} worker processes.")
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_pass1_worker, initargs=(client_factory,))
+        feature_blocks = executor.map(_extract_pass1_batch_in_worker, [r2_bucket_name] * len(batches), player_seasons_list)
+    else:
+        executor = None
+        feature_blocks = _extract_pass1_feature_blocks(s3_client, r2_bucket_name, player_seasons_list)
+
+    tables = []
+    processed = 0
+    try:
+        for (batch_df, player_seasons), feature_values in zip(batches, feature_blocks):
+            features_df = pd.DataFrame(feature_values, columns=_EXTRACTION_FEATURE_NAMES)
+            features_df[PLAYER_SEASON_KEY_COLUMNS] = player_seasons[PLAYER_SEASON_KEY_COLUMNS]
+            batch_features = batch_df[BASE_FEATURE_ID_COLUMNS].merge(features_df, on=PLAYER_SEASON_KEY_COLUMNS, how='left')
+            tables.append(batch_features[get_feature_names_for_extraction() + BASE_FEATURE_ID_COLUMNS])
+            processed += len(batch_df)
+            logger_trainer.info(f"  Trainer Pass 1 - Processed {processed}/{len(entries)} player-seasons...")
+            if progress: progress("pass1", processed, len(entries))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if not tables:
+        return pd.DataFrame(columns=get_feature_names_for_extraction() + BASE_FEATURE_ID_COLUMNS)
+    return pd.concat(tables, ignore_index=True).fillna(0.0)
+
+def load_base_features_for_training(s3_client, r2_bucket_name, player_index, minutes_df_dict, workers=1, progress=None):
+    """
+    Base features for every trainable player-season. Rows come from the
+    precomputed feature store when it has them; the remaining player-seasons
+    are extracted from their event files.
+
+    ``progress`` is called as in extract_base_feature_table, counting the
+    feature store rows as done.
+    """
+    entries = list(iter_player_season_entries(player_index, training_only=True))
+    if not entries:
+        return pd.DataFrame()
+
+    from model_trainer.feature_store import load_feature_store
+    stored_df = None
+    try:
+        stored_df = load_feature_store(s3_client, r2_bucket_name)
+    except Exception as e:
+        logger_trainer.warning(f"Trainer: Could not read the base feature store, extracting from events. Error: {e}")
+
+    frames = []
+    missing_entries = entries
+    if stored_df is not None and not stored_df.empty:
+        wanted = pd.DataFrame(entries)[["player_id", "season", "player_name", "general_position"]].rename(columns={
+            "player_id": "player_id_identifier", "season": "target_season_identifier",
+            "player_name": "player_name_identifier", "general_position": "general_position_identifier"})
+        from_store = wanted.merge(
+            stored_df.drop(columns=["player_name_identifier", "general_position_identifier"], errors='ignore'),
+            on=["player_id_identifier", "target_season_identifier"], how='inner')
+        stored_keys = set(zip(from_store['player_id_identifier'], from_store['target_season_identifier']))
+        missing_entries = [e for e in entries if (e["player_id"], e["season"]) not in stored_keys]
+        frames.append(from_store)
+        logger_trainer.info(f"Trainer Pass 1: {len(from_store)} player-seasons read from the feature store, {len(missing_entries)} to extract from events.")
+
+    n_stored = len(entries) - len(missing_entries)
+    if progress: progress("pass1", n_stored, len(entries))
+    if missing_entries:
+        extraction_progress = (lambda stage, done, total: progress(stage, n_stored + done, len(entries))) if progress else None
+        frames.append(extract_base_feature_table(s3_client, r2_bucket_name, missing_entries, minutes_df_dict, workers=workers, progress=extraction_progress))
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    columns = get_feature_names_for_extraction() + BASE_FEATURE_ID_COLUMNS
+    return pd.concat(frames, ignore_index=True)[columns].fillna(0.0)
+
+def ml_feature_matrix(df_all_seasons, df_instances, progress=None, history_rows=None):
+    """
+    ML input features of every instance as one float64 matrix aligned to
+    get_trainer_all_possible_ml_feature_names(). The history of an instance is
+    every earlier season of the same player.
+
+    All player-seasons are sorted once by player and season, so a player's
+    seasons form one contiguous block and the history of an instance is the
+    prefix of its block before the instance's season; each prefix is a view of
+    one base-metric matrix instead of a filter over the whole frame.
+
+    Args:
+        df_all_seasons: base features of all player-seasons, with
+            ``season_numeric``; rows of ``df_instances`` must be in it under
+            the same index labels
+        df_instances: player-seasons to build features for
+        progress: optional callable(stage, done, total), called with "pass2"
+        history_rows: optional boolean Series over ``df_all_seasons``; only
+            those rows are used as history (all rows by default)
+
+    Returns:
+        np.ndarray: one row per instance in ``df_instances`` order
+    """
+    df_sorted = df_all_seasons.sort_values(by=['player_id_identifier', 'season_numeric'])
+    base_metric_names = get_feature_names_for_extraction()
+    has_metric = np.isin(base_metric_names, df_sorted.columns)
+    base_values = df_sorted.reindex(columns=base_metric_names).apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    base_values[:, ~has_metric] = 0.0
+    history_values = np.where(np.isnan(base_values), 0.0, base_values)
+    seasons = pd.to_numeric(df_sorted['season_numeric'], errors='coerce').to_numpy(dtype='float64')
+    player_ids = df_sorted['player_id_identifier']
+    block_starts = np.arange(len(df_sorted)) - player_ids.groupby(player_ids, sort=False, dropna=False).cumcount().to_numpy()
+    valid_players = player_ids.notna().to_numpy()
+    general_positions = df_sorted['general_position_identifier'].to_numpy()
+    usable_history = history_rows.reindex(df_sorted.index).fillna(False).to_numpy(dtype=bool) if history_rows is not None else None
+
+    instance_positions = df_sorted.index.get_indexer(df_instances.index)
+    feature_rows = np.empty((len(instance_positions), len(_ML_FEATURE_NAMES)), dtype='float64')
+    for i, pos in enumerate(instance_positions):
+        if (i + 1) % 100 == 0:
+            logger_trainer.info(f"  Trainer Pass 2 - Processed ML features for {i + 1}/{len(instance_positions)} instances...")
+            if progress: progress("pass2", i + 1, len(instance_positions))
+        start = block_starts[pos]
+        # Earlier seasons sort first within the block, so the history ends before the first season >= the current one.
+        n_history = np.searchsorted(seasons[start:pos], seasons[pos], side='left') if valid_players[pos] and not np.isnan(seasons[pos]) else 0
+        history = slice(start, start + n_history)
+        if usable_history is not None and not usable_history[history].all():
+            history = np.arange(start, start + n_history)[usable_history[history]]
+        feature_rows[i] = _ml_feature_vector(
+            base_values[pos], general_positions[pos],
+            history_values[history], seasons[history], has_metric
+        )
 
-            base_features_series = extract_season_features(current_season_event_df, age_at_season, season_numeric, num_90s)
-            base_features_series['player_id_identifier'] = player_id_str
-            base_features_series['player_name_identifier'] = player_name_from_key
-            base_features_series['target_season_identifier'] = season_str
-            base_features_series['general_position_identifier'] = general_pos_idx
-            all_season_features.append(base_features_series)
+    if progress: progress("pass2", len(instance_positions), len(instance_positions))
+    return feature_rows
 
-    if not all_season_features: 
+def construct_ml_feature_table(df_all_seasons, df_instances, progress=None):
+    """
+    Full ML input features of every instance (Trainer Pass 2), see
+    ml_feature_matrix.
+
+    Args:
+        df_all_seasons: base features of all player-seasons, with
+            ``season_numeric``
+        df_instances: player-seasons to build features for, with the
+            ``peak_potential_target`` and ``raw_composite_score`` targets
+        progress: optional callable(stage, done, total), called with "pass2"
+
+    Returns:
+        DataFrame: one row per instance in ``df_instances`` order, the
+            get_trainer_all_possible_ml_feature_names() columns followed by
+            the identifier and target columns
+    """
+    ml_features_df = pd.DataFrame(ml_feature_matrix(df_all_seasons, df_instances, progress=progress), columns=_ML_FEATURE_NAMES)
+    for col in BASE_FEATURE_ID_COLUMNS:
+        ml_features_df[col] = df_instances[col].to_numpy()
+    return set_ml_target_columns(ml_features_df, df_instances).fillna(0.0)
+
+def set_ml_target_columns(ml_features_df, df_instances):
+    """
+    Set the ML_TARGET_COLUMNS of ``ml_features_df`` from the targets of the
+    instances it was built from (same rows, same order). These are the only
+    columns of the Pass 2 table that depend on the KPI weights.
+    """
+    ml_features_df['peak_potential_target'] = df_instances['peak_potential_target'].to_numpy()
+    ml_features_df['raw_composite_score_heuristic_value'] = df_instances['raw_composite_score'].to_numpy() if 'raw_composite_score' in df_instances.columns else 0.0
+    ml_features_df[ML_TARGET_COLUMNS] = ml_features_df[ML_TARGET_COLUMNS].fillna(0.0)
+    return ml_features_df
+
+def prepare_training_dataset(
+    s3_client,
+    r2_bucket_name,
+    user_kpi_definitions_for_weight_derivation: dict,
+    user_composite_impact_kpis: dict,
+    workers: int = 1,
+    use_snapshot: bool = True,
+    progress=None
+):
+    """
+    Everything the position models are trained from, shared by all position
+    groups: Pass 1 base features, the correlation-derived KPI weights, the
+    peak potential targets and the Pass 2 ML features of every U21 instance.
+
+    Args:
+        user_kpi_definitions_for_weight_derivation: position group -> target KPIs;
+            groups not listed use KPI_DEFINITIONS_FOR_WEIGHT_DERIVATION
+        user_composite_impact_kpis: position group -> impact KPIs; groups not
+            listed use COMPOSITE_IMPACT_KPIS
+        workers: worker processes for the Pass 1 extraction
+        use_snapshot: read the Pass 1 and Pass 2 tables from the training
+            snapshot of the current data and feature code when there is one,
+            and store them as that snapshot when there is not
+        progress: optional callable(stage, done, total), called with "pass1"
+            and "pass2" as the tables are built
+
+    Returns:
+        tuple: (dict with the "ml_features" DataFrame and the
+            "derived_kpi_weights" per position group, None) or (None, error message)
+    """
+    if not s3_client:
+        return None, "Trainer Error: S3 client is not available."
+
+    try:
+        response = s3_client.get_object(Bucket=r2_bucket_name, Key="data/player_index.json")
+        content = response['Body'].read().decode('utf-8')
+        player_index = json.loads(content)
+    except Exception as e:
+        msg = f"Trainer Error: Player index file not found in R2. Error: {e}"
+        logger_trainer.error(msg); return None, msg
+
+    snapshot_fingerprint, snapshot = None, None
+    if use_snapshot:
+        from model_trainer.training_snapshot import load_training_snapshot, training_inputs_fingerprint
+        try:
+            snapshot_fingerprint = training_inputs_fingerprint(s3_client, r2_bucket_name)
+            snapshot = load_training_snapshot(s3_client, r2_bucket_name, snapshot_fingerprint)
+        except Exception as e:
+            logger_trainer.warning(f"Trainer: Could not read the training snapshot, computing Pass 1 and Pass 2. Error: {e}")
+
+    if snapshot is not None:
+        logger_trainer.info(f"Trainer Pass 1: Base features read from training snapshot {snapshot_fingerprint}.")
+        df_all_seasons_with_base_features = snapshot["base_features"]
+        if progress: progress("pass1", len(df_all_seasons_with_base_features), len(df_all_seasons_with_base_features))
+    else:
+        minutes_df_dict = load_player_minutes_lookup(s3_client, r2_bucket_name)
+        logger_trainer.info("Trainer Pass 1: Loading base features for ALL player-seasons.")
+        df_all_seasons_with_base_features = load_base_features_for_training(s3_client, r2_bucket_name, player_index, minutes_df_dict, workers=workers, progress=progress)
+    df_pass1_base_features = df_all_seasons_with_base_features
+    if df_all_seasons_with_base_features.empty:
         msg = "Trainer: No player seasons data found for Pass 1. Cannot build model."
-        logger_trainer.error(msg); return False, msg
-    
-    df_all_seasons_with_base_features = pd.DataFrame(all_season_features).fillna(0.0)
-    
+        logger_trainer.error(msg); return None, msg
+
     logger_trainer.info(f"Trainer Pass 1 Complete. Extracted base features for {len(df_all_seasons_with_base_features)} player-seasons (all ages).")
     logger_trainer.info(f"\nTrainer: Deriving KPI weights using data from all players...")
     derived_kpi_weights_all_groups = {} 
@@ -689,38 +1243,252 @@ def build_and_train_model_from_script_logic(
     df_u21_instances_for_ml = df_all_seasons_with_base_features[df_all_seasons_with_base_features['age'] <= 21].copy()
     if df_u21_instances_for_ml.empty:
         msg = "Trainer: No U21 player seasons found to use as training instances. Cannot build model."
-        logger_trainer.error(msg); return False, msg
-    logger_trainer.info(f"\nTrainer Pass 2: Constructing full ML input features for {len(df_u21_instances_for_ml)} U21 instances...")
-    all_player_ml_feature_vectors = []
-    base_metric_names = get_feature_names_for_extraction()
-    df_all_seasons_with_base_features.sort_values(by=['player_id_identifier', 'season_numeric'], inplace=True)
-    for idx, current_u21_season_row in df_u21_instances_for_ml.iterrows():
-        if (idx + 1) % 100 == 0:
-            logger_trainer.info(f"  Trainer Pass 2 - Processed ML features for {idx + 1}/{len(df_u21_instances_for_ml)} U21 instances...")
-        player_id = current_u21_season_row['player_id_identifier']
-        current_season_numeric = current_u21_season_row['season_numeric']
-        historical_df_for_player = df_all_seasons_with_base_features[
-            (df_all_seasons_with_base_features['player_id_identifier'] == player_id) &
-            (df_all_seasons_with_base_features['season_numeric'] < current_season_numeric)
-        ].copy()
-        instance_ml_features = trainer_construct_ml_features_for_player_season(
-            current_season_base_features_row=current_u21_season_row,
-            historical_base_features_df=historical_df_for_player,
-            all_base_metric_names=base_metric_names
-        )
-        instance_ml_features['player_id_identifier'] = player_id
-        instance_ml_features['player_name_identifier'] = current_u21_season_row['player_name_identifier']
-        instance_ml_features['target_season_identifier'] = current_u21_season_row['target_season_identifier']
-        instance_ml_features['general_position_identifier'] = current_u21_season_row['general_position_identifier']
-        instance_ml_features['peak_potential_target'] = current_u21_season_row['peak_potential_target']
-        instance_ml_features['raw_composite_score_heuristic_value'] = current_u21_season_row.get('raw_composite_score', 0.0)
-        all_player_ml_feature_vectors.append(instance_ml_features)
-    if not all_player_ml_feature_vectors:
+        logger_trainer.error(msg); return None, msg
+    snapshot_ml_features = snapshot["ml_features"] if snapshot is not None else None
+    if snapshot_ml_features is not None and len(snapshot_ml_features) == len(df_u21_instances_for_ml) and all(
+        (snapshot_ml_features[col].to_numpy() == df_u21_instances_for_ml[col].to_numpy()).all() for col in PLAYER_SEASON_KEY_COLUMNS
+    ):
+        logger_trainer.info(f"\nTrainer Pass 2: ML input features of {len(df_u21_instances_for_ml)} U21 instances read from training snapshot {snapshot_fingerprint}.")
+        full_ml_features_df = set_ml_target_columns(snapshot_ml_features, df_u21_instances_for_ml)
+        if progress: progress("pass2", len(full_ml_features_df), len(full_ml_features_df))
+    else:
+        logger_trainer.info(f"\nTrainer Pass 2: Constructing full ML input features for {len(df_u21_instances_for_ml)} U21 instances...")
+        full_ml_features_df = construct_ml_feature_table(df_all_seasons_with_base_features, df_u21_instances_for_ml, progress=progress)
+        if snapshot_fingerprint is not None and not full_ml_features_df.empty:
+            from model_trainer.training_snapshot import save_training_snapshot
+            try:
+                if save_training_snapshot(s3_client, r2_bucket_name, snapshot_fingerprint, {
+                    "base_features": df_pass1_base_features,
+                    "ml_features": full_ml_features_df.drop(columns=ML_TARGET_COLUMNS),
+                }):
+                    logger_trainer.info(f"Trainer: Pass 1 and Pass 2 tables saved as training snapshot {snapshot_fingerprint}.")
+            except Exception as e:
+                logger_trainer.warning(f"Trainer: Could not save the training snapshot {snapshot_fingerprint}: {e}")
+    if full_ml_features_df.empty:
         msg = "Trainer: No ML feature vectors constructed in Pass 2. Cannot train."
-        logger_trainer.error(msg); return False, msg
-    full_ml_features_df = pd.DataFrame(all_player_ml_feature_vectors).fillna(0.0)
+        logger_trainer.error(msg); return None, msg
     logger_trainer.info(f"Trainer Pass 2 Complete. Full ML features constructed for {len(full_ml_features_df)} U21 instances.")
-    pos_df_for_training_all_features = full_ml_features_df[full_ml_features_df['general_position_identifier'] == position_group_to_train].copy()
+    return {"ml_features": full_ml_features_df, "derived_kpi_weights": derived_kpi_weights_all_groups}, None
+
+def _native_xgb_params(params, n_threads, random_state=42):
+    """XGBRegressor hyperparameters -> (xgboost.train params, num_boost_round)."""
+    renamed = {'learning_rate': 'eta', 'reg_alpha': 'alpha', 'reg_lambda': 'lambda'}
+    native = {renamed.get(k, k): v for k, v in params.items() if k != 'n_estimators'}
+    native.update({'objective': 'reg:squarederror', 'tree_method': 'hist', 'seed': random_state, 'nthread': n_threads})
+    return native, params.get('n_estimators', 100)
+
+def _native_cv_folds(X, y, cv, groups, n_threads):
+    """[(training QuantileDMatrix, X_valid, y_valid)] for every split of ``cv``."""
+    splitter = KFold(n_splits=cv) if isinstance(cv, int) else cv
+    folds = []
+    for train_idx, valid_idx in splitter.split(X, y, groups):
+        folds.append((xgb.QuantileDMatrix(X[train_idx], label=y[train_idx], nthread=n_threads), X[valid_idx], y[valid_idx]))
+    return folds
+
+def native_xgb_random_search(X, y, param_distributions, n_iter, cv, groups=None, n_threads=1, random_state=42, progress=None):
+    """
+    Randomized hyperparameter search on the native xgboost.train API with
+    the same candidates, folds and R^2 scoring as RandomizedSearchCV.
+
+    Every fold's training rows are binned into a QuantileDMatrix once and
+    reused by all candidates, and all training runs share one thread budget
+    instead of nesting XGBoost threads inside search processes.
+
+    Args:
+        cv: number of KFold splits or a splitter such as GroupKFold
+        groups: group labels for a group splitter
+        n_threads: threads for XGBoost (and the matrix construction)
+        progress: optional callable(stage, done, total), called with "search"
+            after every candidate
+
+    Returns:
+        tuple: (best params in XGBRegressor names, mean validation R^2)
+    """
+    X = np.asarray(X, dtype='float64'); y = np.asarray(y, dtype='float64')
+    folds = _native_cv_folds(X, y, cv, groups, n_threads)
+
+    best_params, best_score = None, -np.inf
+    candidates = list(ParameterSampler(param_distributions, n_iter, random_state=random_state))
+    for candidate_number, candidate in enumerate(candidates, 1):
+        native_params, num_boost_round = _native_xgb_params(candidate, n_threads, random_state)
+        scores = []
+        for dtrain, X_valid, y_valid in folds:
+            booster = xgb.train(native_params, dtrain, num_boost_round=num_boost_round)
+            scores.append(r2_score(y_valid, booster.inplace_predict(X_valid)))
+        mean_score = float(np.mean(scores))
+        if best_params is None or mean_score > best_score:
+            best_params, best_score = candidate, mean_score
+        if progress: progress("search", candidate_number, len(candidates))
+    return best_params, best_score
+
+def native_xgb_successive_halving(
+    X, y, param_distributions, cv, groups=None, n_threads=1, n_candidates=HALVING_CANDIDATES, eta=HALVING_ETA,
+    early_stopping_rounds=HALVING_EARLY_STOPPING_ROUNDS, time_budget_seconds=None, max_boosting_rounds=None, random_state=42,
+    progress=None
+):
+    """
+    Successive-halving hyperparameter search with n_estimators as the
+    resource, on the native xgboost.train API.
+
+    ``n_candidates`` parameter sets are sampled from ``param_distributions``
+    (without n_estimators) and all of them are boosted for a few rounds on
+    every fold. Each rung keeps the best 1/eta of the candidates and continues
+    their boosters up to eta times more rounds, until the last rung reaches
+    the largest n_estimators of the grid. Every fold stops boosting early once
+    its validation RMSE has not improved for ``early_stopping_rounds``, and a
+    candidate is scored by its mean validation R^2 at each fold's best round.
+
+    The search stops before starting a candidate when ``time_budget_seconds``
+    have elapsed or ``max_boosting_rounds`` (boosting rounds summed over all
+    candidates and folds) have been trained; the winner is then picked among
+    the candidates of the last rung reached.
+
+    ``progress`` (optional callable(stage, done, total)) is called with
+    "search" after every candidate evaluation, out of the evaluations of all
+    rungs.
+
+    Returns:
+        tuple: (best params in XGBRegressor names, with n_estimators set to
+            the winner's mean best round count; its mean validation R^2;
+            search trace dict for the model config)
+    """
+    started_at = time.monotonic()
+    X = np.asarray(X, dtype='float64'); y = np.asarray(y, dtype='float64')
+    folds = [
+        (dtrain, xgb.QuantileDMatrix(X_valid, label=y_valid, ref=dtrain, nthread=n_threads), X_valid, y_valid)
+        for dtrain, X_valid, y_valid in _native_cv_folds(X, y, cv, groups, n_threads)
+    ]
+    max_rounds = int(max(param_distributions.get('n_estimators', [100])))
+    sampled_distributions = {k: v for k, v in param_distributions.items() if k != 'n_estimators'}
+    candidates = list(ParameterSampler(sampled_distributions, n_candidates, random_state=random_state))
+    n_rungs = 1
+    while eta ** n_rungs <= len(candidates):
+        n_rungs += 1
+    rung_rounds = [max(1, int(np.ceil(max_rounds / eta ** (n_rungs - 1 - r)))) for r in range(n_rungs)]
+
+    # Per candidate and fold: [booster, best round index, best validation RMSE, stopped early]
+    fold_states = [[[None, 0, np.inf, False] for _ in folds] for _ in candidates]
+    scores, rung_reached = {}, {}
+    total_rounds, budget_hit = 0, None
+
+    def budget_exhausted():
+        if time_budget_seconds is not None and time.monotonic() - started_at >= time_budget_seconds:
+            return "time"
+        if max_boosting_rounds is not None and total_rounds >= max_boosting_rounds:
+            return "boosting_rounds"
+        return None
+
+    trace_rungs = []
+    alive = list(range(len(candidates)))
+    planned_evaluations, rung_size = 0, len(candidates)
+    for _ in rung_rounds:
+        planned_evaluations += rung_size
+        rung_size = max(1, rung_size // eta)
+    evaluations = 0
+    for rung, rounds in enumerate(rung_rounds):
+        evaluated = []
+        for i in alive:
+            budget_hit = budget_exhausted()
+            if budget_hit:
+                break
+            fold_scores = []
+            for state, (dtrain, dvalid, X_valid, y_valid) in zip(fold_states[i], folds):
+                booster, trained = state[0], (state[0].num_boosted_rounds() if state[0] is not None else 0)
+                if not state[3] and trained < rounds:
+                    native_params, _ = _native_xgb_params(candidates[i], n_threads, random_state)
+                    booster = xgb.train(
+                        native_params, dtrain, num_boost_round=rounds - trained, xgb_model=booster,
+                        evals=[(dvalid, 'valid')], early_stopping_rounds=early_stopping_rounds, verbose_eval=False
+                    )
+                    total_rounds += booster.num_boosted_rounds() - trained
+                    # Early stopping restarts with every continuation, so keep the best round seen over all of them.
+                    if booster.best_score < state[2]:
+                        state[1], state[2] = booster.best_iteration, booster.best_score
+                    state[0], state[3] = booster, booster.num_boosted_rounds() < rounds
+                fold_scores.append(r2_score(y_valid, booster.inplace_predict(X_valid, iteration_range=(0, state[1] + 1))))
+            scores[i], rung_reached[i] = float(np.mean(fold_scores)), rung
+            evaluated.append(i)
+            evaluations += 1
+            if progress: progress("search", evaluations, planned_evaluations)
+        if evaluated:
+            trace_rungs.append({
+                "rung": rung,
+                "n_estimators": rounds,
+                "candidates": len(alive),
+                "candidates_evaluated": len(evaluated),
+                "best_cv_r2": round(max(scores[i] for i in evaluated), 4),
+                "elapsed_seconds": round(time.monotonic() - started_at, 2),
+            })
+        if budget_hit or not evaluated:
+            break
+        alive = sorted(evaluated, key=lambda i: scores[i], reverse=True)[:max(1, len(evaluated) // eta)]
+
+    if not scores:
+        raise RuntimeError(f"Successive halving evaluated no candidate within its budget ({budget_hit}).")
+    last_rung = max(rung_reached.values())
+    best_index = max((i for i in scores if rung_reached[i] == last_rung), key=lambda i: scores[i])
+    best_params = dict(candidates[best_index])
+    best_params['n_estimators'] = int(round(np.mean([state[1] + 1 for state in fold_states[best_index]])))
+
+    trace = {
+        "mode": "successive_halving",
+        "eta": eta,
+        "early_stopping_rounds": early_stopping_rounds,
+        "time_budget_seconds": time_budget_seconds,
+        "max_boosting_rounds": max_boosting_rounds,
+        "stopped_by_budget": budget_hit,
+        "boosting_rounds_trained": total_rounds,
+        "elapsed_seconds": round(time.monotonic() - started_at, 2),
+        "rungs": trace_rungs,
+        "candidates": [
+            {
+                "params": candidates[i],
+                "rung_reached": rung_reached[i],
+                "cv_r2": round(scores[i], 4),
+                "best_n_estimators": int(round(np.mean([state[1] + 1 for state in fold_states[i]]))),
+            }
+            for i in sorted(scores, key=lambda i: (-rung_reached[i], -scores[i]))
+        ],
+    }
+    return best_params, scores[best_index], trace
+
+def fit_position_model(
+    ml_features_df: pd.DataFrame,
+    custom_model_id: str,
+    position_group_to_train: str,
+    user_kpi_definitions_for_weight_derivation: dict,
+    user_ml_feature_subset: list = None,
+    n_jobs: int = -1,
+    engine: str = "sklearn",
+    search: str = "random",
+    time_budget_seconds: float = None,
+    max_boosting_rounds: int = None,
+    progress=None
+):
+    """
+    Select the ML features of one position group, then scale, tune and fit
+    its XGBoost model on every season before EVALUATION_SEASON and evaluate
+    it on EVALUATION_SEASON. Nothing is uploaded.
+
+    Args:
+        ml_features_df: "ml_features" table from prepare_training_dataset
+        n_jobs: threads / processes for XGBoost and the hyperparameter search
+        engine: "sklearn" runs RandomizedSearchCV over XGBRegressor; "native"
+            runs native_xgb_random_search with n_jobs as its thread budget.
+            Both produce an XGBRegressor.
+        search: "random" runs the engine's randomized search; "halving" runs
+            native_xgb_successive_halving (native API whatever the engine)
+        time_budget_seconds, max_boosting_rounds: budget of the "halving"
+            search; None means unlimited
+        progress: optional callable(stage, done, total), called with "search"
+            during the native searches and once the final model is fitted
+
+    Returns:
+        tuple: (True, dict with the fitted "scaler" and "model", the "features"
+            used, "model_params", "hyperparam_search_done", "evaluation_metrics",
+            "engine", "search" and "search_trace") or (False, error message)
+    """
+    pos_df_for_training_all_features = ml_features_df[ml_features_df['general_position_identifier'] == position_group_to_train].copy()
     if pos_df_for_training_all_features.empty or len(pos_df_for_training_all_features) < 10:
         msg = f"Trainer: Not enough data for {position_group_to_train} ({len(pos_df_for_training_all_features)}) after ML feature construction. Cannot train model."
         logger_trainer.error(msg); return False, msg
@@ -791,33 +1559,55 @@ def build_and_train_model_from_script_logic(
             logger_trainer.info(f"  Trainer: Using inner GroupKFold ({n_cv_splits_inner} splits) on the training set for RandomizedSearch.")
         else: groups_train_for_search = None
     else: groups_train_for_search = None
-    xgb_model_for_search = XGBRegressor(random_state=42, objective='reg:squarederror', n_jobs=-1)
+    xgb_model_for_search = XGBRegressor(random_state=42, objective='reg:squarederror', n_jobs=n_jobs)
     xgb_param_grid = { 'n_estimators': [100, 200, 300, 500], 'learning_rate': [0.01, 0.03, 0.05, 0.1], 'max_depth': [3, 4, 5, 6, 7], 'subsample': [0.6, 0.7, 0.8, 0.9, 1.0], 'colsample_bytree': [0.6, 0.7, 0.8, 0.9], 'gamma': [0, 0.1, 0.2], 'reg_alpha': [0, 0.005, 0.01, 0.05], 'reg_lambda': [0.1, 0.5, 1, 1.5] }
     n_iter_search = 20 if X_train_scaled.shape[0] > 50 else max(1, int(X_train_scaled.shape[0] * 0.1))
     if X_train_scaled.shape[0] < 10: n_iter_search = max(1, X_train_scaled.shape[0] // 2)
-    random_search = RandomizedSearchCV(estimator=xgb_model_for_search, param_distributions=xgb_param_grid, n_iter=n_iter_search, cv=cv_for_search, scoring='r2', random_state=42, n_jobs=-1, verbose=0)
-    logger_trainer.info(f"  Trainer: Starting RandomizedSearchCV for {position_group_to_train} on {X_train_scaled.shape[0]} training samples (n_iter={n_iter_search}).")
-    best_xgb_model, best_params_for_config, hyperparam_search_done = None, None, False
+    random_search = RandomizedSearchCV(estimator=xgb_model_for_search, param_distributions=xgb_param_grid, n_iter=n_iter_search, cv=cv_for_search, scoring='r2', random_state=42, n_jobs=n_jobs, verbose=0)
+    if engine == "native" or search == "halving":
+        n_jobs = n_jobs if n_jobs and n_jobs > 0 else (os.cpu_count() or 1)
+    n_halving_candidates = HALVING_CANDIDATES if X_train_scaled.shape[0] > 50 else n_iter_search
+    if search == "halving":
+        logger_trainer.info(f"  Trainer: Starting successive halving search for {position_group_to_train} on {X_train_scaled.shape[0]} training samples ({n_halving_candidates} candidates, time budget {time_budget_seconds or 'none'} s, {n_jobs} threads).")
+    elif engine == "native":
+        logger_trainer.info(f"  Trainer: Starting native XGBoost search for {position_group_to_train} on {X_train_scaled.shape[0]} training samples (n_iter={n_iter_search}, {n_jobs} threads).")
+    else:
+        logger_trainer.info(f"  Trainer: Starting RandomizedSearchCV for {position_group_to_train} on {X_train_scaled.shape[0]} training samples (n_iter={n_iter_search}).")
+    best_xgb_model, best_params_for_config, hyperparam_search_done, search_trace = None, None, False, None
     try:
         search_groups_param = groups_train_for_search if isinstance(cv_for_search, GroupKFold) else None
-        random_search.fit(X_train_scaled, y_train, groups=search_groups_param)
-        best_params_from_search = random_search.best_params_
+        if search == "halving":
+            best_params_from_search, _, search_trace = native_xgb_successive_halving(
+                X_train_scaled, y_train, xgb_param_grid, cv_for_search, search_groups_param, n_threads=n_jobs,
+                n_candidates=n_halving_candidates, time_budget_seconds=time_budget_seconds, max_boosting_rounds=max_boosting_rounds,
+                progress=progress
+            )
+            logger_trainer.info(f"  Trainer: Successive halving for {position_group_to_train} trained {search_trace['boosting_rounds_trained']} boosting rounds in {search_trace['elapsed_seconds']} s (budget stop: {search_trace['stopped_by_budget']}).")
+        elif engine == "native":
+            best_params_from_search, _ = native_xgb_random_search(
+                X_train_scaled, y_train, xgb_param_grid, n_iter_search, cv_for_search, search_groups_param, n_threads=n_jobs,
+                progress=progress
+            )
+        else:
+            random_search.fit(X_train_scaled, y_train, groups=search_groups_param)
+            best_params_from_search = random_search.best_params_
         logger_trainer.info(f"  Trainer: Best XGBoost Params for {position_group_to_train} from Search: {best_params_from_search}")
-        best_xgb_model = XGBRegressor(**best_params_from_search, random_state=42, objective='reg:squarederror', n_jobs=-1)
+        best_xgb_model = XGBRegressor(**best_params_from_search, random_state=42, objective='reg:squarederror', n_jobs=n_jobs)
         if X_test_scaled.shape[0] > 0:
             best_xgb_model.set_params(early_stopping_rounds=10)
             best_xgb_model.fit(X_train_scaled, y_train, eval_set=[(X_test_scaled, y_test)], verbose=False)
         else: best_xgb_model.fit(X_train_scaled, y_train, verbose=False)
         best_params_for_config, hyperparam_search_done = best_params_from_search, True
     except Exception as e_search:
-        logger_trainer.error(f"  Trainer: Error during RandomizedSearchCV for {position_group_to_train}: {e_search}. Training with default params.")
-        default_params = {'n_estimators': 100, 'max_depth': 4, 'learning_rate': 0.05, 'random_state': 42, 'objective': 'reg:squarederror', 'n_jobs': -1}
+        logger_trainer.error(f"  Trainer: Error during the hyperparameter search for {position_group_to_train}: {e_search}. Training with default params.")
+        default_params = {'n_estimators': 100, 'max_depth': 4, 'learning_rate': 0.05, 'random_state': 42, 'objective': 'reg:squarederror', 'n_jobs': n_jobs}
         best_xgb_model = XGBRegressor(**default_params)
         if X_test_scaled.shape[0] > 0:
             best_xgb_model.set_params(early_stopping_rounds=10)
             best_xgb_model.fit(X_train_scaled, y_train, eval_set=[(X_test_scaled, y_test)], verbose=False)
         else: best_xgb_model.fit(X_train_scaled, y_train, verbose=False)
         best_params_for_config, hyperparam_search_done = best_xgb_model.get_params(), False
+    if progress: progress("search", 1, 1)
     evaluation_metrics_dict = None
     if X_test_scaled.shape[0] > 0 and y_test.shape[0] > 0:
         y_pred_test = np.clip(best_xgb_model.predict(X_test_scaled), 0, 200)
@@ -826,6 +1616,56 @@ def build_and_train_model_from_script_logic(
         evaluation_metrics_dict = {'MAE': round(mae, 3), 'MSE': round(mse, 3), 'RMSE': round(rmse, 3), 'R2': round(r2, 3)}
         logger_trainer.info(f"  Trainer: Evaluation for {position_group_to_train} (ID: {custom_model_id}) on test set (SEASON {EVALUATION_SEASON}, {X_test_scaled.shape[0]} samples):")
         logger_trainer.info(f"    MAE: {mae:.3f}, MSE: {mse:.3f}, RMSE: {rmse:.3f}, R^2: {r2:.3f}")
+    return True, {
+        "scaler": scaler_pos,
+        "model": best_xgb_model,
+        "features": final_ml_feature_cols_for_model,
+        "model_params": best_params_for_config if hyperparam_search_done else best_xgb_model.get_params(),
+        "hyperparam_search_done": hyperparam_search_done,
+        "evaluation_metrics": evaluation_metrics_dict,
+        "engine": engine,
+        "search": search,
+        "search_trace": search_trace,
+    }
+
+def position_model_keys(models_prefix, model_id, position_group):
+    """
+    Returns:
+        tuple: R2 keys of (model, scaler, config) of one position model stored under ``models_prefix``
+    """
+    pos = position_group.lower()
+    position_dir = f"{models_prefix}{model_id}/{pos}"
+    return (
+        f"{position_dir}/potential_model_{pos}_{model_id}.joblib",
+        f"{position_dir}/feature_scaler_{pos}_{model_id}.joblib",
+        f"{position_dir}/model_config_{pos}_{model_id}.json"
+    )
+
+
+def upload_position_model(
+    s3_client,
+    r2_bucket_name,
+    custom_model_id: str,
+    position_group_to_train: str,
+    fitted: dict,
+    user_kpi_definitions_for_weight_derivation: dict,
+    user_composite_impact_kpis: dict,
+    derived_kpi_weights_all_groups: dict,
+    models_prefix: str = CUSTOM_MODELS_PREFIX
+):
+    """
+    Upload the scaler, model and config of a fit_position_model result to
+    {models_prefix}{custom_model_id}/{position}/ on R2. Models uploaded under
+    CUSTOM_MODELS_PREFIX are also registered in the model catalog.
+
+    Returns:
+        tuple: (success, message)
+    """
+    scaler_pos, best_xgb_model = fitted["scaler"], fitted["model"]
+    final_ml_feature_cols_for_model = fitted["features"]
+    hyperparam_search_done = fitted["hyperparam_search_done"]
+    evaluation_metrics_dict = fitted["evaluation_metrics"]
+    model_key, scaler_key, config_key = position_model_keys(models_prefix, custom_model_id, position_group_to_train)
 
     # --- INICI DEL BLOC PER GUARDAR A R2 ---
     
@@ -834,7 +1674,6 @@ def build_and_train_model_from_script_logic(
         with BytesIO() as f_scaler:
             joblib.dump(scaler_pos, f_scaler)
             f_scaler.seek(0)
-            scaler_key = f"ml_models/custom_models/{custom_model_id}/{position_group_to_train.lower()}/feature_scaler_{position_group_to_train.lower()}_{custom_model_id}.joblib"
             s3_client.upload_fileobj(f_scaler, r2_bucket_name, scaler_key)
             logger_trainer.info(f"Scaler for {custom_model_id} uploaded to R2: {scaler_key}")
     except Exception as e:
@@ -846,7 +1685,6 @@ def build_and_train_model_from_script_logic(
         with BytesIO() as f_model:
             joblib.dump(best_xgb_model, f_model)
             f_model.seek(0)
-            model_key = f"ml_models/custom_models/{custom_model_id}/{position_group_to_train.lower()}/potential_model_{position_group_to_train.lower()}_{custom_model_id}.joblib"
             s3_client.upload_fileobj(f_model, r2_bucket_name, model_key)
             logger_trainer.info(f"Model for {custom_model_id} uploaded to R2: {model_key}")
     except Exception as e:
@@ -855,13 +1693,23 @@ def build_and_train_model_from_script_logic(
         
     # 3. Construir i guardar la configuració a R2
     safe_model_params = {}
-    actual_params_to_save = best_params_for_config if hyperparam_search_done else best_xgb_model.get_params()
+    actual_params_to_save = fitted["model_params"]
     for k, v in actual_params_to_save.items():
         if isinstance(v, np.generic): safe_model_params[k] = v.item()
         else: safe_model_params[k] = v
     
+    if "_" in custom_model_id:
+        parts = custom_model_id.rsplit("_", 1)
+        if len(parts) == 2 and len(parts[1]) == 6 and all(c in '0123456789abcdef' for c in parts[1].lower()):
+            custom_model_display_name = parts[0]
+        else:
+            custom_model_display_name = custom_model_id
+    else:
+        custom_model_display_name = custom_model_id
+
     config = {
         "model_type": f"XGBRegressor_Custom_{custom_model_id}_for_{position_group_to_train}",
+        "model_display_name": custom_model_display_name,
         "description": f"Custom Model: Position-Specific ({position_group_to_train}) XGBoost. Predicts PEAK CAREER POTENTIAL based on U21 data. Trained on all player data.",
         "features_used_for_ml_model": final_ml_feature_cols_for_model,
         "ml_model_parameters": safe_model_params,
@@ -874,87 +1722,334 @@ def build_and_train_model_from_script_logic(
             "min_90s_for_p90_kpi_reliability": MIN_90S_PLAYED_FOR_P90_STATS
         },
         "hyperparameter_search_used": hyperparam_search_done,
+        "training_engine": fitted.get("engine", "sklearn"),
+        "hyperparameter_search_mode": fitted.get("search", "random"),
         "position_group_trained_for": position_group_to_train
     }
     if evaluation_metrics_dict:
         config["evaluation_metrics_on_test_set"] = evaluation_metrics_dict
+    if fitted.get("search_trace"):
+        config["hyperparameter_search_trace"] = fitted["search_trace"]
 
     try:
         config_json_string = json.dumps(config, indent=4)
-        config_key = f"ml_models/custom_models/{custom_model_id}/{position_group_to_train.lower()}/model_config_{position_group_to_train.lower()}_{custom_model_id}.json"
         s3_client.put_object(Bucket=r2_bucket_name, Key=config_key, Body=config_json_string.encode('utf-8'))
         logger_trainer.info(f"Config for {custom_model_id} uploaded to R2: {config_key}")
     except Exception as e:
         msg = f"Failed to upload config to R2 for {custom_model_id}: {e}"
         logger_trainer.error(msg); return False, msg
 
+    # 4. Registrar el model al catàleg perquè l'API el llisti sense sondejar R2 (només els models personalitzats)
+    if models_prefix == CUSTOM_MODELS_PREFIX:
+        try:
+            register_model_position(s3_client, r2_bucket_name, custom_model_id, position_group_to_train, config, config_key)
+            logger_trainer.info(f"Model {custom_model_id} ({position_group_to_train}) registered in the model catalog.")
+        except Exception as e:
+            msg = f"Failed to register {custom_model_id} in the model catalog: {e}"
+            logger_trainer.error(msg); return False, msg
+
     # --- FINAL DEL BLOC PER GUARDAR A R2 ---
     
     logger_trainer.info(f"Custom Model for {position_group_to_train} (ID: {custom_model_id}) trained and artifacts saved to R2.")
     return True, f"Model for {position_group_to_train} (ID: {custom_model_id}) built successfully and saved to cloud storage."
 
 # --- Functions to expose constants and logic to main.py (no changes needed) ---
+
+def train_position_model(
+    s3_client,
+    r2_bucket_name,
+    dataset: dict,
+    custom_model_id: str,
+    position_group_to_train: str,
+    user_kpi_definitions_for_weight_derivation: dict,
+    user_composite_impact_kpis: dict,
+    user_ml_feature_subset: list = None,
+    n_jobs: int = -1,
+    engine: str = "sklearn",
+    search: str = "random",
+    time_budget_seconds: float = None,
+    max_boosting_rounds: int = None,
+    progress=None
+):
+    """
+    Fit one position group's model on a prepare_training_dataset result and
+    upload its artifacts.
+
+    Returns:
+        tuple: (success, message)
+    """
+    success, fitted = fit_position_model(
+        dataset["ml_features"], custom_model_id, position_group_to_train,
+        user_kpi_definitions_for_weight_derivation, user_ml_feature_subset, n_jobs=n_jobs, engine=engine,
+        search=search, time_budget_seconds=time_budget_seconds, max_boosting_rounds=max_boosting_rounds, progress=progress
+    )
+    if not success:
+        return False, fitted
+    return upload_position_model(
+        s3_client, r2_bucket_name, custom_model_id, position_group_to_train, fitted,
+        user_kpi_definitions_for_weight_derivation, user_composite_impact_kpis, dataset["derived_kpi_weights"]
+    )
+
+def build_and_train_model_from_script_logic(
+    s3_client,
+    r2_bucket_name,
+    custom_model_id: str,
+    position_group_to_train: str,
+    user_kpi_definitions_for_weight_derivation: dict,
+    user_composite_impact_kpis: dict,
+    base_output_dir_for_custom_model: str,
+    user_ml_feature_subset: list = None,
+    workers: int = 1,
+    use_snapshot: bool = True,
+    engine: str = "sklearn",
+    search: str = "random",
+    time_budget_seconds: float = None,
+    max_boosting_rounds: int = None,
+    progress=None
+):
+    """
+    Build one custom position model end to end: prepare_training_dataset,
+    then fit and upload it. ``progress`` receives the "pass1", "pass2" and
+    "search" progress of both steps.
+
+    Returns:
+        tuple: (success, message)
+    """
+    logger_trainer.info(f"Starting Custom Model Build (ID: {custom_model_id}) for Position: {position_group_to_train}")
+    logger_trainer.info(f"  STRATEGY: Train on all U21 data EXCEPT {EVALUATION_SEASON}, Evaluate EXCLUSIVELY on {EVALUATION_SEASON}.")
+
+    dataset, msg = prepare_training_dataset(
+        s3_client, r2_bucket_name, user_kpi_definitions_for_weight_derivation, user_composite_impact_kpis,
+        workers=workers, use_snapshot=use_snapshot, progress=progress
+    )
+    if dataset is None:
+        return False, msg
+    return train_position_model(
+        s3_client, r2_bucket_name, dataset, custom_model_id, position_group_to_train,
+        user_kpi_definitions_for_weight_derivation, user_composite_impact_kpis, user_ml_feature_subset, engine=engine,
+        search=search, time_budget_seconds=time_budget_seconds, max_boosting_rounds=max_boosting_rounds, progress=progress
+    )
+
+def build_and_train_position_models(
+    s3_client,
+    r2_bucket_name,
+    custom_model_id: str,
+    position_groups: list,
+    user_kpi_definitions_for_weight_derivation: dict,
+    user_composite_impact_kpis: dict,
+    user_ml_feature_subset: list = None,
+    workers: int = 1,
+    position_workers: int = None,
+    use_snapshot: bool = True,
+    engine: str = "sklearn",
+    search: str = "random",
+    time_budget_seconds: float = None,
+    max_boosting_rounds: int = None,
+    models_prefix: str = CUSTOM_MODELS_PREFIX
+):
+    """
+    Train the models of several position groups from one shared dataset:
+    player index, minutes, event files, Pass 1, the KPI weights and Pass 2
+    are loaded and computed once instead of once per position.
+
+    The position models are fitted in parallel processes when there are
+    enough cores, each with an equal share of them for XGBoost and the
+    hyperparameter search; the artifacts are uploaded from this process.
+
+    Args:
+        position_groups: e.g. ["Attacker", "Midfielder", "Defender"]
+        workers: worker processes for the Pass 1 extraction
+        position_workers: position models fitted at the same time; defaults
+            to as many as there are cores, up to len(position_groups)
+        use_snapshot: see prepare_training_dataset
+        engine, search, time_budget_seconds, max_boosting_rounds: see
+            fit_position_model; the budgets apply to each position model
+        models_prefix: see upload_position_model
+
+    Returns:
+        dict: position group -> (success, message)
+    """
+    logger_trainer.info(f"Starting Model Build (ID: {custom_model_id}) for Positions: {', '.join(position_groups)}")
+    logger_trainer.info(f"  STRATEGY: Train on all U21 data EXCEPT {EVALUATION_SEASON}, Evaluate EXCLUSIVELY on {EVALUATION_SEASON}.")
+
+    dataset, msg = prepare_training_dataset(
+        s3_client, r2_bucket_name, user_kpi_definitions_for_weight_derivation, user_composite_impact_kpis,
+        workers=workers, use_snapshot=use_snapshot
+    )
+    if dataset is None:
+        return {pos_group: (False, msg) for pos_group in position_groups}
+
+    cpu_count = os.cpu_count() or 1
+    position_workers = max(1, min(position_workers or cpu_count, len(position_groups), cpu_count))
+    n_jobs = max(1, cpu_count // position_workers)
+    ml_features_df = dataset["ml_features"]
+    fit_args = {
+        pos_group: (
+            ml_features_df[ml_features_df['general_position_identifier'] == pos_group], custom_model_id, pos_group,
+            user_kpi_definitions_for_weight_derivation, user_ml_feature_subset, n_jobs, engine,
+            search, time_budget_seconds, max_boosting_rounds
+        )
+        for pos_group in position_groups
+    }
+
+    if position_workers > 1:
+        logger_trainer.info(f"Trainer: Fitting {len(position_groups)} position models on {position_workers} processes ({n_jobs} jobs each).")
+        with ProcessPoolExecutor(max_workers=position_workers) as executor:
+            futures = {pos_group: executor.submit(fit_position_model, *args) for pos_group, args in fit_args.items()}
+            fitted_by_position = {}
+            for pos_group, future in futures.items():
+                try:
+                    fitted_by_position[pos_group] = future.result()
+                except Exception as e:
+                    logger_trainer.error(f"Trainer: Fitting the {pos_group} model failed: {e}")
+                    fitted_by_position[pos_group] = (False, f"Trainer: Fitting the {pos_group} model failed: {e}")
+    else:
+        fitted_by_position = {pos_group: fit_position_model(*args) for pos_group, args in fit_args.items()}
+
+    results = {}
+    for pos_group in position_groups:
+        success, fitted = fitted_by_position[pos_group]
+        if not success:
+            results[pos_group] = (False, fitted)
+            continue
+        results[pos_group] = upload_position_model(
+            s3_client, r2_bucket_name, custom_model_id, pos_group, fitted,
+            user_kpi_definitions_for_weight_derivation, user_composite_impact_kpis, dataset["derived_kpi_weights"],
+            models_prefix=models_prefix
+        )
+    return results
+
 def get_trainer_kpi_definitions_for_weight_derivation():
     return KPI_DEFINITIONS_FOR_WEIGHT_DERIVATION
 
 def get_trainer_composite_impact_kpis_definitions():
     return COMPOSITE_IMPACT_KPIS
 
+def _ml_feature_vector(current_values, general_position, history_values=None, history_seasons=None, history_metrics=None):
+    """
+    ML input features of one instance as an array aligned to _ML_FEATURE_NAMES.
+
+    Args:
+        current_values: float64 base metrics of the current season, aligned to
+            get_feature_names_for_extraction() (0 for metrics not requested)
+        general_position: selects the position-specific interaction terms
+        history_values: (seasons x metrics) float64 base metrics of the earlier
+            seasons, oldest first, missing values already replaced by 0
+        history_seasons: season_numeric of every history row (NaN allowed), or
+            None when the history has no seasons
+        history_metrics: mask of the metrics whose hist_*/growth_* features are
+            filled; all of them by default
+
+    Returns:
+        np.ndarray: float64 features
+    """
+    out = np.zeros(len(_ML_FEATURE_NAMES), dtype='float64')
+    out[_ML_FEATURE_SLOTS['current_']] = current_values
+
+    def current(name):
+        slot = _ML_FEATURE_POSITIONS.get(f'current_{name}')
+        return out[slot] if slot is not None else 0.0
+
+    interactions = {}
+    if general_position == "Attacker":
+        g_p90s = current('goals_p90_sqrt_'); cr_kpi = current('conversion_rate_excl_xg_kpi')
+        interactions['current_inter_goals_x_conversion'] = g_p90s * cr_kpi; interactions['current_poly_goals_p90_sqrt_sq'] = g_p90s ** 2
+        interactions['current_inter_drib_x_prog_carry'] = current('dribbles_completed_p90') * current('progressive_carries_p90')
+    elif general_position == "Midfielder":
+        sp_p90 = current('successful_passes_p90'); pc_kpi = current('pass_completion_rate_kpi')
+        interactions['current_inter_succpass_x_comprate'] = sp_p90 * pc_kpi; interactions['current_poly_successful_passes_p90_sq'] = sp_p90 ** 2
+        interactions['current_inter_kpsa_x_prog_carry'] = current('key_passes_goal_assist_p90_sqrt_') * current('progressive_carries_p90')
+    elif general_position == "Defender":
+        tw_p90 = current('tackles_won_p90'); twr_kpi = current('tackle_win_rate_kpi')
+        interactions['current_inter_tackles_x_rate'] = tw_p90 * twr_kpi; interactions['current_poly_tackles_won_p90_sq'] = tw_p90 ** 2
+        interactions['current_inter_aerials_x_rate'] = current('aerial_duels_won_p90') * current('aerial_duel_win_rate_kpi')
+    for feat_name, value in interactions.items():
+        out[_ML_FEATURE_POSITIONS[feat_name]] = value
+
+    if history_values is None or len(history_values) == 0:
+        return out
+
+    n_seasons = len(history_values)
+    out[_ML_FEATURE_POSITIONS['num_hist_seasons']] = float(n_seasons)
+    metrics = slice(None) if history_metrics is None or history_metrics.all() else history_metrics
+    # Fortran order keeps each metric's seasons contiguous, so column sums match Series.sum().
+    values = np.asfortranarray(history_values[:, metrics])
+    current_present = current_values[metrics]
+    hist_sum = values.sum(axis=0)
+    last_values = values[-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth_ratio = np.where((last_values != 0) & ~np.isnan(current_present), current_present / last_values, 0.0)
+
+    hist_trend = np.zeros(len(last_values))
+    if n_seasons >= 2 and history_seasons is not None:
+        valid_trend_mask = ~np.isnan(history_seasons)
+        if valid_trend_mask.sum() >= 2:
+            # Least-squares slope of every metric against the season: sum(dx * dy) / sum(dx^2).
+            dx = history_seasons[valid_trend_mask] - history_seasons[valid_trend_mask].mean()
+            y_valid = values[valid_trend_mask]
+            denominator = dx @ dx
+            if denominator > 0:
+                hist_trend = dx @ (y_valid - y_valid.mean(axis=0)) / denominator
+
+    for prefix, aggregate in (
+        ('hist_avg_', hist_sum / n_seasons),
+        ('hist_sum_', hist_sum),
+        ('hist_max_', values.max(axis=0)),
+        ('hist_trend_', hist_trend),
+        ('growth_', current_present - last_values),
+        ('growth_ratio_', growth_ratio),
+    ):
+        out[_ML_FEATURE_SLOTS[prefix][metrics]] = aggregate
+    return out
+
+
 def trainer_construct_ml_features_for_player_season(
     current_season_base_features_row: pd.Series, 
     historical_base_features_df: pd.DataFrame,   
     all_base_metric_names: list                    
 ):
-    instance_ml_features = pd.Series(dtype='float64')
-    for base_fname in all_base_metric_names:
-        instance_ml_features[f'current_{base_fname}'] = current_season_base_features_row.get(base_fname, 0.0)
-    general_pos_current = current_season_base_features_row.get('general_position_identifier')
-    interaction_poly_features_all_pos = [ 'current_inter_goals_x_conversion', 'current_poly_goals_p90_sqrt_sq', 'current_inter_drib_x_prog_carry', 'current_inter_succpass_x_comprate', 'current_poly_successful_passes_p90_sq', 'current_inter_kpsa_x_prog_carry', 'current_inter_tackles_x_rate', 'current_poly_tackles_won_p90_sq', 'current_inter_aerials_x_rate' ]
-    for feat_name in interaction_poly_features_all_pos: instance_ml_features[feat_name] = 0.0
-    if general_pos_current == "Attacker":
-        g_p90s = instance_ml_features.get('current_goals_p90_sqrt_', 0.0); cr_kpi = instance_ml_features.get('current_conversion_rate_excl_xg_kpi', 0.0)
-        instance_ml_features['current_inter_goals_x_conversion'] = g_p90s * cr_kpi; instance_ml_features['current_poly_goals_p90_sqrt_sq'] = g_p90s ** 2
-        drib_p90 = instance_ml_features.get('current_dribbles_completed_p90',0.0); prog_car_p90 = instance_ml_features.get('current_progressive_carries_p90',0.0)
-        instance_ml_features['current_inter_drib_x_prog_carry'] = drib_p90 * prog_car_p90
-    elif general_pos_current == "Midfielder":
-        sp_p90 = instance_ml_features.get('current_successful_passes_p90', 0.0); pc_kpi = instance_ml_features.get('current_pass_completion_rate_kpi', 0.0)
-        instance_ml_features['current_inter_succpass_x_comprate'] = sp_p90 * pc_kpi; instance_ml_features['current_poly_successful_passes_p90_sq'] = sp_p90 ** 2
-        kpsa_p90s = instance_ml_features.get('current_key_passes_goal_assist_p90_sqrt_',0.0); prog_car_p90 = instance_ml_features.get('current_progressive_carries_p90',0.0)
-        instance_ml_features['current_inter_kpsa_x_prog_carry'] = kpsa_p90s * prog_car_p90
-    elif general_pos_current == "Defender":
-        tw_p90 = instance_ml_features.get('current_tackles_won_p90', 0.0); twr_kpi = instance_ml_features.get('current_tackle_win_rate_kpi', 0.0)
-        instance_ml_features['current_inter_tackles_x_rate'] = tw_p90 * twr_kpi; instance_ml_features['current_poly_tackles_won_p90_sq'] = tw_p90 ** 2
-        adw_p90 = instance_ml_features.get('current_aerial_duels_won_p90',0.0); adwr_kpi = instance_ml_features.get('current_aerial_duel_win_rate_kpi',0.0)
-        instance_ml_features['current_inter_aerials_x_rate'] = adw_p90 * adwr_kpi
-    for base_fname_hist in all_base_metric_names:
-        for agg_prefix in ['hist_avg_', 'hist_sum_', 'hist_max_', 'hist_trend_', 'growth_', 'growth_ratio_']:
-            instance_ml_features[f'{agg_prefix}{base_fname_hist}'] = 0.0
-    instance_ml_features['num_hist_seasons'] = 0.0
+    """
+    ML input features of one instance: the base metrics of the season predicted
+    from, position-specific interaction terms and aggregates of the earlier seasons.
+
+    The history is handled as one (seasons x metrics) array, so every
+    hist_*/growth_* column and every least-squares trend slope is computed in
+    a few NumPy operations instead of once per metric.
+
+    Args:
+        current_season_base_features_row: base features of the current season;
+            ``general_position_identifier`` selects the interaction terms
+        historical_base_features_df: base features of the earlier seasons, oldest first
+        all_base_metric_names: base metrics to build features from; features of
+            other metrics are left at 0
+
+    Returns:
+        pd.Series: float64, indexed by get_trainer_all_possible_ml_feature_names()
+    """
+    metric_names = _EXTRACTION_FEATURE_NAMES_ARRAY
+    used = np.isin(metric_names, list(all_base_metric_names))
+
+    current_values = pd.to_numeric(current_season_base_features_row.reindex(metric_names), errors='coerce').to_numpy(dtype='float64')
+    current_values[~(used & np.isin(metric_names, current_season_base_features_row.index))] = 0.0
+
+    history_values = history_seasons = history_metrics = None
     if historical_base_features_df is not None and not historical_base_features_df.empty:
-        df_history = historical_base_features_df.copy()
-        instance_ml_features['num_hist_seasons'] = float(len(df_history))
-        for col_name_base_hist in all_base_metric_names:
-            if col_name_base_hist in df_history.columns:
-                hist_values = pd.to_numeric(df_history[col_name_base_hist], errors='coerce').fillna(0.0)
-                if hist_values.empty or hist_values.isna().all(): continue
-                instance_ml_features[f'hist_avg_{col_name_base_hist}'] = hist_values.mean()
-                instance_ml_features[f'hist_sum_{col_name_base_hist}'] = hist_values.sum()
-                instance_ml_features[f'hist_max_{col_name_base_hist}'] = hist_values.max()
-                last_season_val_hist = hist_values.iloc[-1] if not hist_values.empty else 0.0
-                current_val_for_growth = instance_ml_features.get(f'current_{col_name_base_hist}', 0.0)
-                instance_ml_features[f'growth_{col_name_base_hist}'] = current_val_for_growth - last_season_val_hist
-                instance_ml_features[f'growth_ratio_{col_name_base_hist}'] = safe_division(current_val_for_growth, last_season_val_hist, default=1.0 if current_val_for_growth == last_season_val_hist and current_val_for_growth !=0 else 0.0)
-                if len(df_history) >= 2 and 'season_numeric' in df_history.columns:
-                    x_h_series = pd.to_numeric(df_history['season_numeric'], errors='coerce'); y_h_series = hist_values
-                    valid_trend_mask = x_h_series.notna() & y_h_series.notna()
-                    x_h_valid, y_h_valid = x_h_series[valid_trend_mask].values, y_h_series[valid_trend_mask].values
-                    if len(x_h_valid) >= 2:
-                        try:
-                            slope, _ = np.polyfit(x_h_valid.astype(float), y_h_valid.astype(float), 1)
-                            instance_ml_features[f'hist_trend_{col_name_base_hist}'] = slope
-                        except (np.linalg.LinAlgError, TypeError, ValueError): 
-                            instance_ml_features[f'hist_trend_{col_name_base_hist}'] = 0.0
-    return instance_ml_features
+        df_history = historical_base_features_df
+        history_metrics = used & np.isin(metric_names, df_history.columns)
+        history = df_history.reindex(columns=metric_names)
+        non_numeric = [c for c, dtype in history.dtypes.items() if not pd.api.types.is_numeric_dtype(dtype)]
+        if non_numeric:
+            history[non_numeric] = history[non_numeric].apply(pd.to_numeric, errors='coerce')
+        history_values = history.to_numpy(dtype='float64', na_value=np.nan)
+        history_values[np.isnan(history_values)] = 0.0
+        if 'season_numeric' in df_history.columns:
+            history_seasons = pd.to_numeric(df_history['season_numeric'], errors='coerce').to_numpy(dtype='float64')
+
+    out = _ml_feature_vector(
+        current_values, current_season_base_features_row.get('general_position_identifier'),
+        history_values, history_seasons, history_metrics
+    )
+    return pd.Series(out, index=_ML_FEATURE_NAMES, dtype='float64')
 
 def get_trainer_all_possible_ml_feature_names():
     base_metric_names = get_feature_names_for_extraction()
@@ -970,21 +2065,115 @@ def get_trainer_all_possible_ml_feature_names():
     possible_ml_features.add('num_hist_seasons')
     return sorted(list(possible_ml_features))
 
+_ML_FEATURE_NAMES = get_trainer_all_possible_ml_feature_names()
+_ML_FEATURE_POSITIONS = {name: i for i, name in enumerate(_ML_FEATURE_NAMES)}
+_EXTRACTION_FEATURE_NAMES_ARRAY = np.array(_EXTRACTION_FEATURE_NAMES, dtype=object)
+# Slot of '<prefix><metric>' in _ML_FEATURE_NAMES for every extraction metric, per prefix.
+_ML_FEATURE_SLOTS = {
+    prefix: np.array([_ML_FEATURE_POSITIONS[f'{prefix}{m}'] for m in _EXTRACTION_FEATURE_NAMES])
+    for prefix in ['current_', 'hist_avg_', 'hist_sum_', 'hist_max_', 'hist_trend_', 'growth_', 'growth_ratio_']
+}
+
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    logger_trainer.info("Running trainer.py directly to generate default models with peak performance logic...")
-    v14_output_dir_main = os.path.join(_PROJECT_ROOT, 'ml_models', 'ml_model_files_peak_potential')
-    for pos_group in ["Attacker", "Midfielder", "Defender"]:
-        logger_trainer.info(f"\n--- Generating peak potential model for: {pos_group} ---")
-        success, message = build_and_train_model_from_script_logic(
-            custom_model_id="peak_potential_v2_15_16",
-            position_group_to_train=pos_group,
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Train a peak potential model. The custom model to train is read from the MODEL_ID, POSITION_GROUP, IMPACT_KPIS, TARGET_KPIS and ML_FEATURES environment variables; without MODEL_ID the default models are built.")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('TRAINER_WORKERS', '1')),
+                        help="Worker processes for base feature extraction (default: TRAINER_WORKERS or 1)")
+    parser.add_argument('--engine', choices=TRAINING_ENGINES, default=os.environ.get('TRAINER_ENGINE', 'sklearn'),
+                        help="Hyperparameter search engine (default: TRAINER_ENGINE or sklearn)")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="Recompute Pass 1 and Pass 2 instead of reading or writing the training snapshot")
+    parser.add_argument('--search', choices=SEARCH_MODES, default=os.environ.get('SEARCH_MODE') or None,
+                        help="Hyperparameter search mode (default: SEARCH_MODE, else halving when a time budget is set, else random)")
+    parser.add_argument('--time-budget-seconds', type=float, default=float(os.environ.get('TIME_BUDGET_SECONDS') or 0) or None,
+                        help="Wall-clock budget of the halving search per position model (default: TIME_BUDGET_SECONDS or none)")
+    parser.add_argument('--max-boosting-rounds', type=int, default=int(os.environ.get('MAX_BOOSTING_ROUNDS') or 0) or None,
+                        help="Boosting rounds budget of the halving search per position model (default: MAX_BOOSTING_ROUNDS or none)")
+    args = parser.parse_args()
+    if args.search is None:
+        args.search = "halving" if args.time_budget_seconds or args.max_boosting_rounds else "random"
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stdout
+    )
+
+    try:
+        r2_bucket_name = os.environ['R2_BUCKET_NAME']
+        s3_client = r2_client_from_env()
+    except KeyError as e:
+        logger_trainer.error(f"CRITICAL: Missing R2 environment variable: {e}")
+        sys.exit(1)
+
+    if 'MODEL_ID' not in os.environ:
+        logger_trainer.info("Running trainer.py directly to generate default models with peak performance logic...")
+        results = build_and_train_position_models(
+            s3_client=s3_client,
+            r2_bucket_name=r2_bucket_name,
+            custom_model_id=DEFAULT_MODEL_ID,
+            position_groups=["Attacker", "Midfielder", "Defender"],
             user_kpi_definitions_for_weight_derivation=KPI_DEFINITIONS_FOR_WEIGHT_DERIVATION,
             user_composite_impact_kpis=COMPOSITE_IMPACT_KPIS,
             user_ml_feature_subset=None,
-            base_output_dir_for_custom_model=v14_output_dir_main
+            workers=args.workers,
+            use_snapshot=not args.no_snapshot,
+            engine=args.engine,
+            search=args.search,
+            time_budget_seconds=args.time_budget_seconds,
+            max_boosting_rounds=args.max_boosting_rounds,
+            models_prefix=DEFAULT_MODELS_PREFIX
         )
-        if success: logger_trainer.info(message)
-        else: logger_trainer.error(f"Failed to build model for {pos_group}: {message}")
-    logger_trainer.info("\nDefault peak potential model generation process complete.")
+        for pos_group, (success, message) in results.items():
+            if success: logger_trainer.info(message)
+            else: logger_trainer.error(f"Failed to build model for {pos_group}: {message}")
+        logger_trainer.info("\nDefault peak potential model generation process complete.")
+        sys.exit(0)
+
+    logger_trainer.info("--- Starting Model Training via GitHub Action ---")
+    try:
+        custom_model_id = os.environ['MODEL_ID']
+        position_group = os.environ['POSITION_GROUP']
+
+        impact_kpis_list = json.loads(os.environ['IMPACT_KPIS'])
+        target_kpis_list = json.loads(os.environ['TARGET_KPIS'])
+        ml_features_str = os.environ.get('ML_FEATURES', 'null')
+        ml_features_list = json.loads(ml_features_str) if ml_features_str not in ['null', ''] else None
+
+        logger_trainer.info(f"Model ID: {custom_model_id}")
+        logger_trainer.info(f"Position Group: {position_group}")
+        logger_trainer.info(f"Num Impact KPIs: {len(impact_kpis_list)}")
+        logger_trainer.info(f"Num Target KPIs: {len(target_kpis_list)}")
+        logger_trainer.info(f"Num ML Features: {'Default' if ml_features_list is None else len(ml_features_list)}")
+        logger_trainer.info(f"Feature extraction workers: {args.workers}")
+        logger_trainer.info(f"Hyperparameter search: {args.search} (time budget: {args.time_budget_seconds or 'none'})")
+    except (KeyError, json.JSONDecodeError) as e:
+        logger_trainer.error(f"CRITICAL: Failed to read or parse environment variables: {e}")
+        sys.exit(1)
+
+    success, message = build_and_train_model_from_script_logic(
+        s3_client=s3_client,
+        r2_bucket_name=r2_bucket_name,
+        custom_model_id=custom_model_id,
+        position_group_to_train=position_group,
+        user_composite_impact_kpis={position_group: impact_kpis_list},
+        user_kpi_definitions_for_weight_derivation={position_group: target_kpis_list},
+        user_ml_feature_subset=ml_features_list,
+        base_output_dir_for_custom_model='',
+        workers=args.workers,
+        use_snapshot=not args.no_snapshot,
+        engine=args.engine,
+        search=args.search,
+        time_budget_seconds=args.time_budget_seconds,
+        max_boosting_rounds=args.max_boosting_rounds
+    )
+
+    if success:
+        logger_trainer.info(f"--- Training successful for model {custom_model_id}: {message} ---")
+        sys.exit(0)
+    else:
+        logger_trainer.error(f"--- Training failed for model {custom_model_id}: {message} ---")
+        sys.exit(1)
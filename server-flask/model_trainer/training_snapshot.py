@@ -0,0 +1,135 @@
+"""
+Versioned snapshots of the trainer's position-independent tables.
+
+Pass 1 (base features of every player-season) and Pass 2 (ML input features
+of every U21 instance) only depend on the data under ``data/`` and on the
+feature code; custom models differ in their KPI weights and feature subset,
+which are applied afterwards. The trainer stores both tables under
+``ml_models/training_snapshots/{fingerprint}/`` where the fingerprint hashes
+the ETag of every object under ``data/``, the feature code versions
+(``FEATURE_CODE_VERSION`` and ``ML_FEATURE_CODE_VERSION`` of trainer_v2) and
+the default KPI definitions, so a change to the inputs or to the feature code
+selects a new snapshot while edits elsewhere in the trainer keep reusing it.
+
+The manifest is written last and read first, so a build that died halfway
+through an upload never leaves a snapshot that looks complete.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+
+from model_trainer.event_store import event_frame_to_parquet_bytes, is_missing_key_error, parquet_available
+from model_trainer.trainer_v2 import (
+    COMPOSITE_IMPACT_KPIS,
+    FEATURE_CODE_VERSION,
+    KPI_DEFINITIONS_FOR_WEIGHT_DERIVATION,
+    ML_FEATURE_CODE_VERSION
+)
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+logger_training_snapshot = logging.getLogger(__name__ + "_training_snapshot")
+
+TRAINING_SNAPSHOT_PREFIX = "ml_models/training_snapshots/"
+TRAINING_INPUT_PREFIX = "data/"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_TABLES = ("base_features", "ml_features")
+
+
+def snapshot_key(fingerprint, name):
+    return f"{TRAINING_SNAPSHOT_PREFIX}{fingerprint}/{name}"
+
+
+def training_code_version():
+    """Versions of the code and definitions the snapshot tables are computed with."""
+    return {
+        "features": FEATURE_CODE_VERSION,
+        "ml_features": ML_FEATURE_CODE_VERSION,
+        "kpi_definitions": KPI_DEFINITIONS_FOR_WEIGHT_DERIVATION,
+        "impact_kpis": COMPOSITE_IMPACT_KPIS,
+    }
+
+
+def list_training_input_etags(s3_client, bucket):
+    """Return {key: etag} for every object under data/."""
+    etags = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=TRAINING_INPUT_PREFIX):
+        for obj in page.get('Contents', []):
+            etags[obj['Key']] = obj.get('ETag')
+    return etags
+
+
+def training_inputs_fingerprint(s3_client, bucket):
+    """
+    Fingerprint of the data and code the training tables are computed from.
+
+    Returns:
+        str: 24 hex characters
+    """
+    payload = json.dumps({
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "code": training_code_version(),
+        "inputs": sorted(list_training_input_etags(s3_client, bucket).items()),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+def load_training_snapshot(s3_client, bucket, fingerprint):
+    """
+    Read the snapshot stored for ``fingerprint``.
+
+    Returns:
+        dict: table name -> DataFrame, or None when there is no complete
+            snapshot (or pyarrow is missing)
+    """
+    if pq is None:
+        return None
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=snapshot_key(fingerprint, "manifest.json"))
+        manifest = json.loads(response['Body'].read().decode('utf-8'))
+    except Exception as e:
+        if is_missing_key_error(e):
+            return None
+        raise
+
+    tables = {}
+    for name in SNAPSHOT_TABLES:
+        response = s3_client.get_object(Bucket=bucket, Key=snapshot_key(fingerprint, f"{name}.parquet"))
+        tables[name] = pq.read_table(BytesIO(response['Body'].read())).to_pandas()
+        expected_rows = manifest.get("tables", {}).get(name, {}).get("rows")
+        if expected_rows is not None and len(tables[name]) != expected_rows:
+            logger_training_snapshot.warning(f"Training snapshot {fingerprint}: {name} has {len(tables[name])} rows, manifest says {expected_rows}. Ignoring it.")
+            return None
+    return tables
+
+
+def save_training_snapshot(s3_client, bucket, fingerprint, tables):
+    """
+    Store ``tables`` (table name -> DataFrame, see SNAPSHOT_TABLES) as the
+    snapshot for ``fingerprint``.
+
+    Returns:
+        bool: False when pyarrow is missing and nothing was written
+    """
+    if not parquet_available():
+        return False
+    for name in SNAPSHOT_TABLES:
+        s3_client.put_object(Bucket=bucket, Key=snapshot_key(fingerprint, f"{name}.parquet"), Body=event_frame_to_parquet_bytes(tables[name]))
+    manifest = {
+        "fingerprint": fingerprint,
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "code_version": {k: training_code_version()[k] for k in ("features", "ml_features")},
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "tables": {name: {"rows": len(tables[name]), "columns": len(tables[name].columns)} for name in SNAPSHOT_TABLES},
+    }
+    s3_client.put_object(Bucket=bucket, Key=snapshot_key(fingerprint, "manifest.json"), Body=json.dumps(manifest, indent=2).encode('utf-8'))
+    return True
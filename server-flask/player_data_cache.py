@@ -0,0 +1,159 @@
+"""
+In-process cache for parsed player-season event DataFrames.
+
+The visualization routes of one player page all ask for the same
+(player_id, season) within a few seconds. This cache keeps the parsed
+DataFrames in memory, bounded by their total size in bytes, so the R2
+download and the parsing are paid once per player-season.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def dataframe_nbytes(df):
+    """Return the in-memory size of a DataFrame, including object columns."""
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+class PlayerDataCache:
+    """
+    Thread-safe LRU cache of DataFrames keyed by (player_id, season).
+
+    Entries are evicted least-recently-used first once the summed size of the
+    cached DataFrames exceeds ``max_bytes``. Concurrent misses on the same key
+    wait for a single load instead of loading the file several times.
+
+    Cached DataFrames are shared between requests and must be treated as
+    read-only by callers (filter with ``.copy()`` before mutating).
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(player_id, season):
+        return (str(player_id), str(season))
+
+    def get(self, player_id, season):
+        key = self.make_key(player_id, season)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, player_id, season, df):
+        if df is None:
+            return
+        key = self.make_key(player_id, season)
+        size = dataframe_nbytes(df)
+        if size > self.max_bytes:
+            logger.info(f"Not caching {key}: {size} bytes exceeds cache capacity of {self.max_bytes} bytes.")
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (df, size)
+            self._total_bytes += size
+            self._evict()
+
+    def get_or_load(self, player_id, season, loader):
+        """
+        Return the cached DataFrame for (player_id, season), calling ``loader()``
+        on a miss. Only one thread runs the loader for a given key; the others
+        wait for its result. ``None`` results are returned but not cached.
+        """
+        key = self.make_key(player_id, season)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = threading.Event()
+                    self._inflight[key] = pending
+                    break
+            pending.wait()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+            # The loader failed or its result was not cached: load it ourselves.
+            return loader()
+
+        try:
+            df = loader()
+            self.put(player_id, season, df)
+            return df
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set()
+
+    def invalidate(self, player_id=None, season=None):
+        """
+        Drop cached entries. With no arguments the whole cache is cleared;
+        otherwise only the entries matching the given player_id and/or season.
+
+        Returns:
+            int: number of entries removed
+        """
+        with self._lock:
+            if player_id is None and season is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._total_bytes = 0
+                return removed
+            keys = [
+                k for k in self._entries
+                if (player_id is None or k[0] == str(player_id)) and (season is None or k[1] == str(season))
+            ]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
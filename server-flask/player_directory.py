@@ -0,0 +1,87 @@
+"""
+In-memory indexes over ``data/player_index.json``.
+
+The player index is a mapping of player name -> record (older exports are a
+list of records with a ``name`` field). PlayerDirectory builds the
+``player_id -> record``, ``name -> record`` and ``season -> [player_ids]``
+lookups once so routes do not scan the whole index on every request.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerDirectory:
+    """
+    Read-only indexes over the player index.
+
+    Player ids are compared as strings. When the same id appears more than
+    once, the first record in index order wins.
+    """
+
+    def __init__(self, player_index=None):
+        self._entries = []
+        self._by_id = {}
+        self._by_name = {}
+        self._by_season = {}
+        self._load(player_index or {})
+
+    def _load(self, player_index):
+        if isinstance(player_index, dict):
+            items = player_index.items()
+        elif isinstance(player_index, list):
+            items = ((p.get("name", str(p.get("player_id"))), p) for p in player_index if isinstance(p, dict))
+        else:
+            logger.warning(f"Unsupported player index type: {type(player_index).__name__}")
+            items = []
+
+        for name, record in items:
+            if not isinstance(record, dict) or "player_id" not in record:
+                continue
+            player_id = str(record["player_id"])
+            self._entries.append((name, record))
+            self._by_id.setdefault(player_id, (name, record))
+            self._by_name.setdefault(name, record)
+            for season in record.get("seasons", []):
+                season_ids = self._by_season.setdefault(season, [])
+                if not season_ids or season_ids[-1] != player_id:
+                    season_ids.append(player_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, player_id):
+        """Record for ``player_id``, or None."""
+        entry = self._by_id.get(str(player_id))
+        return entry[1] if entry else None
+
+    def get_name(self, player_id, default=None):
+        entry = self._by_id.get(str(player_id))
+        return entry[0] if entry else default
+
+    def get_by_name(self, name):
+        return self._by_name.get(name)
+
+    def player_ids_for_season(self, season):
+        return list(self._by_season.get(season, []))
+
+    def seasons(self):
+        return sorted(self._by_season)
+
+    def entries(self, sort_by_name=False):
+        """List of (name, record) pairs in index order, or sorted by name."""
+        return sorted(self._entries, key=lambda e: e[0]) if sort_by_name else list(self._entries)
+
+    def players_payload(self):
+        """Body of the ``/players`` response: one summary per player, sorted by name."""
+        return [
+            {
+                "name": name,
+                "player_id": record["player_id"],
+                "seasons": record.get("seasons", []),
+                "dob": record.get("dob", ""),
+                "position": record.get("position", "")
+            }
+            for name, record in self.entries(sort_by_name=True)
+        ]
@@ -0,0 +1,119 @@
+"""
+Shared, in-memory view of ``data/player_season_minutes_with_names.csv``.
+
+The minutes file is downloaded once and indexed by (player_id, season). It is
+revalidated against its R2 ETag at most every ``refresh_interval_seconds`` and
+only re-downloaded when the object actually changed.
+"""
+
+import logging
+import threading
+import time
+from io import BytesIO
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PLAYER_MINUTES_KEY = "data/player_season_minutes_with_names.csv"
+
+
+class PlayerMinutesLookup:
+    """Immutable (player_id, season) -> total minutes played index."""
+
+    def __init__(self, minutes_df):
+        minutes_df = minutes_df.copy()
+        minutes_df['player_id_str'] = minutes_df['player_id'].astype(str)
+        minutes_df['season_name_std'] = minutes_df['season_name'].astype(str).str.replace('/', '_', regex=False)
+        # Keep the first row of duplicated keys, as the previous per-request filters did.
+        minutes_df = minutes_df.drop_duplicates(subset=['player_id_str', 'season_name_std'], keep='first')
+        self._minutes = pd.Series(
+            pd.to_numeric(minutes_df['total_minutes_played'], errors='coerce').to_numpy(dtype='float64'),
+            index=pd.MultiIndex.from_arrays([minutes_df['player_id_str'], minutes_df['season_name_std']])
+        )
+        self._by_key = dict(zip(self._minutes.index, self._minutes.to_numpy()))
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def get(self, player_id, season, default=0.0):
+        return self._by_key.get((str(player_id), str(season)), default)
+
+    def get_many(self, player_ids, seasons, default=0.0):
+        """
+        Vectorized lookup for aligned sequences of player ids and seasons.
+
+        Returns:
+            np.ndarray: float64 minutes, ``default`` where the pair is not listed
+        """
+        keys = pd.MultiIndex.from_arrays([pd.Index(player_ids).astype(str), pd.Index(seasons).astype(str)])
+        values = self._minutes.reindex(keys).to_numpy(dtype='float64')
+        missing = ~keys.isin(self._minutes.index)
+        if missing.any():
+            values[missing] = default
+        return values
+
+    def as_dict(self):
+        return dict(self._by_key)
+
+
+class PlayerMinutesService:
+    """
+    Loads the minutes file lazily and keeps it fresh.
+
+    ``lookup()`` returns the current PlayerMinutesLookup. If the file cannot be
+    loaded and nothing was loaded before, the error is raised to the caller;
+    after a successful load, refresh failures keep serving the previous copy.
+    """
+
+    def __init__(self, s3_client, bucket, key=PLAYER_MINUTES_KEY, refresh_interval_seconds=300):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._lookup = None
+        self._etag = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def lookup(self):
+        lookup = self._lookup
+        if lookup is not None and time.monotonic() - self._checked_at < self.refresh_interval_seconds:
+            return lookup
+        with self._lock:
+            if self._lookup is not None and time.monotonic() - self._checked_at < self.refresh_interval_seconds:
+                return self._lookup
+            try:
+                self._refresh()
+            except Exception as e:
+                if self._lookup is None:
+                    raise
+                logger.warning(f"Could not revalidate {self.key}, keeping the loaded copy: {e}")
+            self._checked_at = time.monotonic()
+            return self._lookup
+
+    def get(self, player_id, season, default=0.0):
+        return self.lookup().get(player_id, season, default)
+
+    def get_many(self, player_ids, seasons, default=0.0):
+        return self.lookup().get_many(player_ids, seasons, default)
+
+    def _refresh(self):
+        if self.s3_client is None:
+            raise RuntimeError("S3 client not initialized.")
+        if self._lookup is not None:
+            etag = self.s3_client.head_object(Bucket=self.bucket, Key=self.key).get('ETag')
+            if etag and etag == self._etag:
+                return
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        lookup = PlayerMinutesLookup(pd.read_csv(BytesIO(response['Body'].read())))
+        self._lookup = lookup
+        self._etag = response.get('ETag')
+        logger.info(f"Loaded {self.key}: {len(lookup)} player-seasons (ETag {self._etag}).")
+
+    def stats(self):
+        return {
+            "loaded": self._lookup is not None,
+            "player_seasons": len(self._lookup) if self._lookup is not None else 0,
+            "etag": self._etag,
+        }
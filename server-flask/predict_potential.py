@@ -5,6 +5,8 @@ import json
 from datetime import datetime
 import numpy as np
 import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,8 +15,11 @@ try:
     from model_trainer.trainer_v2 import (
         get_age_at_fixed_point_in_season,
         get_general_position,
-        extract_season_features,
-        trainer_construct_ml_features_for_player_season,
+        get_feature_names_for_extraction,
+        extract_season_features_batch,
+        get_trainer_all_possible_ml_feature_names,
+        ml_feature_matrix,
+        stack_player_season_events,
         safe_division
     )
 except ImportError:
@@ -28,12 +33,76 @@ _MODELS_DIR = os.path.join(_PROJECT_ROOT, 'ml_models', 'ml_model_files_peak_pote
 
 MODEL_ID = "peak_potential_v2_15_16"
 MAX_AGE_FOR_PREDICTION = 35
+EXTRACTION_BATCH_SIZE = 200
 
-def generate_predictions(model_id: str, target_season: Optional[str] = None, num_players_to_display: int = 30):
+def _extract_base_feature_block(batch_keys, ages, num_90s_played):
+    event_frames = []
+    for player_id, season in batch_keys:
+        event_file_path = os.path.join(_DATA_DIR, season, "players", f"{player_id}_{season}.csv")
+        try:
+            events_df = pd.read_csv(event_file_path, low_memory=False)
+        except FileNotFoundError:
+            events_df = pd.DataFrame()
+        event_frames.append((player_id, season, events_df))
+
+    events_df, source_columns = stack_player_season_events(event_frames)
+    player_seasons = pd.DataFrame({
+        'player_id_identifier': [k[0] for k in batch_keys],
+        'target_season_identifier': [k[1] for k in batch_keys],
+        'age': ages,
+        'season_numeric': [int(k[1].split('_')[0]) for k in batch_keys],
+        'num_90s_played': num_90s_played,
+    })
+    return extract_season_features_batch(events_df, player_seasons, source_columns).to_numpy(dtype='float64')
+
+
+def extract_base_features_for_player_seasons(player_season_ages, minutes_df_dict, workers=1):
+    """
+    Extreu les features base de moltes temporades de jugador alhora.
+
+    Amb ``workers`` > 1 els lots es reparteixen entre processos; cada procés
+    llegeix i processa els seus lots i només retorna la matriu de features, i
+    els resultats s'ajunten en l'ordre dels lots (mateix resultat que en sèrie).
+
+    Args:
+        player_season_ages: dict (player_id, season) -> edat a la temporada
+        minutes_df_dict: dict (player_id, season) -> minuts jugats
+        workers: nombre de processos; 1 ho fa tot en aquest procés
+
+    Returns:
+        DataFrame amb una fila per temporada de jugador, en l'ordre de
+        ``player_season_ages``: les features base i els identificadors
+        ``player_id_identifier`` i ``target_season_identifier``
+    """
+    keys = list(player_season_ages)
+    batches = [keys[start:start + EXTRACTION_BATCH_SIZE] for start in range(0, len(keys), EXTRACTION_BATCH_SIZE)]
+    batch_args = (
+        batches,
+        [[player_season_ages[k] for k in batch_keys] for batch_keys in batches],
+        [[safe_division(minutes_df_dict.get(k, 0.0), 90.0) for k in batch_keys] for batch_keys in batches],
+    )
+
+    workers = max(1, min(workers or 1, len(batches)))
+    if workers > 1:
+        logging.info(f"Extraient {len(batches)} lots de features base amb {workers} processos.")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            feature_blocks = list(executor.map(_extract_base_feature_block, *batch_args))
+    else:
+        feature_blocks = list(map(_extract_base_feature_block, *batch_args))
+    feature_names = get_feature_names_for_extraction()
+    values = np.vstack(feature_blocks) if feature_blocks else np.empty((0, len(feature_names)))
+    base_features = pd.DataFrame(values, columns=feature_names)
+    base_features['player_id_identifier'] = [k[0] for k in keys]
+    base_features['target_season_identifier'] = [k[1] for k in keys]
+    return base_features
+
+
+def generate_predictions(model_id: str, target_season: Optional[str] = None, num_players_to_display: int = 30, workers: int = 1):
     """
     Funció principal que carrega models i genera prediccions.
     - Si target_season és un string (ex: "2015_2016"), prediu només per a aquesta temporada.
     - Si target_season és None, prediu per a totes les temporades.
+    - workers: processos per a l'extracció de features base.
     """
     
     if target_season:
@@ -53,8 +122,10 @@ def generate_predictions(model_id: str, target_season: Optional[str] = None, num
         logging.error(f"Error carregant fitxers de dades essencials: {e}")
         return
 
-    all_predictions = []
     positions = ["Attacker", "Midfielder", "Defender"]
+    position_models = {}
+    candidates_by_position = {}
+    player_items = player_index.items() if isinstance(player_index, dict) else [(p.get("name", ""), p) for p in player_index]
 
     for position in positions:
         logging.info(f"\n{'='*20} Processant posició: {position} {'='*20}")
@@ -90,8 +161,6 @@ def generate_predictions(model_id: str, target_season: Optional[str] = None, num
             continue
 
         candidate_instances = []
-        player_items = player_index.items() if isinstance(player_index, dict) else [(p.get("name", ""), p) for p in player_index]
-
         for player_name_key, p_info in player_items:
             general_pos = get_general_position(p_info.get("position"))
             if general_pos != position:
@@ -117,56 +186,44 @@ def generate_predictions(model_id: str, target_season: Optional[str] = None, num
         if not candidate_instances:
             logging.info(f"No s'han trobat instàncies candidates (jugador-temporada) per a '{position}'.")
             continue
-            
-        logging.info(f"Trobades {len(candidate_instances)} instàncies candidates per a '{position}'. Generant features...")
+        logging.info(f"Trobades {len(candidate_instances)} instàncies candidates per a '{position}'.")
+        position_models[position] = (model, scaler, features_for_model)
+        candidates_by_position[position] = candidate_instances
 
-        for i, candidate in enumerate(candidate_instances):
-            if (i + 1) % 100 == 0:
-                logging.info(f"  Processant instància {i+1}/{len(candidate_instances)}...")
-            
-            player_id = candidate['id']
-            season_to_predict_on = candidate['season_for_prediction']
-            
-            season_numeric_current = int(season_to_predict_on.split('_')[0])
-            minutes_current = minutes_df_dict.get((player_id, season_to_predict_on), 0.0)
-            num_90s_current = safe_division(minutes_current, 90.0)
-            event_file_path_current = os.path.join(_DATA_DIR, season_to_predict_on, "players", f"{player_id}_{season_to_predict_on}.csv")
-            try:
-                events_df_current = pd.read_csv(event_file_path_current, low_memory=False)
-            except FileNotFoundError:
-                events_df_current = pd.DataFrame()
-            base_features_current = extract_season_features(events_df_current, candidate['age_in_season'], season_numeric_current, num_90s_current)
-            base_features_current['general_position_identifier'] = candidate['position']
-            
-            historical_seasons = [s for s in candidate['all_seasons_history'] if s < season_to_predict_on]
-            historical_features_list = []
-            if historical_seasons:
-                for hist_season in historical_seasons:
-                    age_hist = get_age_at_fixed_point_in_season(candidate['dob'], hist_season)
-                    if age_hist is None: continue
-                    season_numeric_hist = int(hist_season.split('_')[0])
-                    minutes_hist = minutes_df_dict.get((player_id, hist_season), 0.0)
-                    num_90s_hist = safe_division(minutes_hist, 90.0)
-                    event_file_path_hist = os.path.join(_DATA_DIR, hist_season, "players", f"{player_id}_{hist_season}.csv")
-                    try: events_df_hist = pd.read_csv(event_file_path_hist, low_memory=False)
-                    except FileNotFoundError: events_df_hist = pd.DataFrame()
-                    base_features_hist = extract_season_features(events_df_hist, age_hist, season_numeric_hist, num_90s_hist)
-                    historical_features_list.append(base_features_hist)
-            historical_df = pd.DataFrame(historical_features_list) if historical_features_list else pd.DataFrame()
-            
-            instance_ml_features = trainer_construct_ml_features_for_player_season(
-                current_season_base_features_row=base_features_current,
-                historical_base_features_df=historical_df,
-                all_base_metric_names=base_features_current.index.tolist()
-            )
-            
-            X = pd.DataFrame([instance_ml_features]).fillna(0.0)
-            X = X[features_for_model]
-            X_scaled = scaler.transform(X)
-            
-            prediction = model.predict(X_scaled)[0]
-            prediction_clipped = np.clip(prediction, 0, 200)
+    # Cada temporada de jugador (predita o historial) s'extreu una sola vegada per a totes les posicions i candidats.
+    player_season_ages = {}
+    player_positions = {}
+    for position, candidate_instances in candidates_by_position.items():
+        for candidate in candidate_instances:
+            player_positions.setdefault(candidate['id'], position)
+            player_season_ages.setdefault((candidate['id'], candidate['season_for_prediction']), candidate['age_in_season'])
+            for hist_season in candidate['all_seasons_history']:
+                if hist_season >= candidate['season_for_prediction']: continue
+                age_hist = get_age_at_fixed_point_in_season(candidate['dob'], hist_season)
+                if age_hist is not None:
+                    player_season_ages.setdefault((candidate['id'], hist_season), age_hist)
+    if not player_season_ages:
+        logging.error("No s'ha pogut realitzar cap predicció.")
+        return
+
+    logging.info(f"Generant features base per a {len(player_season_ages)} temporades de jugador...")
+    base_features_df = extract_base_features_for_player_seasons(player_season_ages, minutes_df_dict, workers=workers)
+    base_features_df['general_position_identifier'] = base_features_df['player_id_identifier'].map(player_positions)
+    row_by_key = {key: row for row, key in enumerate(player_season_ages)}
+    logging.info(f"Features base extretes per a {len(base_features_df)} temporades de jugador.")
 
+    all_predictions = []
+    ml_feature_names = get_trainer_all_possible_ml_feature_names()
+    for position, candidate_instances in candidates_by_position.items():
+        model, scaler, features_for_model = position_models[position]
+        instances_df = base_features_df.iloc[[row_by_key[(c['id'], c['season_for_prediction'])] for c in candidate_instances]]
+        # L'historial d'una instància són les temporades anteriors del mateix jugador, com a trainer_construct_ml_features_for_player_season.
+        X = pd.DataFrame(ml_feature_matrix(base_features_df, instances_df), columns=ml_feature_names).fillna(0.0)
+        X_scaled = scaler.transform(X[features_for_model])
+        predictions = np.clip(np.asarray(model.predict(X_scaled), dtype='float64'), 0, 200)
+        logging.info(f"Prediccions calculades per a {len(candidate_instances)} instàncies de '{position}'.")
+
+        for candidate, prediction_clipped in zip(candidate_instances, predictions):
             candidate['predicted_potential'] = prediction_clipped
             all_predictions.append(candidate)
 
@@ -187,19 +244,25 @@ def generate_predictions(model_id: str, target_season: Optional[str] = None, num
     logging.info(f"\n{'='*25} RESUM DELS RESULTATS {'='*25}")
     print(f"Top {num_players_to_display} prediccions (de {len(final_df_sorted)} totals):\n")
     
-    output_df = final_df_sorted.head(num_players_to_display)
+    output_df = final_df_sorted.head(num_players_to_display).copy()
     output_df['predicted_potential'] = output_df['predicted_potential'].round(2)
     output_df.index = output_df.index + 1
     
     print(output_df.to_string())
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera prediccions de potencial amb el model per defecte.")
+    parser.add_argument('--workers', type=int, default=1, help="Processos per a l'extracció de features base")
+    args = parser.parse_args()
+
     generate_predictions(
         model_id=MODEL_ID,
-        target_season="2015_2016"
+        target_season="2015_2016",
+        workers=args.workers
     )
 
     generate_predictions(
         model_id=MODEL_ID,
-        target_season=None 
+        target_season=None,
+        workers=args.workers
     )
\ No newline at end of file
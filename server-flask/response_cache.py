@@ -0,0 +1,93 @@
+"""
+Pre-serialized, pre-compressed JSON responses for large and rarely changing
+payloads such as ``/players``.
+
+The body is serialized once, compressed once per supported encoding and served
+with a strong ETag, so repeated requests cost a header comparison (304) or a
+buffer copy instead of a ``jsonify`` of the whole payload.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available.
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_if_none_match(header_value):
+    if not header_value:
+        return set()
+    return {tag.strip().removeprefix('W/') for tag in header_value.split(',')}
+
+
+def _parse_accept_encoding(header_value):
+    """Return {coding: q-value} from an Accept-Encoding header; an invalid q-value counts as 0."""
+    accepted = {}
+    for part in (header_value or '').split(','):
+        coding, *params = [p.strip() for p in part.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+class PrecompressedJSON:
+    """
+    Immutable JSON payload with identity, gzip and (when available) brotli
+    encodings and one strong ETag per encoding.
+    """
+
+    def __init__(self, payload, cache_control="no-cache"):
+        self.cache_control = cache_control
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encodings = {None: (self.body, f'"{digest}"')}
+        self.encodings['gzip'] = (gzip.compress(self.body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+        if brotli is not None:
+            self.encodings['br'] = (brotli.compress(self.body), f'"{digest}-br"')
+
+    @property
+    def etags(self):
+        return {etag for _, etag in self.encodings.values()}
+
+    def _select_encoding(self, accept_encoding):
+        """Encoding with the highest q-value the client accepts (br over gzip on ties), None for identity."""
+        accepted = _parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0.0
+        for encoding in ('br', 'gzip'):
+            q = accepted.get(encoding, accepted.get('*', 0.0))
+            if encoding in self.encodings and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def make_response(self, request):
+        """Build the response for ``request``, answering 304 when the client copy is current."""
+        encoding = self._select_encoding(request.headers.get('Accept-Encoding'))
+        body, etag = self.encodings[encoding]
+
+        if _parse_if_none_match(request.headers.get('If-None-Match')) & (self.etags | {'*'}):
+            response = Response(status=304)
+        else:
+            response = Response(body, status=200, mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = self.cache_control
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,269 @@
+"""
+extract_season_features as it was before the single-pass rewrite, kept
+verbatim as the reference the current implementation is tested against.
+"""
+
+import numpy as np
+import pandas as pd
+
+from model_trainer.trainer_v2 import MIN_90S_PLAYED_FOR_P90_STATS, get_feature_names_for_extraction, safe_division
+
+
+def baseline_extract_season_features(event_df, age_in_season, season_str_numeric, num_90s_played):
+    s = pd.Series(dtype='float64')
+    s['age'] = float(age_in_season) if age_in_season is not None else 0.0
+    s['season_numeric'] = float(season_str_numeric) if season_str_numeric is not None else 0.0
+    s['num_90s_played'] = float(num_90s_played) if pd.notna(num_90s_played) else 0.0
+    s['matches_played_events'] = float(event_df['match_id'].nunique()) if 'match_id' in event_df.columns and not event_df.empty else 0.0
+    
+    use_p90 = s['num_90s_played'] >= MIN_90S_PLAYED_FOR_P90_STATS
+    
+    all_expected_features = get_feature_names_for_extraction()
+    for fname in all_expected_features:
+        if fname not in ['age', 'season_numeric', 'num_90s_played', 'matches_played_events']:
+             s[fname] = 0.0 # Initialize all to 0.0
+
+    if event_df.empty or len(event_df) == 0:
+        if 'turnovers_p90_inv_kpi_base' in s.index: s['turnovers_p90_inv_kpi_base'] = 999.0
+        # Initialize sqrt kpis to 0 if df is empty
+        sqrt_kpis_to_init = [k for k in all_expected_features if k.endswith("_sqrt_")]
+        for skpi in sqrt_kpis_to_init:
+            s[skpi] = 0.0
+        return s.reindex(all_expected_features).fillna(0.0)
+
+    # --- Canonical Event Counts ---
+    type_counts = event_df['type'].value_counts() if 'type' in event_df.columns else pd.Series(dtype='int64')
+    
+    event_name_map = {
+        'passes_total': 'Pass', 'shots_total': 'Shot', 'dribbles_attempted': 'Dribble', 
+        'duels_total': 'Duel', 'interceptions': 'Interception', 'clearances': 'Clearance',
+        'fouls_committed': 'Foul Committed', 'fouls_won': 'Foul Won', 
+        'ball_recoveries': 'Ball Recovery', 'miscontrols': 'Miscontrol', 
+        'dispossessed_events': 'Dispossessed', 'pressures': 'Pressure', 
+        'carries_total': 'Carry', 'blocks_total': 'Block', 
+        'fifty_fifties_total': '50/50', 
+        'shields_total': 'Shield', 'errors_leading_to_shot_or_goal': 'Error', 
+        'bad_behaviours_total': 'Bad Behaviour'
+    }
+    for canonical_name, event_type_str in event_name_map.items():
+        if canonical_name in s.index:
+            if canonical_name == 'errors_leading_to_shot_or_goal': 
+                 error_df = event_df[event_df['type'] == 'Error'] if 'type' in event_df.columns else pd.DataFrame()
+                 s[canonical_name] = float(error_df.get('leads_to_shot', pd.Series(dtype=bool)).fillna(False).astype(bool).sum())
+            elif canonical_name == 'fifty_fifties_total':
+                count_from_type = float(type_counts.get('50/50', 0))
+                
+                count_from_duel_type = 0
+                if 'Duel' in type_counts and 'duel_type_name' in event_df.columns: #
+                    duel_df_temp = event_df[event_df['type'] == 'Duel']
+                    count_from_duel_type = float((duel_df_temp['duel_type_name'].astype(str) == '50/50').sum())
+
+                s[canonical_name] = count_from_type if count_from_type > 0 else count_from_duel_type
+
+            else:
+                s[canonical_name] = float(type_counts.get(event_type_str, 0))
+
+    # --- Other Specific Aggregates & KPIs ---
+
+    # Player caused ball out
+    if 'player_caused_ball_out' in s.index and 'out' in event_df.columns:
+        s['player_caused_ball_out'] = float(event_df['out'].fillna(False).astype(bool).sum())
+
+    # Shots
+    shots_df = event_df[event_df['type'] == 'Shot'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not shots_df.empty:
+        shot_outcome_series = shots_df.get('shot_outcome_name', pd.Series(dtype=str)) 
+        shot_type_series = shots_df.get('shot_type_name', pd.Series(dtype=str))
+        shots_df = event_df[event_df['type'] == 'Shot'].copy() if 'type' in event_df.columns else pd.DataFrame()
+        if not shots_df.empty:
+            shot_outcome_series = shots_df.get('shot_outcome_name', pd.Series(dtype=str))
+            if shot_outcome_series.empty and 'shot_outcome' in shots_df.columns:
+                shot_outcome_series = shots_df['shot_outcome'].apply(lambda x: x.get('name') if isinstance(x, dict) else x)
+            if 'goals' in s.index:
+                s['goals'] = float((shot_outcome_series == 'Goal').sum())
+        
+        if 'shots_on_target' in s.index: s['shots_on_target'] = float(shot_outcome_series.isin(['Saved', 'Goal', 'Post', 'Saved To Post', 'Saved Off Target']).sum())
+        if 'sum_xg' in s.index: s['sum_xg'] = pd.to_numeric(shots_df.get('shot_statsbomb_xg', shots_df.get('statsbomb_xg')), errors='coerce').sum() # Check both common XG col names
+        if 'shots_first_time' in s.index: s['shots_first_time'] = (shots_df.get('shot_first_time', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
+        if 'shots_open_goal' in s.index: s['shots_open_goal'] = (shots_df.get('shot_open_goal', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
+        if 'shots_deflected' in s.index: s['shots_deflected'] = ((shots_df.get('deflected', pd.Series(dtype=bool)).fillna(False).astype(bool)) | (shot_outcome_series == 'Deflected')).sum()
+        if 'shots_aerial_won' in s.index: s['shots_aerial_won'] = (shots_df.get('shot_aerial_won', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
+        if 'shots_blocked_by_opponent' in s.index: s['shots_blocked_by_opponent'] = float((shot_outcome_series == 'Blocked').sum())
+        if 'shots_hit_post' in s.index: s['shots_hit_post'] = float((shot_outcome_series == 'Post').sum())
+        if 'shots_off_target' in s.index: s['shots_off_target'] = float((shot_outcome_series.isin(['Off T', 'Wayward'])).sum())
+        if 'shots_penalty' in s.index: s['shots_penalty'] = float((shot_type_series == 'Penalty').sum())
+        if 'shots_freekick' in s.index: s['shots_freekick'] = float((shot_type_series == 'Free Kick').sum())
+
+    if 'conversion_rate_excl_xg_kpi' in s.index: s['conversion_rate_excl_xg_kpi'] = safe_division(s.get('goals',0.0), s.get('shots_total',0.0)) * 100
+    if 'xg_performance' in s.index: s['xg_performance'] = s.get('goals',0.0) - s.get('sum_xg',0.0)
+
+    # Passes
+    pass_df = event_df[event_df['type'] == 'Pass'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not pass_df.empty:
+        pass_outcome_series = pass_df.get('pass_outcome_name', pd.Series(dtype=str))
+        pass_height_series = pass_df.get('pass_height_name', pd.Series(dtype=str))
+
+        if 'successful_passes' in s.index:
+            if not pass_outcome_series.empty:
+                successful_mask = pass_outcome_series.isna() | (pass_outcome_series == 'nan') | (pass_outcome_series == '')
+                s['successful_passes'] = float(successful_mask.sum())
+            else: s['successful_passes'] = 0.0
+        
+        if 'avg_pass_length' in s.index: s['avg_pass_length'] = pd.to_numeric(pass_df.get('pass_length'), errors='coerce').mean()
+        if 'goal_assists' in s.index: s['goal_assists'] = float((pass_df.get('pass_goal_assist', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'shot_assists' in s.index: s['shot_assists'] = float((pass_df.get('pass_shot_assist', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'crosses_total' in s.index: s['crosses_total'] = float((pass_df.get('pass_cross', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'switches_total' in s.index: s['switches_total'] = float((pass_df.get('pass_switch', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'through_balls_total' in s.index: s['through_balls_total'] = float((pass_df.get('pass_through_ball', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        
+        if 'passes_ground' in s.index: s['passes_ground'] = float((pass_height_series == 'Ground Pass').sum())
+        if 'passes_low' in s.index: s['passes_low'] = float((pass_height_series == 'Low Pass').sum())
+        if 'passes_high' in s.index: s['passes_high'] = float((pass_height_series == 'High Pass').sum())
+
+        if 'passes_outcome_incomplete' in s.index: s['passes_outcome_incomplete'] = float((pass_outcome_series == 'Incomplete').sum())
+        if 'passes_outcome_out' in s.index: s['passes_outcome_out'] = float((pass_outcome_series == 'Out').sum())
+        if 'passes_outcome_offside' in s.index: s['passes_outcome_offside'] = float((pass_outcome_series == 'Pass Offside').sum())
+        if 'passes_outcome_injury_clearance' in s.index: s['passes_outcome_injury_clearance'] = float((pass_outcome_series == 'Injury Clearance').sum())
+        
+        if 'passes_backheel' in s.index: s['passes_backheel'] = float((pass_df.get('pass_backheel', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'passes_deflected_by_opponent' in s.index: s['passes_deflected_by_opponent'] = float((pass_df.get('deflected', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'passes_miscommunication' in s.index: s['passes_miscommunication'] = float((pass_df.get('miscommunication', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+
+    if 'pass_completion_rate_kpi' in s.index: s['pass_completion_rate_kpi'] = safe_division(s.get('successful_passes',0.0), s.get('passes_total',0.0)) * 100
+    if 'avg_pass_length_kpi' in s.index: s['avg_pass_length_kpi'] = s.get('avg_pass_length', 0.0) if pd.notna(s.get('avg_pass_length')) else 0.0
+
+    # Dribbles
+    dribble_df = event_df[event_df['type'] == 'Dribble'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not dribble_df.empty:
+        dribble_outcome_series = dribble_df.get('dribble_outcome_name', pd.Series(dtype=str))
+        if 'dribbles_completed' in s.index: s['dribbles_completed'] = float((dribble_outcome_series == 'Complete').sum())
+        if 'dribbles_nutmeg' in s.index: s['dribbles_nutmeg'] = float((dribble_df.get('nutmeg', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'dribbles_overrun' in s.index: s['dribbles_overrun'] = float((dribble_df.get('overrun', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'dribbles_no_touch' in s.index: s['dribbles_no_touch'] = float((dribble_df.get('no_touch', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+
+    if 'dribble_success_rate_kpi' in s.index: s['dribble_success_rate_kpi'] = safe_division(s.get('dribbles_completed', 0.0), s.get('dribbles_attempted',0.0)) * 100
+
+    # Duels (Tackles, Aerials)
+    duel_df = event_df[event_df['type'] == 'Duel'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not duel_df.empty:
+        duel_type_series = duel_df.get('duel_type_name', pd.Series(dtype=str))
+        duel_outcome_series = duel_df.get('duel_outcome_name', pd.Series(dtype=str))
+
+        if 'duels_tackle_type' in s.index: s['duels_tackle_type'] = float((duel_type_series == 'Tackle').sum())
+        if 'tackles_attempted' in s.index: s['tackles_attempted'] = s.get('duels_tackle_type', 0.0) # Àlies
+
+        aerial_duels_mask = duel_type_series.str.contains("Aerial", case=False, na=False)
+        if 'aerial_duels_total' in s.index: s['aerial_duels_total'] = float(aerial_duels_mask.sum())
+        if 'duels_aerial_lost' in s.index: s['duels_aerial_lost'] = float((duel_type_series == 'Aerial Lost').sum())
+        
+        if 'tackles_won' in s.index:
+            s['tackles_won'] = float(((duel_type_series == 'Tackle') & 
+                                     (duel_outcome_series.isin(['Won', 'Success', 'Success In Play', 'Success Out']))).sum())
+        if 'aerial_duels_won' in s.index:
+             s['aerial_duels_won'] = float((aerial_duels_mask & duel_outcome_series.isin(['Won', 'Success'])).sum())
+    
+    if 'tackle_win_rate_kpi' in s.index: s['tackle_win_rate_kpi'] = safe_division(s.get('tackles_won',0.0), s.get('tackles_attempted',0.0)) * 100
+    if 'aerial_duel_win_rate_kpi' in s.index: s['aerial_duel_win_rate_kpi'] = safe_division(s.get('aerial_duels_won',0.0), s.get('aerial_duels_total',0.0)) * 100
+    
+    # 50/50 Events 
+    fifty_fifty_df = event_df[event_df['type'] == '50/50'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not fifty_fifty_df.empty:
+        fifty_outcome_series = fifty_fifty_df.get('outcome_name', fifty_fifty_df.get('outcome', pd.Series(dtype=str))) # outcome_name si ja parsejat
+        if 'fifty_fifties_won' in s.index: s['fifty_fifties_won'] = float(fifty_outcome_series.isin(['Won', 'Success To Team']).sum())
+        if 'fifty_fifties_lost' in s.index: s['fifty_fifties_lost'] = float(fifty_outcome_series.isin(['Lost', 'Success To Opposition']).sum())
+
+    # Ball Recovery
+    ball_recovery_df = event_df[event_df['type'] == 'Ball Recovery'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not ball_recovery_df.empty: 
+        if 'ball_recoveries_offensive' in s.index: s['ball_recoveries_offensive'] = float((ball_recovery_df.get('offensive', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'ball_recoveries_failed' in s.index: s['ball_recoveries_failed'] = float((ball_recovery_df.get('recovery_failure', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+
+    # Blocks
+    block_df = event_df[event_df['type'] == 'Block'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not block_df.empty:
+        if 'blocks_deflection' in s.index: s['blocks_deflection'] = float((block_df.get('deflection', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'blocks_offensive' in s.index: s['blocks_offensive'] = float((block_df.get('offensive', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+        if 'blocks_save_attempt' in s.index: s['blocks_save_attempt'] = float((block_df.get('save_block', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+
+    # Clearances
+    clearance_df = event_df[event_df['type'] == 'Clearance'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not clearance_df.empty:
+        if 'clearances_aerial_won' in s.index: s['clearances_aerial_won'] = float((clearance_df.get('aerial_won', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+
+    # Fouls
+    foul_committed_df = event_df[event_df['type'] == 'Foul Committed'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not foul_committed_df.empty: 
+        if 'fouls_committed_penalty' in s.index: s['fouls_committed_penalty'] = float((foul_committed_df.get('penalty', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+    
+    foul_won_df = event_df[event_df['type'] == 'Foul Won'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not foul_won_df.empty: 
+        if 'fouls_won_penalty' in s.index: s['fouls_won_penalty'] = float((foul_won_df.get('penalty', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+
+    # Cards (from Bad Behaviour)
+    bad_behaviour_df = event_df[event_df['type'] == 'Bad Behaviour'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not bad_behaviour_df.empty:
+        card_series = bad_behaviour_df.get('bad_behaviour_card_name', pd.Series(dtype=str))
+        if 'yellow_cards' in s.index: s['yellow_cards'] = float((card_series == 'Yellow Card').sum())
+        if 'red_cards' in s.index: s['red_cards'] = float((card_series.isin(['Red Card', 'Second Yellow'])).sum())
+
+    # Interceptions
+    interception_df = event_df[event_df['type'] == 'Interception'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not interception_df.empty:
+        interception_outcome_series = interception_df.get('interception_outcome_name', pd.Series(dtype=str)) 
+        if 'interceptions_successful_gain_possession' in s.index: s['interceptions_successful_gain_possession'] = float(interception_outcome_series.isin(['Success', 'Success In Play', 'Won']).sum())
+        if 'interceptions_failed_gain_possession' in s.index: s['interceptions_failed_gain_possession'] = float(interception_outcome_series.isin(['Lost', 'Lost In Play', 'Lost Out']).sum())
+    
+    # Carries (duration)
+    carry_df = event_df[event_df['type'] == 'Carry'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not carry_df.empty and 'duration' in carry_df.columns:
+        valid_durations = pd.to_numeric(carry_df['duration'], errors='coerce').dropna()
+        if 'sum_carry_duration' in s.index: s['sum_carry_duration'] = float(valid_durations.sum())
+        if 'avg_carry_duration' in s.index: s['avg_carry_duration'] = float(valid_durations.mean()) if not valid_durations.empty else 0.0
+    
+    # Miscontrol (aerial_won)
+    miscontrol_df = event_df[event_df['type'] == 'Miscontrol'].copy() if 'type' in event_df.columns else pd.DataFrame()
+    if not miscontrol_df.empty:
+         if 'count_miscontrol_aerial_won' in s.index: 
+             s['count_miscontrol_aerial_won'] = float((miscontrol_df.get('aerial_won', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum())
+    
+    # General defensive / pressure
+    if 'counterpress_actions' in s.index: s['counterpress_actions'] = (event_df.get('counterpress', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
+    if 'actions_under_pressure' in s.index: s['actions_under_pressure'] = (event_df.get('under_pressure', pd.Series(dtype=bool)).fillna(False).astype(bool)).sum()
+    
+    if 'turnovers_total' in s.index:
+        s['turnovers_total'] = s.get('miscontrols', 0.0) + s.get('dispossessed_events', 0.0) + \
+                               (s.get('dribbles_attempted', 0.0) - s.get('dribbles_completed', 0.0))
+    if 'turnovers_p90_inv_kpi_base' in s.index:
+        s['turnovers_p90_inv_kpi_base'] = safe_division(s.get('turnovers_total',0.0), num_90s_played) if use_p90 else (999.0 if s.get('turnovers_total',0.0) == 0 else s.get('turnovers_total',0.0))
+
+
+    # --- P90 Calculations ---
+    metrics_for_p90_conversion_from_func = [
+        m for m in get_feature_names_for_extraction() 
+        if not m.endswith(('_p90', '_kpi', '_sqrt_', '_base')) and 
+           not m in ['age', 'season_numeric', 'num_90s_played', 'matches_played_events', 'avg_carry_duration']
+    ]
+    
+    for col_raw in metrics_for_p90_conversion_from_func:
+        if f'{col_raw}_p90' in s.index:
+            s[f'{col_raw}_p90'] = safe_division(s.get(col_raw, 0.0), num_90s_played) if use_p90 else 0.0
+    if 'progressive_carries_p90' in s.index and 'carries_total_p90' in s.index :
+        s['progressive_carries_p90'] = s['carries_total_p90']
+    if 'interceptions_p90' in s.index and 'interceptions_p90' in s.index:
+        pass # ja calculat
+    if 'clearances_p90' in s.index and 'clearances_p90' in s.index: 
+        pass
+    if 'blocks_p90' in s.index and 'blocks_total_p90' in s.index:
+        s['blocks_p90'] = s['blocks_total_p90']
+    if 'pressures_p90' in s.index and 'pressures_p90' in s.index: 
+        pass
+
+    # SQRT P90
+    sqrt_transformed_kpis_base_p90 = ["goals_p90", "sum_xg_p90", "goal_assists_p90"]
+    for kpi_base_p90_name in sqrt_transformed_kpis_base_p90:
+        if f"{kpi_base_p90_name}_sqrt_" in s.index: 
+            val = s.get(kpi_base_p90_name, 0.0) 
+            s[f"{kpi_base_p90_name}_sqrt_"] = np.sqrt(val) if pd.notna(val) and val > 0 else 0.0
+        
+    return s.reindex(all_expected_features).fillna(0.0)
+
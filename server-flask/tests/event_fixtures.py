@@ -0,0 +1,58 @@
+"""Random StatsBomb-like event frames for the feature tests."""
+
+import numpy as np
+import pandas as pd
+
+EVENT_TYPES = [
+    'Pass', 'Shot', 'Dribble', 'Duel', '50/50', 'Ball Recovery', 'Block', 'Clearance', 'Foul Committed', 'Foul Won',
+    'Bad Behaviour', 'Interception', 'Carry', 'Miscontrol', 'Pressure', 'Dispossessed', 'Error', 'Shield',
+    'Ball Receipt*', 'Goal Keeper'
+]
+FLAG_COLUMNS = [
+    'out', 'shot_first_time', 'shot_open_goal', 'deflected', 'shot_aerial_won', 'pass_goal_assist', 'pass_shot_assist',
+    'pass_cross', 'pass_switch', 'pass_through_ball', 'pass_backheel', 'miscommunication', 'nutmeg', 'overrun', 'no_touch',
+    'offensive', 'recovery_failure', 'deflection', 'save_block', 'aerial_won', 'penalty', 'leads_to_shot', 'counterpress',
+    'under_pressure'
+]
+
+
+def make_events(n, seed, drop=()):
+    """
+    ``n`` random events of one player-season, as read from an event CSV
+    (flags are the string 'True' or missing), without the ``drop`` columns.
+    """
+    r = np.random.default_rng(seed)
+
+    def loc(k=2):
+        return [str([round(float(v), 1) for v in r.uniform(0, 120, k)]) if r.random() > 0.05 else np.nan for _ in range(n)]
+
+    def flag(p=0.1):
+        return np.where(r.random(n) < p, 'True', None)
+
+    def cat(values, p=0.6):
+        return np.where(r.random(n) < p, r.choice(values, n), None)
+
+    df = pd.DataFrame({
+        'id': range(n), 'match_id': r.integers(1, 30, n), 'type': r.choice(EVENT_TYPES, n),
+        'minute': r.integers(0, 90, n), 'second': r.integers(0, 60, n),
+        'location': loc(), 'pass_end_location': loc(), 'shot_end_location': loc(3), 'player_id': 5503,
+        'duration': np.where(r.random(n) < 0.9, r.uniform(0, 3, n).round(3).astype(str), None),
+        'pass_length': r.uniform(0, 60, n), 'shot_statsbomb_xg': r.uniform(0, 1, n), 'statsbomb_xg': r.uniform(0, 1, n),
+        'shot_outcome': cat(['Goal', 'Saved', 'Off T', 'Blocked', 'Post', 'Wayward', 'Deflected']),
+        'shot_outcome_name': cat(['Goal', 'Saved', 'Off T', 'Blocked', 'Post', 'Wayward', 'Saved To Post', 'Deflected']),
+        'shot_type_name': cat(['Penalty', 'Free Kick', 'Open Play']),
+        'pass_outcome': cat(['Incomplete', 'Out', None]),
+        'pass_outcome_name': cat(['Incomplete', 'Out', 'Pass Offside', 'Injury Clearance', 'nan', '']),
+        'pass_height_name': cat(['Ground Pass', 'Low Pass', 'High Pass']), 'pass_height': cat(['Ground Pass', 'Low Pass', 'High Pass']),
+        'dribble_outcome_name': cat(['Complete', 'Incomplete']),
+        'duel_type_name': cat(['Tackle', 'Aerial Lost', 'Aerial Won', '50/50']),
+        'duel_outcome_name': cat(['Won', 'Success', 'Success In Play', 'Lost', 'Success Out']),
+        'outcome_name': cat(['Won', 'Success To Team', 'Lost', 'Success To Opposition']), 'outcome': cat(['Won', 'Lost']),
+        'bad_behaviour_card_name': cat(['Yellow Card', 'Red Card', 'Second Yellow']),
+        'interception_outcome_name': cat(['Success', 'Won', 'Lost', 'Lost In Play', 'Lost Out', 'Success In Play']),
+        'goalkeeper_type': cat(['Shot Saved', 'Goal Conceded', 'Shot Faced', 'Save']),
+        'goalkeeper_outcome': cat(['Success', 'Claim', 'In Play Safe']),
+    })
+    for col in FLAG_COLUMNS:
+        df[col] = flag()
+    return df.drop(columns=list(drop))
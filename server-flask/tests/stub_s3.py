@@ -0,0 +1,64 @@
+"""In-memory stand-in for the boto3 S3 client calls the server makes, counting every call."""
+
+import hashlib
+from collections import Counter
+from io import BytesIO
+
+
+class StubS3Error(Exception):
+    def __init__(self, code, key):
+        super().__init__(f"An error occurred ({code}) for key {key}")
+        self.response = {'Error': {'Code': code}}
+
+
+def _etag(body):
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+class StubS3Client:
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.calls = Counter()
+        self.fail_next_put = Counter()  # key -> number of puts to reject with PreconditionFailed
+
+    def count(self, operation, key=None):
+        return self.calls[(operation, key)] if key is not None else sum(n for (op, _), n in self.calls.items() if op == operation)
+
+    def _body(self, key):
+        if key not in self.objects:
+            raise StubS3Error('NoSuchKey', key)
+        return self.objects[key]
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.calls[('get_object', Key)] += 1
+        body = self._body(Key)
+        return {'Body': BytesIO(body), 'ETag': _etag(body), 'ContentLength': len(body)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.calls[('head_object', Key)] += 1
+        body = self._body(Key)
+        return {'ETag': _etag(body), 'ContentLength': len(body)}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.calls[('put_object', Key)] += 1
+        current = self.objects.get(Key)
+        if self.fail_next_put[Key] > 0:
+            self.fail_next_put[Key] -= 1
+            raise StubS3Error('PreconditionFailed', Key)
+        if (IfNoneMatch == '*' and current is not None) or (IfMatch is not None and (current is None or _etag(current) != IfMatch)):
+            raise StubS3Error('PreconditionFailed', Key)
+        self.objects[Key] = Body if isinstance(Body, bytes) else Body.encode('utf-8')
+        return {'ETag': _etag(self.objects[Key])}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        self.put_object(Bucket, Key, Fileobj.read())
+
+    def get_paginator(self, operation_name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix='', **kwargs):
+                client.calls[('list_objects_v2', Prefix)] += 1
+                keys = sorted(k for k in client.objects if k.startswith(Prefix))
+                yield {'Contents': [{'Key': k, 'ETag': _etag(client.objects[k]), 'Size': len(client.objects[k])} for k in keys]}
+        return Paginator()
@@ -0,0 +1,49 @@
+"""BaseFeatureStore revalidation against a stub S3 client."""
+
+import pandas as pd
+
+from model_trainer.feature_store import (
+    FEATURE_STORE_MINUTES_KEY,
+    BaseFeatureStore,
+    feature_store_fingerprint,
+    feature_store_key,
+    feature_table_to_parquet_bytes,
+)
+from model_trainer.trainer_v2 import BASE_FEATURE_ID_COLUMNS, get_feature_names_for_extraction
+
+from stub_s3 import StubS3Client
+
+
+def partition(goals, fingerprint):
+    row = dict.fromkeys(get_feature_names_for_extraction(), 0.0)
+    row.update({'goals': goals, 'age': 20.0, 'num_90s_played': 5.0})
+    row.update(dict(zip(BASE_FEATURE_ID_COLUMNS, ['7', 'Player 7', '2015_2016', 'Attacker'])))
+    return feature_table_to_parquet_bytes(pd.DataFrame([row]), fingerprint)
+
+
+def test_lookups_revalidate_rebuilt_partitions():
+    s3 = StubS3Client({FEATURE_STORE_MINUTES_KEY: b"player_id,season_name,total_minutes_played\n"})
+    fingerprint = feature_store_fingerprint(s3, 'b')
+    s3.objects[feature_store_key('2015_2016')] = partition(1.0, fingerprint)
+    store = BaseFeatureStore(s3, 'b', refresh_interval_seconds=0)
+    store.reload()
+    assert store.get('7', '2015_2016')['goals'] == 1.0
+
+    s3.objects[feature_store_key('2015_2016')] = partition(4.0, fingerprint)
+    assert store.get('7', '2015_2016')['goals'] == 4.0
+    assert s3.count('get_object', feature_store_key('2015_2016')) == 2
+    assert store.get('7', '2015_2016', age=20, num_90s_played=6.0) is None
+
+
+def test_unchanged_partitions_are_not_downloaded_again_and_stale_ones_are_skipped():
+    s3 = StubS3Client({FEATURE_STORE_MINUTES_KEY: b"player_id,season_name,total_minutes_played\n"})
+    s3.objects[feature_store_key('2015_2016')] = partition(1.0, feature_store_fingerprint(s3, 'b'))
+    s3.objects[feature_store_key('2016_2017')] = partition(2.0, {"code": -1, "minutes": None})
+    store = BaseFeatureStore(s3, 'b', refresh_interval_seconds=3600)
+    assert store.reload() == 1
+    for _ in range(3):
+        store.get('7', '2015_2016')
+        store.reload()
+    assert s3.count('get_object', feature_store_key('2015_2016')) == 1
+    assert s3.count('get_object', feature_store_key('2016_2017')) == 1
+    assert store.stats()['stale_seasons'] == ['2016_2017']
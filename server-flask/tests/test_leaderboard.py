@@ -0,0 +1,84 @@
+"""PotentialLeaderboard queries and the /api/leaderboard route on a small stored table."""
+
+import pandas as pd
+import pytest
+
+import main
+from model_trainer.event_store import event_frame_to_parquet_bytes
+from model_trainer.leaderboard import (
+    DEFAULT_API_MODEL_ID,
+    LEADERBOARD_KEY,
+    PotentialLeaderboard,
+    _sorted_leaderboard,
+    model_artifact_keys,
+)
+from model_trainer.model_catalog import CUSTOM_MODELS_PREFIX
+from model_trainer.trainer_v2 import DEFAULT_MODEL_ID, DEFAULT_MODELS_PREFIX
+
+from stub_s3 import StubS3Client
+
+# (model, player, season, position group, age, 90s played, score)
+ROWS = [
+    (DEFAULT_API_MODEL_ID, "1", "2015_2016", "Attacker", 19, 10.0, 150.0),
+    (DEFAULT_API_MODEL_ID, "2", "2015_2016", "Attacker", 23, 20.0, 140.0),
+    (DEFAULT_API_MODEL_ID, "3", "2015_2016", "Attacker", 18, 2.5, 130.0),
+    (DEFAULT_API_MODEL_ID, "4", "2015_2016", "Midfielder", 20, 12.0, 120.0),
+    (DEFAULT_API_MODEL_ID, "5", "2014_2015", "Attacker", 17, 8.0, 110.0),
+    (DEFAULT_API_MODEL_ID, "6", "2015_2016", "Attacker", 21, 5.0, 100.0),
+    ("custom_a", "1", "2015_2016", "Attacker", 19, 10.0, 90.0),
+]
+
+
+@pytest.fixture
+def s3():
+    table = pd.DataFrame(ROWS, columns=['model_id', 'player_id', 'season', 'position_group', 'age', 'num_90s_played', 'predicted_potential_score'])
+    table['player_name'] = "Player " + table['player_id']
+    table = _sorted_leaderboard(table.sample(frac=1.0, random_state=0))
+    return StubS3Client({LEADERBOARD_KEY: event_frame_to_parquet_bytes(table)})
+
+
+def ranked_ids(results):
+    return [(r["rank"], r["player_id"]) for r in results]
+
+
+def test_query_filters_by_age_and_90s_in_ranking_order(s3):
+    leaderboard = PotentialLeaderboard(s3, 'b')
+    total, results = leaderboard.query(DEFAULT_API_MODEL_ID, season="2015_2016", position_group="Attacker", max_age=21, min_90s=5.0)
+    assert total == 2
+    assert ranked_ids(results) == [(1, "1"), (2, "6")]
+    assert results[0]["player_name"] == "Player 1" and results[0]["predicted_potential_score"] == 150.0
+
+    total, results = leaderboard.query(DEFAULT_API_MODEL_ID, min_age=19, max_age=20)
+    assert total == 2 and ranked_ids(results) == [(1, "1"), (2, "4")]
+    assert leaderboard.query(DEFAULT_API_MODEL_ID, season="2013_2014") == (0, [])
+    assert leaderboard.query("unknown") == (None, [])
+    assert s3.count('get_object') == 1
+
+
+def test_query_pages_keep_the_overall_rank(s3):
+    leaderboard = PotentialLeaderboard(s3, 'b')
+    total, first = leaderboard.query(DEFAULT_API_MODEL_ID, offset=0, limit=4)
+    _, second = leaderboard.query(DEFAULT_API_MODEL_ID, offset=4, limit=4)
+    assert total == 6
+    assert ranked_ids(first + second) == [(1, "1"), (2, "2"), (3, "3"), (4, "4"), (5, "5"), (6, "6")]
+
+
+def test_route_reports_the_next_offset_until_the_last_page(s3, monkeypatch):
+    monkeypatch.setattr(main, "potential_leaderboard", PotentialLeaderboard(s3, 'b'))
+    monkeypatch.setattr(main.limiter, "enabled", False)
+    client = main.app.test_client()
+
+    page = client.get('/api/leaderboard?limit=4').get_json()
+    assert page["total"] == 6 and page["next_offset"] == 4 and len(page["results"]) == 4
+    page = client.get(f'/api/leaderboard?limit=4&offset={page["next_offset"]}').get_json()
+    assert page["next_offset"] is None and ranked_ids(page["results"]) == [(5, "5"), (6, "6")]
+    page = client.get('/api/leaderboard?model_id=custom_a&min_90s=10').get_json()
+    assert page["total"] == 1 and page["next_offset"] is None
+    assert client.get('/api/leaderboard?model_id=unknown').status_code == 404
+
+
+def test_artifact_keys_follow_the_trainer_and_catalog_prefixes():
+    assert model_artifact_keys(DEFAULT_API_MODEL_ID, "Attacker")[0] == \
+        f"{DEFAULT_MODELS_PREFIX}{DEFAULT_MODEL_ID}/attacker/potential_model_attacker_{DEFAULT_MODEL_ID}.joblib"
+    assert model_artifact_keys("custom_a", "Midfielder")[2] == \
+        f"{CUSTOM_MODELS_PREFIX}custom_a/midfielder/model_config_midfielder_custom_a.json"
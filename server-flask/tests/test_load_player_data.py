@@ -0,0 +1,50 @@
+"""Event loading of the API routes through the player data cache."""
+
+import pytest
+
+import main
+from model_trainer.event_store import (
+    event_csv_key, event_frame_to_parquet_bytes, event_parquet_key, load_event_frame, prepare_event_frame_for_storage
+)
+from player_data_cache import PlayerDataCache
+
+from event_fixtures import make_events
+from stub_s3 import StubS3Client
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    client = StubS3Client({event_parquet_key("5503", "2015_2016"): event_frame_to_parquet_bytes(prepare_event_frame_for_storage(make_events(200, 0)))})
+    monkeypatch.setattr(main, "s3_client", client)
+    monkeypatch.setattr(main, "EVENT_STORE_PREFER_PARQUET", True)
+    monkeypatch.setattr(main, "player_data_cache", PlayerDataCache(max_bytes=64 * 1024 * 1024))
+    return client
+
+
+def test_projected_loads_share_one_download(s3):
+    shots = main.load_player_data("5503", "2015_2016", main.DATA_DIR, columns=main.SHOT_MAP_COLUMNS)
+    passes = main.load_player_data("5503", "2015_2016", main.DATA_DIR, columns=main.PASS_MAP_COLUMNS)
+    full = main.load_player_data("5503", "2015_2016", main.DATA_DIR)
+
+    assert s3.count('get_object') == 1
+    assert {'type', 'location_x', 'location_y', 'shot_outcome', 'shot_statsbomb_xg'} <= set(shots.columns)
+    assert 'pass_end_location_x' not in shots.columns
+    assert 'pass_end_location_x' in passes.columns and 'shot_outcome' not in passes.columns
+    assert len(shots) == len(passes) == len(full) == 200
+
+
+def test_csv_fallback_flags_match_the_trainer(monkeypatch):
+    events = make_events(200, 1)
+    events.loc[::7, 'counterpress'] = 'False'
+    events['custom_flag'] = ['True', 'False', None, 'False'] * 50
+    client = StubS3Client({event_csv_key("5503", "2015_2016"): events.to_csv(index=False).encode('utf-8')})
+    monkeypatch.setattr(main, "s3_client", client)
+    monkeypatch.setattr(main, "player_data_cache", PlayerDataCache(max_bytes=64 * 1024 * 1024))
+
+    served = main.load_player_data("5503", "2015_2016", main.DATA_DIR)
+    trained, source = load_event_frame(client, main.R2_BUCKET_NAME, "5503", "2015_2016", dtype=object, low_memory=False)
+
+    assert source == "csv"
+    for col in ('counterpress', 'under_pressure', 'deflected', 'custom_flag'):
+        assert str(served[col].dtype) == str(trained[col].dtype) == 'boolean'
+        assert served[col].fillna(False).tolist() == trained[col].fillna(False).tolist()
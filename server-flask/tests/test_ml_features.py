@@ -0,0 +1,94 @@
+"""
+ml_feature_matrix and construct_ml_feature_table against the per-instance
+Pass 2 loop built on trainer_construct_ml_features_for_player_season.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model_trainer.trainer_v2 import (
+    construct_ml_feature_table,
+    extract_season_features,
+    get_feature_names_for_extraction,
+    get_trainer_all_possible_ml_feature_names,
+    ml_feature_matrix,
+    trainer_construct_ml_features_for_player_season,
+)
+
+from event_fixtures import make_events
+
+# (player_id, general position, seasons played as start years), seasons deliberately unsorted and with gaps
+PLAYERS = [
+    ("1", "Attacker", [2016, 2014, 2015, 2017]),
+    ("2", "Midfielder", [2015, 2018, 2013]),
+    ("3", "Defender", [2016]),
+    ("4", "Attacker", [2012, 2013, 2014, 2015, 2016]),
+    ("5", "Goalkeeper", [2015, 2016]),
+    ("6", "Midfielder", [2017, 2014]),
+]
+
+
+@pytest.fixture(scope="module")
+def base_features():
+    rows = []
+    for k, (player_id, position, season_years) in enumerate(PLAYERS):
+        for j, year in enumerate(season_years):
+            features = extract_season_features(make_events(40 + 30 * j, 10 * k + j), 17 + (year - 2012), year, 1.5 * (k + j))
+            features['player_id_identifier'] = player_id
+            features['player_name_identifier'] = f"Player {player_id}"
+            features['target_season_identifier'] = f"{year}_{year + 1}"
+            features['general_position_identifier'] = position
+            features['season_numeric'] = year
+            features['peak_potential_target'] = 10.0 * k + j
+            features['raw_composite_score'] = np.nan if j == 1 else 0.5 * j
+            rows.append(features)
+    df = pd.DataFrame(rows).reset_index(drop=True)
+    df.loc[3, 'goals'] = np.nan
+    df.loc[7, 'successful_passes'] = np.nan
+    return df
+
+
+def reference_ml_features(df_all_seasons, df_instances, history_rows=None):
+    """The original Pass 2: one trainer_construct_ml_features_for_player_season call per instance."""
+    vectors = []
+    for idx, row in df_instances.iterrows():
+        history = df_all_seasons[
+            (df_all_seasons['player_id_identifier'] == row['player_id_identifier']) &
+            (df_all_seasons['season_numeric'] < row['season_numeric'])
+        ]
+        if history_rows is not None:
+            history = history[history_rows.loc[history.index]]
+        vectors.append(trainer_construct_ml_features_for_player_season(
+            current_season_base_features_row=row,
+            historical_base_features_df=history.sort_values(by='season_numeric'),
+            all_base_metric_names=get_feature_names_for_extraction()
+        ))
+    return pd.DataFrame(vectors).reindex(columns=get_trainer_all_possible_ml_feature_names()).to_numpy(dtype='float64')
+
+
+def test_ml_feature_matrix_matches_per_instance_features(base_features):
+    instances = base_features.sample(frac=1.0, random_state=0)
+    np.testing.assert_allclose(
+        ml_feature_matrix(base_features, instances), reference_ml_features(base_features, instances), rtol=1e-12, atol=1e-12
+    )
+
+
+def test_ml_feature_matrix_history_rows(base_features):
+    history_rows = base_features['age'] <= 19
+    np.testing.assert_allclose(
+        ml_feature_matrix(base_features, base_features, history_rows=history_rows),
+        reference_ml_features(base_features, base_features, history_rows=history_rows), rtol=1e-12, atol=1e-12
+    )
+
+
+def test_construct_ml_feature_table_matches_per_instance_features(base_features):
+    instances = base_features[base_features['age'] <= 21]
+    table = construct_ml_feature_table(base_features, instances)
+
+    ml_feature_names = get_trainer_all_possible_ml_feature_names()
+    expected = np.nan_to_num(reference_ml_features(base_features, instances), nan=0.0)
+    np.testing.assert_allclose(table[ml_feature_names].to_numpy(dtype='float64'), expected, rtol=1e-12, atol=1e-12)
+    for col in ('player_id_identifier', 'player_name_identifier', 'target_season_identifier', 'general_position_identifier', 'peak_potential_target'):
+        assert table[col].tolist() == instances[col].tolist()
+    assert table['raw_composite_score_heuristic_value'].tolist() == instances['raw_composite_score'].fillna(0.0).tolist()
@@ -0,0 +1,111 @@
+"""Model catalog conditional updates, seeding and API lookups against a stub S3 client."""
+
+import json
+
+import pytest
+
+from model_trainer import model_catalog
+from model_trainer.model_catalog import (
+    CUSTOM_MODELS_PREFIX,
+    MODEL_CATALOG_KEY,
+    ModelCatalog,
+    read_model_catalog,
+    register_model_position,
+    update_model_catalog,
+)
+
+from stub_s3 import StubS3Client, StubS3Error
+
+
+def config_key(model_id, position_group):
+    position = position_group.lower()
+    return f"{CUSTOM_MODELS_PREFIX}{model_id}/{position}/model_config_{position}_{model_id}.json"
+
+
+def stored_config(model_id, position_group):
+    return {config_key(model_id, position_group): json.dumps({
+        "model_display_name": f"Model {model_id}", "position_group_trained_for": position_group}).encode('utf-8')}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(model_catalog.time, 'sleep', lambda seconds: None)
+
+
+def register(s3, model_id, position_group):
+    config = json.loads(stored_config(model_id, position_group)[config_key(model_id, position_group)])
+    return register_model_position(s3, 'b', model_id, position_group, config, config_key(model_id, position_group))
+
+
+def test_rejected_conditional_write_is_retried_on_the_current_catalog():
+    s3 = StubS3Client()
+    register(s3, "m1", "Attacker")
+    s3.fail_next_put[MODEL_CATALOG_KEY] = 1
+
+    register(s3, "m2", "Defender")
+    catalog, _ = read_model_catalog(s3, 'b')
+    assert set(catalog["models"]) == {"m1", "m2"}
+    assert s3.count('put_object', MODEL_CATALOG_KEY) == 3
+
+
+def test_entries_written_by_another_trainer_meanwhile_are_kept():
+    s3 = StubS3Client()
+    register(s3, "m1", "Attacker")
+    raced = []
+
+    def add_midfielder(catalog):
+        if not raced:
+            raced.append(True)
+            register(s3, "m1", "Midfielder")
+        catalog["models"].setdefault("m2", {})["Defender"] = {"position_group": "Defender"}
+
+    catalog = update_model_catalog(s3, 'b', add_midfielder)
+    assert set(catalog["models"]["m1"]) == {"Attacker", "Midfielder"}
+    assert s3.count('put_object', MODEL_CATALOG_KEY) == 4
+    assert read_model_catalog(s3, 'b')[0] == catalog
+
+
+def test_conflicts_past_the_last_attempt_are_raised():
+    s3 = StubS3Client()
+    s3.fail_next_put[MODEL_CATALOG_KEY] = 2
+    with pytest.raises(StubS3Error):
+        update_model_catalog(s3, 'b', lambda catalog: None, attempts=2)
+
+
+def test_missing_catalog_is_seeded_from_the_stored_configs():
+    s3 = StubS3Client({**stored_config("old", "Attacker"), **stored_config("old", "Midfielder")})
+
+    register(s3, "new", "Defender")
+    catalog, _ = read_model_catalog(s3, 'b')
+    assert set(catalog["models"]) == {"old", "new"}
+    assert set(catalog["models"]["old"]) == {"Attacker", "Midfielder"}
+    assert catalog["models"]["old"]["Attacker"]["config_key"] == config_key("old", "Attacker")
+    assert s3.count('list_objects_v2') == 1
+
+
+def test_position_of_refreshes_on_a_miss_without_downloading_an_unchanged_catalog():
+    s3 = StubS3Client()
+    register(s3, "m1", "Attacker")
+    catalog = ModelCatalog(s3, 'b', refresh_interval_seconds=300, miss_refresh_seconds=0)
+    assert catalog.position_of("m1") == "Attacker"
+    assert catalog.stats()["downloads"] == 1
+
+    register(s3, "m2", "Midfielder")
+    assert catalog.position_of("m2") == "Midfielder"
+    assert catalog.stats()["downloads"] == 2
+
+    assert catalog.position_of("unknown") is None
+    assert catalog.stats()["downloads"] == 2
+    assert s3.count('head_object', MODEL_CATALOG_KEY) == 2
+    assert [item["id"] for item in catalog.models()] == ["m1", "m2"]
+
+
+def test_position_of_waits_for_the_miss_refresh_interval():
+    s3 = StubS3Client()
+    register(s3, "m1", "Attacker")
+    catalog = ModelCatalog(s3, 'b', refresh_interval_seconds=300, miss_refresh_seconds=300)
+    catalog.position_of("m1")
+
+    register(s3, "m2", "Midfielder")
+    assert catalog.position_of("m2") is None
+    assert s3.count('head_object', MODEL_CATALOG_KEY) == 0
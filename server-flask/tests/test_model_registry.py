@@ -0,0 +1,104 @@
+"""ModelRegistry caching, revalidation and disk mirror against a stub S3 client."""
+
+import json
+import threading
+import time
+from io import BytesIO
+
+import joblib
+
+from model_registry import ModelRegistry
+
+from stub_s3 import StubS3Client
+
+
+def artifact_objects(model_id, padding=0):
+    buffer = BytesIO()
+    joblib.dump({"model": model_id, "padding": "x" * padding}, buffer)
+    scaler = BytesIO()
+    joblib.dump({"scaler": model_id}, scaler)
+    keys = (f"models/{model_id}/model.joblib", f"models/{model_id}/scaler.joblib", f"models/{model_id}/config.json")
+    return keys, dict(zip(keys, [buffer.getvalue(), scaler.getvalue(), json.dumps({"id": model_id}).encode('utf-8')]))
+
+
+def test_entries_are_evicted_by_summed_file_size():
+    keys_a, objects_a = artifact_objects("a", padding=2000)
+    keys_b, objects_b = artifact_objects("b", padding=2000)
+    s3 = StubS3Client({**objects_a, **objects_b})
+    size_a = sum(len(body) for body in objects_a.values())
+    registry = ModelRegistry(s3, 'b', max_bytes=size_a + 100, revalidate_seconds=300)
+
+    assert registry.get(*keys_a)[2] == {"id": "a"}
+    registry.get(*keys_b)
+    stats = registry.stats()
+    assert stats["entries"] == 1 and stats["evictions"] == 1
+    assert stats["total_bytes"] == sum(len(body) for body in objects_b.values())
+
+    registry.get(*keys_a)
+    assert s3.count('get_object', keys_a[0]) == 2
+    assert registry.stats()["misses"] == 3
+
+
+def test_unchanged_etags_are_revalidated_without_downloading():
+    keys, objects = artifact_objects("a")
+    s3 = StubS3Client(objects)
+    registry = ModelRegistry(s3, 'b', max_bytes=10 ** 6, revalidate_seconds=0)
+
+    registry.get(*keys)
+    registry.get(*keys)
+    assert s3.count('get_object', keys[0]) == 1
+    assert s3.count('head_object', keys[0]) == 1
+    assert registry.stats()["revalidations"] == 1 and registry.stats()["hits"] == 1
+
+    s3.objects[keys[2]] = json.dumps({"id": "a", "retrained": True}).encode('utf-8')
+    assert registry.get(*keys)[2] == {"id": "a", "retrained": True}
+    assert s3.count('get_object', keys[0]) == 2
+
+
+def test_fresh_entries_are_served_without_contacting_r2():
+    keys, objects = artifact_objects("a")
+    s3 = StubS3Client(objects)
+    registry = ModelRegistry(s3, 'b', max_bytes=10 ** 6, revalidate_seconds=300)
+
+    registry.get(*keys)
+    registry.get(*keys)
+    assert s3.count('get_object') == 3 and s3.count('head_object') == 0
+
+
+def test_restarted_registry_warm_starts_from_the_disk_mirror(tmp_path):
+    keys, objects = artifact_objects("a")
+    s3 = StubS3Client(objects)
+    ModelRegistry(s3, 'b', max_bytes=10 ** 6, disk_cache_dir=str(tmp_path)).get(*keys)
+
+    restarted = ModelRegistry(s3, 'b', max_bytes=10 ** 6, disk_cache_dir=str(tmp_path))
+    assert restarted.get(*keys)[1] == {"scaler": "a"}
+    assert s3.count('get_object', keys[0]) == 1
+    assert restarted.stats()["disk_loads"] == 1 and restarted.stats()["downloads"] == 0
+
+    s3.objects[keys[2]] = json.dumps({"id": "a", "retrained": True}).encode('utf-8')
+    changed = ModelRegistry(s3, 'b', max_bytes=10 ** 6, disk_cache_dir=str(tmp_path))
+    assert changed.get(*keys)[2] == {"id": "a", "retrained": True}
+    assert changed.stats()["downloads"] == 1
+
+
+class SlowStubS3Client(StubS3Client):
+    def get_object(self, Bucket, Key, **kwargs):
+        time.sleep(0.05)
+        return super().get_object(Bucket, Key, **kwargs)
+
+
+def test_concurrent_gets_share_a_single_load():
+    keys, objects = artifact_objects("a")
+    s3 = SlowStubS3Client(objects)
+    registry = ModelRegistry(s3, 'b', max_bytes=10 ** 6, revalidate_seconds=300)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(registry.get(*keys))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8 and all(result is results[0] for result in results)
+    assert s3.count('get_object', keys[0]) == 1
+    assert registry.stats()["misses"] == 1 and registry.stats()["hits"] == 7
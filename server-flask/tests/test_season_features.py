@@ -0,0 +1,51 @@
+"""
+The single-pass and batched base feature extraction against the original
+per-frame implementation (tests/baseline_features.py).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model_trainer.trainer_v2 import extract_season_features, extract_season_features_batch, stack_player_season_events
+
+from baseline_features import baseline_extract_season_features
+from event_fixtures import make_events
+
+DROPPED_COLUMNS = [
+    (), ('deflected',), ('shot_outcome_name',), ('shot_outcome_name', 'shot_outcome'), ('shot_statsbomb_xg',),
+    ('shot_statsbomb_xg', 'statsbomb_xg'), ('pass_outcome_name',), ('pass_length',), ('duel_type_name',),
+    ('duel_outcome_name',), ('outcome_name', 'outcome'), ('duration',), ('match_id',), ('out', 'counterpress', 'under_pressure'),
+]
+SEASON_ARGS = [(21, 2020, 12.3), (19, 2019, 1.0), (22, 2018, 0), (25, 2021, np.nan)]
+
+
+def assert_same_features(expected, actual):
+    assert list(actual.index) == list(expected.index)
+    differing = ~((expected == actual) | (expected.isna() & actual.isna()))
+    assert not differing.any(), f"{expected[differing].to_dict()} != {actual[differing].to_dict()}"
+
+
+@pytest.mark.parametrize("drop", DROPPED_COLUMNS, ids=lambda d: ",".join(d) or "all-columns")
+@pytest.mark.parametrize("seed", range(4))
+def test_extract_season_features_matches_baseline(seed, drop):
+    for n_events in (0, 7, 400):
+        events = make_events(n_events, seed, drop)
+        for args in SEASON_ARGS:
+            assert_same_features(baseline_extract_season_features(events.copy(), *args), extract_season_features(events.copy(), *args))
+
+
+def test_extract_season_features_batch_matches_baseline():
+    frames, rows, expected = [], [], []
+    for k, drop in enumerate(DROPPED_COLUMNS):
+        events = make_events(50 + 40 * k, 100 + k, drop)
+        age, season_numeric, num_90s = SEASON_ARGS[k % len(SEASON_ARGS)]
+        frames.append((str(k), f"{season_numeric}_{season_numeric + 1}", events))
+        rows.append({'player_id_identifier': str(k), 'target_season_identifier': f"{season_numeric}_{season_numeric + 1}",
+                     'age': age, 'season_numeric': season_numeric, 'num_90s_played': num_90s})
+        expected.append(baseline_extract_season_features(events.copy(), age, season_numeric, num_90s))
+
+    events_df, source_columns = stack_player_season_events(frames)
+    batch = extract_season_features_batch(events_df, pd.DataFrame(rows), source_columns)
+    for i, features in enumerate(expected):
+        assert_same_features(features, batch.iloc[i])
@@ -0,0 +1,69 @@
+"""native_xgb_successive_halving on small synthetic data."""
+
+import numpy as np
+import pytest
+import xgboost as xgb
+from sklearn.model_selection import KFold
+
+from model_trainer.trainer_v2 import _native_xgb_params, native_xgb_successive_halving
+
+PARAM_DISTRIBUTIONS = {
+    'max_depth': [2, 3, 4],
+    'learning_rate': [0.05, 0.1, 0.2, 0.3],
+    'min_child_weight': [1],
+    'n_estimators': [9, 27],
+}
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(150, 4))
+    y = 3.0 * X[:, 0] - 2.0 * X[:, 1] ** 2 + X[:, 2] * X[:, 3] + rng.normal(scale=0.5, size=150)
+    return X, y
+
+
+def test_rungs_keep_a_third_of_the_candidates_and_triple_the_rounds(data):
+    X, y = data
+    calls = []
+    best_params, best_score, trace = native_xgb_successive_halving(
+        X, y, PARAM_DISTRIBUTIONS, cv=3, n_candidates=9, eta=3, early_stopping_rounds=100,
+        progress=lambda stage, done, total: calls.append((stage, done, total))
+    )
+
+    assert [(r["n_estimators"], r["candidates"], r["candidates_evaluated"]) for r in trace["rungs"]] == [(3, 9, 9), (9, 3, 3), (27, 1, 1)]
+    assert trace["stopped_by_budget"] is None
+    assert trace["boosting_rounds_trained"] == 3 * (9 * 3 + 3 * 6 + 1 * 18)
+    assert calls == [("search", done, 13) for done in range(1, 14)]
+    assert [c["rung_reached"] for c in trace["candidates"]] == [2, 1, 1, 0, 0, 0, 0, 0, 0]
+    assert trace["candidates"][0]["cv_r2"] == round(best_score, 4) == trace["rungs"][-1]["best_cv_r2"]
+    assert {k: v for k, v in best_params.items() if k != 'n_estimators'} == trace["candidates"][0]["params"]
+
+    # n_estimators is the winner's best validation round, averaged over the folds.
+    native_params, _ = _native_xgb_params(best_params, n_threads=1)
+    best_rounds = []
+    for train_idx, valid_idx in KFold(n_splits=3).split(X):
+        dtrain, dvalid = xgb.DMatrix(X[train_idx], label=y[train_idx]), xgb.DMatrix(X[valid_idx], label=y[valid_idx])
+        history = {}
+        xgb.train(native_params, dtrain, num_boost_round=27, evals=[(dvalid, 'valid')], evals_result=history, verbose_eval=False)
+        best_rounds.append(int(np.argmin(history['valid']['rmse'])) + 1)
+    assert best_params['n_estimators'] == int(round(np.mean(best_rounds))) == trace["candidates"][0]["best_n_estimators"]
+
+
+def test_boosting_round_budget_stops_the_search_within_a_rung(data):
+    best_params, best_score, trace = native_xgb_successive_halving(
+        *data, PARAM_DISTRIBUTIONS, cv=3, n_candidates=9, eta=3, max_boosting_rounds=30
+    )
+
+    # Every first-rung candidate trains 3 folds x 3 rounds; the fifth one would start past the budget.
+    assert trace["stopped_by_budget"] == "boosting_rounds"
+    assert trace["boosting_rounds_trained"] == 36
+    assert [(r["rung"], r["candidates_evaluated"]) for r in trace["rungs"]] == [(0, 4)]
+    assert len(trace["candidates"]) == 4 and all(c["rung_reached"] == 0 for c in trace["candidates"])
+    assert round(best_score, 4) == trace["candidates"][0]["cv_r2"] == max(c["cv_r2"] for c in trace["candidates"])
+    assert best_params['n_estimators'] <= 3
+
+
+def test_budget_spent_before_the_first_candidate_is_an_error(data):
+    with pytest.raises(RuntimeError):
+        native_xgb_successive_halving(*data, PARAM_DISTRIBUTIONS, cv=3, n_candidates=9, max_boosting_rounds=0)
@@ -0,0 +1,131 @@
+"""Training job states, progress and restart handling, with the trainer replaced by a stub."""
+
+import json
+import os
+from concurrent.futures import Future
+
+import pytest
+
+import training_jobs
+from model_trainer import event_store, trainer_v2
+from training_jobs import TrainingJobProgress, TrainingJobQueue, run_training_job
+
+JOB_PARAMS = {"custom_model_id": "custom_a", "position_group": "Attacker", "impact_kpis": ["goals"], "target_kpis": []}
+
+
+class PendingExecutor:
+    """Executor that keeps the submitted jobs so the test runs them in-process."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append((future, fn, args))
+        return future
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    executor = PendingExecutor()
+    job_queue = TrainingJobQueue(str(tmp_path))
+    monkeypatch.setattr(job_queue, '_get_executor', lambda: executor)
+    job_queue.pending = executor
+    return job_queue
+
+
+@pytest.fixture
+def stub_trainer(monkeypatch):
+    calls = []
+
+    def train(**kwargs):
+        calls.append(kwargs)
+        for done in (1, 2):
+            kwargs["progress"]("pass1", done, 2)
+        kwargs["progress"]("pass2", 1, 1)
+        kwargs["progress"]("search", 3, 3)
+        return True, "Model trained."
+
+    monkeypatch.setenv('R2_BUCKET_NAME', 'b')
+    monkeypatch.setattr(event_store, 'r2_client_from_env', lambda: None)
+    monkeypatch.setattr(trainer_v2, 'build_and_train_model_from_script_logic', train)
+    return calls
+
+
+def test_job_goes_from_queued_to_succeeded(queue, stub_trainer):
+    job_id = queue.submit(dict(JOB_PARAMS, search_mode="halving", time_budget_seconds=60))
+    state = queue.get(job_id)
+    assert state["status"] == "queued" and state["progress"]["percent"] == 0.0
+    assert "owner_pid" not in state
+
+    assert run_training_job(queue.state_dir, job_id) == (True, "Model trained.")
+    state = queue.get(job_id)
+    assert state["status"] == "succeeded" and state["message"] == "Model trained."
+    assert state["progress"]["percent"] == 100.0 and state["progress"]["eta_seconds"] == 0.0
+    assert state["progress"]["stages"] == {"pass1": 100.0, "pass2": 100.0, "search": 100.0}
+    assert "worker_pid" not in state and state["finished_at"]
+    assert stub_trainer[0]["custom_model_id"] == "custom_a" and stub_trainer[0]["search"] == "halving"
+    assert stub_trainer[0]["user_composite_impact_kpis"] == {"Attacker": ["goals"]}
+
+
+def test_trainer_errors_and_crashed_workers_mark_the_job_failed(queue, monkeypatch):
+    def fail(**kwargs):
+        raise ValueError("no training data")
+
+    monkeypatch.setenv('R2_BUCKET_NAME', 'b')
+    monkeypatch.setattr(event_store, 'r2_client_from_env', lambda: None)
+    monkeypatch.setattr(trainer_v2, 'build_and_train_model_from_script_logic', fail)
+    job_id = queue.submit(JOB_PARAMS)
+    assert run_training_job(queue.state_dir, job_id) == (False, "Training failed: no training data")
+    assert queue.get(job_id)["status"] == "failed"
+
+    crashed_id = queue.submit(JOB_PARAMS)
+    future = queue.pending.futures[-1][0]
+    future.set_exception(RuntimeError("worker exited"))
+    state = queue.get(crashed_id)
+    assert state["status"] == "failed" and "worker exited" in state["message"]
+
+
+def test_unknown_or_malformed_job_ids_are_not_found(queue):
+    assert queue.get("0" * 32) is None
+    assert queue.get("../secrets") is None
+    assert run_training_job(queue.state_dir, "0" * 32) == (False, f"Training job {'0' * 32} not found.")
+
+
+def test_restart_marks_jobs_of_dead_processes_interrupted(tmp_path, monkeypatch):
+    live_pid, dead_pid = os.getpid(), -1
+    jobs = {
+        "a" * 32: {"status": "running", "worker_pid": dead_pid, "owner_pid": live_pid},
+        "b" * 32: {"status": "queued", "owner_pid": dead_pid},
+        "c" * 32: {"status": "queued", "owner_pid": live_pid},
+        "d" * 32: {"status": "succeeded", "owner_pid": dead_pid},
+    }
+    for job_id, state in jobs.items():
+        with open(tmp_path / f"{job_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(dict(state, job_id=job_id), f)
+    monkeypatch.setattr(training_jobs, '_pid_alive', lambda pid: pid == live_pid)
+
+    restarted = TrainingJobQueue(str(tmp_path))
+    assert {job_id: restarted.get(job_id)["status"] for job_id in jobs} == {
+        "a" * 32: "interrupted", "b" * 32: "interrupted", "c" * 32: "queued", "d" * 32: "succeeded"}
+
+
+def test_progress_weights_stages_and_extrapolates_the_eta(tmp_path, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(training_jobs.time, 'monotonic', lambda: clock[0])
+    path = str(tmp_path / "job.json")
+    state = {"progress": {"stages": {name: 0.0 for name in training_jobs.TRAINING_JOB_STAGES}}}
+    progress = TrainingJobProgress(path, state)
+
+    clock[0] = 130.0
+    progress("pass1", 1, 2)
+    assert state["progress"]["percent"] == 30.0
+    assert state["progress"]["eta_seconds"] == 70.0
+
+    clock[0] = 160.0
+    progress("pass1", 2, 2)
+    progress("pass2", 0, 0)
+    assert state["progress"]["stage"] == "pass2" and state["progress"]["percent"] == 75.0
+    assert state["progress"]["eta_seconds"] == 20.0
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f)["progress"]["percent"] == 75.0
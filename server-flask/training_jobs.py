@@ -0,0 +1,243 @@
+"""
+Background training jobs for custom models.
+
+``TrainingJobQueue.submit`` stores a job and returns its id straight away; the
+training itself runs in a separate process (a spawn-context process pool, so
+the API's threads and request timeouts are not involved). Each job's state is
+a JSON file in ``state_dir`` that the worker process rewrites as the training
+advances, so any API thread or process can report it and it survives a
+restart of the API. Jobs left "queued" or "running" by a process that no
+longer exists are marked "interrupted" when a queue is created.
+
+Progress is reported per stage of the trainer (Pass 1 base features, Pass 2
+ML features, hyperparameter search) with an overall percentage and an ETA
+extrapolated from the elapsed time.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Share of a typical run spent in each trainer stage, used to weight the overall percentage.
+TRAINING_JOB_STAGES = {"pass1": 0.6, "pass2": 0.15, "search": 0.25}
+# A running job's state file is rewritten at most this often, plus at the end of every stage.
+PROGRESS_WRITE_INTERVAL_SECONDS = 1.0
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError, OSError):
+        return pid is not None
+    return True
+
+
+def _write_job_state(path, state):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_job_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class TrainingJobProgress:
+    """
+    Progress callback for the trainer (``progress(stage, done, total)``) that
+    records the stage percentages, the overall percentage and the ETA in the
+    job's state file.
+    """
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._started = time.monotonic()
+        self._last_write = 0.0
+
+    def __call__(self, stage, done, total):
+        percent = 100.0 if not total else min(100.0, 100.0 * done / total)
+        stages = self.state["progress"]["stages"]
+        stages[stage] = round(percent, 1)
+        overall = sum(weight * stages.get(name, 0.0) for name, weight in TRAINING_JOB_STAGES.items())
+        elapsed = time.monotonic() - self._started
+        self.state["progress"].update({
+            "stage": stage,
+            "percent": round(overall, 1),
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(elapsed * (100.0 - overall) / overall, 1) if overall > 0 else None,
+        })
+        if percent >= 100.0 or elapsed - self._last_write >= PROGRESS_WRITE_INTERVAL_SECONDS:
+            self._last_write = elapsed
+            self.state["updated_at"] = _now()
+            _write_job_state(self.path, self.state)
+
+
+def run_training_job(state_dir, job_id):
+    """
+    Run one queued job in the current (worker) process and record its outcome.
+
+    Returns:
+        tuple: (success, message)
+    """
+    from model_trainer.event_store import r2_client_from_env
+    from model_trainer.trainer_v2 import build_and_train_model_from_script_logic
+
+    path = os.path.join(state_dir, f"{job_id}.json")
+    state = _read_job_state(path)
+    if state is None:
+        return False, f"Training job {job_id} not found."
+    params = state["params"]
+    state.update({"status": "running", "started_at": _now(), "updated_at": _now(), "worker_pid": os.getpid()})
+    state["progress"] = {"stage": None, "percent": 0.0, "elapsed_seconds": 0.0, "eta_seconds": None,
+                         "stages": {name: 0.0 for name in TRAINING_JOB_STAGES}}
+    _write_job_state(path, state)
+
+    position_group = params["position_group"]
+    try:
+        success, message = build_and_train_model_from_script_logic(
+            s3_client=r2_client_from_env(),
+            r2_bucket_name=os.environ['R2_BUCKET_NAME'],
+            custom_model_id=params["custom_model_id"],
+            position_group_to_train=position_group,
+            user_kpi_definitions_for_weight_derivation={position_group: params["target_kpis"]},
+            user_composite_impact_kpis={position_group: params["impact_kpis"]},
+            base_output_dir_for_custom_model='',
+            user_ml_feature_subset=params.get("ml_features"),
+            workers=int(os.environ.get('TRAINER_WORKERS', '1')),
+            # The native engine reports search progress per candidate and trains the same model as the sklearn one.
+            engine=os.environ.get('TRAINER_ENGINE', 'native'),
+            search=params.get("search_mode") or "random",
+            time_budget_seconds=params.get("time_budget_seconds"),
+            progress=TrainingJobProgress(path, state)
+        )
+    except Exception as e:
+        logger.error(f"Training job {job_id} failed: {e}", exc_info=True)
+        success, message = False, f"Training failed: {e}"
+
+    state.update({"status": "succeeded" if success else "failed", "message": message, "finished_at": _now(), "updated_at": _now()})
+    if success:
+        state["progress"].update({"percent": 100.0, "eta_seconds": 0.0})
+    _write_job_state(path, state)
+    return success, message
+
+
+class TrainingJobQueue:
+    """
+    Queue of custom model training jobs run by a pool of worker processes.
+
+    Args:
+        state_dir: directory of the job state files
+        max_workers: jobs trained at the same time; further jobs wait "queued"
+    """
+
+    def __init__(self, state_dir, max_workers=1):
+        self.state_dir = state_dir
+        self.max_workers = max(1, max_workers)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        os.makedirs(state_dir, exist_ok=True)
+        self._mark_interrupted_jobs()
+
+    def _path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _mark_interrupted_jobs(self):
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.state_dir, name)
+            state = _read_job_state(path)
+            if not state or state.get("status") not in ("queued", "running"):
+                continue
+            owner_pid = state.get("worker_pid") if state.get("status") == "running" else state.get("owner_pid")
+            if not _pid_alive(owner_pid):
+                state.update({"status": "interrupted", "message": "The server stopped before the job finished. Submit it again.", "updated_at": _now()})
+                _write_job_state(path, state)
+
+    def _get_executor(self):
+        # Created on first use so a preloading server does not fork an existing pool into its workers.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submit(self, params):
+        """
+        Queue a training run.
+
+        Args:
+            params: dict with custom_model_id, position_group, impact_kpis,
+                target_kpis and optionally ml_features, search_mode and
+                time_budget_seconds
+
+        Returns:
+            str: job id
+        """
+        job_id = uuid.uuid4().hex
+        state = {
+            "job_id": job_id,
+            "status": "queued",
+            "custom_model_id": params["custom_model_id"],
+            "params": params,
+            "owner_pid": os.getpid(),
+            "created_at": _now(),
+            "updated_at": _now(),
+            "progress": {"stage": None, "percent": 0.0, "elapsed_seconds": 0.0, "eta_seconds": None,
+                         "stages": {name: 0.0 for name in TRAINING_JOB_STAGES}},
+        }
+        _write_job_state(self._path(job_id), state)
+        with self._lock:
+            future = self._get_executor().submit(run_training_job, self.state_dir, job_id)
+            self._submitted += 1
+        future.add_done_callback(lambda f: self._on_job_done(job_id, f))
+        logger.info(f"Training job {job_id} queued for model {params['custom_model_id']}.")
+        return job_id
+
+    def _on_job_done(self, job_id, future):
+        error = future.exception()
+        if error is None:
+            return
+        # The worker process died (or could not start) before recording the outcome itself.
+        logger.error(f"Training job {job_id} crashed: {error}")
+        state = _read_job_state(self._path(job_id))
+        if state and state.get("status") in ("queued", "running"):
+            state.update({"status": "failed", "message": f"Training process crashed: {error}", "finished_at": _now(), "updated_at": _now()})
+            _write_job_state(self._path(job_id), state)
+        with self._lock:
+            if self._executor is not None and getattr(self._executor, '_broken', False):
+                self._executor = None
+
+    def get(self, job_id):
+        """State of a job as a dict, or None for an unknown id."""
+        if not isinstance(job_id, str) or not _JOB_ID_PATTERN.match(job_id):
+            return None
+        state = _read_job_state(self._path(job_id))
+        if state is not None:
+            state.pop("owner_pid", None)
+            state.pop("worker_pid", None)
+        return state
+
+    def stats(self):
+        return {"max_workers": self.max_workers, "submitted": self._submitted, "pool_started": self._executor is not None}
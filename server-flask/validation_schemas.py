@@ -3,7 +3,7 @@ Validation schemas for API endpoints using Marshmallow.
 Provides input validation and sanitization for all user-submitted data.
 """
 
-from marshmallow import Schema, fields, validate, ValidationError, validates_schema
+from marshmallow import Schema, fields, validate, ValidationError, validates_schema, EXCLUDE
 
 
 class CustomModelTrainingSchema(Schema):
@@ -54,6 +54,59 @@ class CustomModelTrainingSchema(Schema):
             error="ML features list cannot exceed 200 items"
         )
     )
+    
+    search_mode = fields.Str(
+        required=False,
+        validate=validate.OneOf(
+            ['random', 'halving'],
+            error="Search mode must be one of: random, halving"
+        )
+    )
+    
+    time_budget_seconds = fields.Int(
+        required=False,
+        allow_none=True,
+        validate=validate.Range(
+            min=30,
+            max=7200,
+            error="Time budget must be between 30 and 7200 seconds"
+        )
+    )
+
+
+class KpiWeightPreviewSchema(Schema):
+    """Schema for validating KPI weight preview requests (the KPI part of a training request)."""
+    
+    class Meta:
+        unknown = EXCLUDE
+    
+    position_group = fields.Str(
+        required=True,
+        validate=validate.OneOf(
+            ['Attacker', 'Midfielder', 'Defender'],
+            error="Position group must be one of: Attacker, Midfielder, Defender"
+        )
+    )
+    
+    impact_kpis = fields.List(
+        fields.Str(),
+        required=True,
+        validate=validate.Length(
+            min=1,
+            max=20,
+            error="Impact KPIs must contain between 1 and 20 items"
+        )
+    )
+    
+    target_kpis = fields.List(
+        fields.Str(),
+        required=True,
+        validate=validate.Length(
+            min=1,
+            max=30,
+            error="Target KPIs must contain between 1 and 30 items"
+        )
+    )
 
 
 class PredictionRequestSchema(Schema):
@@ -85,6 +138,49 @@ class PredictionRequestSchema(Schema):
     )
 
 
+class BatchPredictionItemSchema(Schema):
+    """One (player_id, season) pair of a batch prediction request."""
+    
+    player_id = fields.Str(
+        required=True,
+        validate=validate.Length(
+            min=1,
+            max=50,
+            error="Player ID must be between 1 and 50 characters"
+        )
+    )
+    
+    season = fields.Str(
+        required=True,
+        validate=validate.Regexp(
+            r'^\d{4}_\d{4}$',
+            error="Season must be in format YYYY_YYYY (e.g., 2015_2016)"
+        )
+    )
+
+
+class BatchPredictionRequestSchema(Schema):
+    """Schema for validating batch prediction requests."""
+    
+    model_id = fields.Str(
+        required=False,
+        validate=validate.Length(
+            max=100,
+            error="Model ID must be less than 100 characters"
+        )
+    )
+    
+    players = fields.List(
+        fields.Nested(BatchPredictionItemSchema),
+        required=True,
+        validate=validate.Length(
+            min=1,
+            max=500,
+            error="Players must contain between 1 and 500 items"
+        )
+    )
+
+
 class PlayerQuerySchema(Schema):
     """Schema for validating player data queries."""
     
@@ -136,6 +232,146 @@ class MetricQuerySchema(Schema):
     )
 
 
+class PlayerEventsQuerySchema(Schema):
+    """Schema for validating /player_events queries."""
+    
+    player_id = fields.Str(
+        required=True,
+        validate=validate.Length(
+            min=1,
+            max=50,
+            error="Player ID must be between 1 and 50 characters"
+        )
+    )
+    
+    season = fields.Str(
+        required=True,
+        validate=validate.Regexp(
+            r'^\d{4}_\d{4}$',
+            error="Season must be in format YYYY_YYYY"
+        )
+    )
+    
+    fields_ = fields.Str(
+        data_key="fields",
+        required=False,
+        validate=validate.Length(
+            max=2000,
+            error="Fields list must be less than 2000 characters"
+        )
+    )
+    
+    type = fields.Str(
+        required=False,
+        validate=validate.Length(
+            max=500,
+            error="Event type filter must be less than 500 characters"
+        )
+    )
+    
+    limit = fields.Int(
+        required=False,
+        validate=validate.Range(
+            min=1,
+            max=50000,
+            error="Limit must be between 1 and 50000"
+        )
+    )
+    
+    cursor = fields.Int(
+        required=False,
+        validate=validate.Range(
+            min=0,
+            error="Cursor must be a non-negative integer"
+        )
+    )
+    
+    format = fields.Str(
+        required=False,
+        validate=validate.OneOf(
+            ['json', 'ndjson'],
+            error="Format must be one of: json, ndjson"
+        )
+    )
+
+
+class LeaderboardQuerySchema(Schema):
+    """Schema for validating /api/leaderboard queries."""
+    
+    model_id = fields.Str(
+        required=False,
+        validate=validate.Length(
+            max=100,
+            error="Model ID must be less than 100 characters"
+        )
+    )
+    
+    season = fields.Str(
+        required=False,
+        validate=validate.Regexp(
+            r'^\d{4}_\d{4}$',
+            error="Season must be in format YYYY_YYYY (e.g., 2015_2016)"
+        )
+    )
+    
+    position_group = fields.Str(
+        required=False,
+        validate=validate.OneOf(
+            ['Attacker', 'Midfielder', 'Defender'],
+            error="Position group must be one of: Attacker, Midfielder, Defender"
+        )
+    )
+    
+    min_age = fields.Int(
+        required=False,
+        validate=validate.Range(
+            min=0,
+            max=60,
+            error="Minimum age must be between 0 and 60"
+        )
+    )
+    
+    max_age = fields.Int(
+        required=False,
+        validate=validate.Range(
+            min=0,
+            max=60,
+            error="Maximum age must be between 0 and 60"
+        )
+    )
+    
+    min_90s = fields.Float(
+        required=False,
+        validate=validate.Range(
+            min=0,
+            error="Minimum 90s played must be non-negative"
+        )
+    )
+    
+    limit = fields.Int(
+        required=False,
+        validate=validate.Range(
+            min=1,
+            max=200,
+            error="Limit must be between 1 and 200"
+        )
+    )
+    
+    offset = fields.Int(
+        required=False,
+        validate=validate.Range(
+            min=0,
+            error="Offset must be a non-negative integer"
+        )
+    )
+    
+    @validates_schema
+    def validate_age_range(self, data, **kwargs):
+        """Ensure the age range is not empty."""
+        if data.get("min_age") is not None and data.get("max_age") is not None and data["min_age"] > data["max_age"]:
+            raise ValidationError("min_age cannot be greater than max_age", field_name="max_age")
+
+
 def validate_request_data(schema_class, data, partial=False):
     """
     Validate request data against a schema.